@@ -0,0 +1,109 @@
+"""
+Numerical calculus: accuracy and speed of integrate, diff, solve and
+minimize on cases with known answers. Each is timed with the expression
+evaluated on NumPy batches (the default) and one point at a time (what
+bodies that cannot run on arrays fall back to). For integrate, a composite
+Simpson sum typed out point by point, as users did by hand, is shown too.
+
+Run: python benchmarks/bench_calculus.py [runs]
+"""
+import math
+import os
+import sys
+import time
+import warnings
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from calculator import CalculatorEngine  # noqa: E402
+
+# (expression, exact answer); trig is in degrees
+CASES = {
+    "integrate": [
+        ("integrate(x^2, x, 0, 3)", 9.0),
+        ("integrate(sin(x), x, 0, 180)", 360 / math.pi),
+        ("integrate(e^(-x^2), x, -10, 10)", math.sqrt(math.pi)),
+        ("integrate(1/sqrt(x), x, 0, 1)", 2.0),
+        ("integrate(sqrt(1 - x^2), x, -1, 1)", math.pi / 2),
+        ("integrate(abs(x - 1/3), x, 0, 1)", 5 / 18),
+    ],
+    "diff": [
+        ("diff(x^3, x, 2)", 12.0),
+        ("diff(sin(x), x, 30)", math.pi / 180 * math.cos(math.radians(30))),
+        ("diff(ln(x), x, 0.001)", 1000.0),
+        ("diff(e^x, x, 10)", math.exp(10)),
+    ],
+    "solve": [
+        ("solve(x^2 - 2, x, 1)", math.sqrt(2)),
+        ("solve(x^3 - 2x - 5, x, 2)", 2.0945514815423265),
+        ("solve(cos(x) - x/100, x, 0, 90)", 55.967012347134),
+        ("solve(x^2 + 4x + 4 - 1e-12, x, 0)", -2 + 1e-6),
+    ],
+    "minimize": [
+        ("minimize(x^2 - 4x, x, 0)", 2.0),
+        ("minimize(cos(x), x, 10)", 180.0),
+        ("minimize(x^4 - 3x^2 + x, x, -3, 3)", -1.3008395656679863),
+    ],
+}
+
+
+def timed(engine: CalculatorEngine, expression: str, runs: int):
+    # The first run compiles; report the best of the later ones
+    value = engine.evaluate(expression)
+    best = math.inf
+    for _ in range(runs):
+        start = time.perf_counter()
+        engine.evaluate(expression)
+        best = min(best, time.perf_counter() - start)
+    return value, best
+
+
+# No derivative: an error saying so, with no NumPy warning on the way
+UNDEFINED = ["diff(x^2/0, x, 1)", "diff(1/x, x, 0)", "diff(ln(x), x, 0)"]
+
+
+def simpson_by_hand(engine: CalculatorEngine, body: str, a: float, b: float, n: int) -> float:
+    """Composite Simpson's rule with one evaluate() per point."""
+    h = (b - a) / n
+    total = 0.0
+    for k in range(n + 1):
+        weight = 1 if k in (0, n) else (4 if k % 2 else 2)
+        total += weight * float(engine.evaluate(body.replace("x", f"({a + k * h!r})")))
+    return total * h / 3
+
+
+def main() -> int:
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    batched = CalculatorEngine(load_session=False)
+    pointwise = CalculatorEngine(load_session=False)
+    # No NumPy namespace: every body is evaluated one point at a time
+    pointwise.core.calculus._vector_names = lambda: None
+    for method, cases in CASES.items():
+        print(f"{method:<40} {'rel. error':>10} {'batched':>11} {'per point':>11}")
+        for expression, exact in cases:
+            value, t_batch = timed(batched, expression, runs)
+            _, t_point = timed(pointwise, expression, max(1, runs // 4))
+            try:
+                error = f"{abs(float(value) - exact) / abs(exact):10.1e}"
+            except (TypeError, ValueError):
+                error = f"{value:>10}"
+            print(f"  {expression:<38} {error} {t_batch * 1e3:8.2f} ms {t_point * 1e3:8.2f} ms")
+        print()
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+        for expression in UNDEFINED:
+            for engine in (batched, pointwise):
+                value = engine.evaluate(expression)
+                assert value.startswith("Error: The derivative does not exist"), (expression, value)
+
+    print("By hand: composite Simpson sum, one evaluate() per point")
+    for n in (10, 100, 1000):
+        start = time.perf_counter()
+        value = simpson_by_hand(batched, "sin(x)", 0.0, 180.0, n)
+        elapsed = time.perf_counter() - start
+        print(f"  sin(x) on [0, 180], {n:>4} intervals     {abs(value - 360 / math.pi) / (360 / math.pi):10.1e} {elapsed * 1e3:8.2f} ms")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
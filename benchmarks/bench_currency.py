@@ -0,0 +1,88 @@
+"""
+Currency conversion: reading a JSON rate file per lookup against the
+memory-mapped rate table (first lookup and cached cross rates), plus table
+open time and conversions through the calculator engine.
+
+Run: python benchmarks/bench_currency.py [lookups] [currencies] [dates]
+"""
+import datetime
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from calculator import EngineCore  # noqa: E402
+from currency import RateTable, write_rate_table  # noqa: E402
+
+
+def make_snapshots(currencies: int, dates: int) -> dict:
+    rng = random.Random(7)
+    codes = ["EUR"] + [chr(65 + i // 676) + chr(65 + i // 26 % 26) + chr(65 + i % 26) for i in range(currencies - 1)]
+    start = datetime.date(2000, 1, 3)
+    return {
+        start + datetime.timedelta(days=d): {code: rng.uniform(0.1, 200.0) for code in codes}
+        for d in range(dates)
+    }
+
+
+def timed(label: str, count: int, func) -> None:
+    start = time.perf_counter()
+    func()
+    elapsed = time.perf_counter() - start
+    print(f"{label:<40} {elapsed * 1e6 / count:10.3f} us/lookup")
+
+
+def main() -> int:
+    lookups = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    currencies = int(sys.argv[2]) if len(sys.argv) > 2 else 40
+    dates = int(sys.argv[3]) if len(sys.argv) > 3 else 2000
+    snapshots = make_snapshots(currencies, dates)
+    tmp = tempfile.mkdtemp()
+    table_path = os.path.join(tmp, "rates.bin")
+    json_path = os.path.join(tmp, "rates.json")
+    write_rate_table(table_path, snapshots, "EUR")
+    with open(json_path, "w", encoding="utf-8") as f:
+        json.dump({day.isoformat(): rates for day, rates in snapshots.items()}, f)
+    print(f"{currencies} currencies x {dates} dates: table {os.path.getsize(table_path) / 1e6:.1f} MB, JSON {os.path.getsize(json_path) / 1e6:.1f} MB")
+    latest = max(snapshots).isoformat()
+
+    def json_lookup() -> float:
+        with open(json_path, "r", encoding="utf-8") as f:
+            rates = json.load(f)[latest]
+        return rates["EUR"] / rates["AAB"]
+
+    timed("JSON file parsed per lookup", 20, lambda: [json_lookup() for _ in range(20)])
+    start = time.perf_counter()
+    for _ in range(100):
+        RateTable(table_path).close()
+    print(f"{'open rate table (mmap + header)':<40} {(time.perf_counter() - start) * 1e6 / 100:10.2f} us")
+
+    table = RateTable(table_path)
+    codes = table.currencies
+    n = len(table.dates)
+    # Distinct (pair, date) keys, so the first pass never hits the cache
+    pairs = [(codes[i // n % len(codes)], codes[(i // n + 1) % len(codes)]) for i in range(lookups)]
+    days = [datetime.date.fromordinal(table.dates[i % n]).isoformat() for i in range(lookups)]
+    timed("table, uncached historical lookups", lookups, lambda: [table.rate(a, b, d) for (a, b), d in zip(pairs, days)])
+    timed("table, cached historical lookups", lookups, lambda: [table.rate(a, b, d) for (a, b), d in zip(pairs, days)])
+    timed("table, cached latest lookups", lookups, lambda: [table.rate(a, b) for a, b in pairs])
+
+    core = EngineCore(rates_path=table_path)
+    engine = core.session()
+    expressions = [f"convert({i % 1000}, '{a}', '{b}')" for i, (a, b) in enumerate(pairs[:20000])]
+    timed("engine.evaluate_many convert(...)", len(expressions), lambda: engine.evaluate_many(expressions))
+    try:
+        import numpy as np
+    except Exception:
+        return 0
+    amounts = np.arange(lookups, dtype=float)
+    timed("core.convert_array (per value)", lookups, lambda: core.convert_array(amounts, "USD" if "USD" in codes else codes[1], "EUR"))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,39 @@
+"""
+Measure HistoryIndex build and query latency on a large synthetic history.
+
+Run: python benchmarks/bench_history_search.py [entries]
+"""
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from history import HistoryIndex  # noqa: E402
+
+
+QUERIES = ["sqrt(42)", "sin(7", "12345", "42", "convert", "zzz"]
+
+
+def main() -> int:
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    rng = random.Random(1)
+    index = HistoryIndex()
+    start = time.perf_counter()
+    for _ in range(size):
+        a, b = rng.randint(0, 99_999), rng.randint(0, 999)
+        index.add(f"{a}*sin({b})+sqrt({a % 97})", str(a * b))
+    print(f"indexed {size} entries in {time.perf_counter() - start:.2f} s")
+    for query in QUERIES:
+        rounds = 50
+        start = time.perf_counter()
+        for _ in range(rounds):
+            hits = index.search(query, 200)
+        per_query = (time.perf_counter() - start) / rounds
+        print(f"{query!r:<12} {len(hits):4d} hits  {per_query * 1e3:7.3f} ms")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,88 @@
+"""
+Linear systems through the calculator: solve(A, b) via evaluate_matrix
+against NumPy called directly (engine overhead) and a pure-Python Gaussian
+elimination, plus the cost of matrix literals typed into expressions.
+
+Run: python benchmarks/bench_matrix.py [max_n]
+"""
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from calculator import CalculatorEngine  # noqa: E402
+
+try:
+    import numpy as np
+except Exception:
+    np = None
+
+
+def python_solve(a: list, b: list) -> list:
+    """Gaussian elimination with partial pivoting, in plain Python."""
+    n = len(a)
+    m = [row[:] + [rhs] for row, rhs in zip(a, b)]
+    for col in range(n):
+        pivot = max(range(col, n), key=lambda r: abs(m[r][col]))
+        m[col], m[pivot] = m[pivot], m[col]
+        for r in range(col + 1, n):
+            f = m[r][col] / m[col][col]
+            row, top = m[r], m[col]
+            for c in range(col, n + 1):
+                row[c] -= f * top[c]
+    x = [0.0] * n
+    for r in range(n - 1, -1, -1):
+        x[r] = (m[r][n] - sum(m[r][c] * x[c] for c in range(r + 1, n))) / m[r][r]
+    return x
+
+
+def best_of(runs: int, func) -> float:
+    best = float("inf")
+    for _ in range(runs):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main() -> int:
+    if np is None:
+        print("NumPy is required for matrices (pip install numpy)")
+        return 1
+    max_n = int(sys.argv[1]) if len(sys.argv) > 1 else 3000
+    engine = CalculatorEngine(load_session=False)
+    rng = np.random.default_rng(42)
+
+    print(f"{'n':>6} {'engine solve':>14} {'numpy direct':>14} {'pure Python':>14}")
+    n = 100
+    while n <= max_n:
+        a = rng.standard_normal((n, n)) + n * np.eye(n)
+        b = rng.standard_normal(n)
+        runs = 3 if n <= 1000 else 1
+        t_engine = best_of(runs, lambda: engine.evaluate_matrix("solve(A, b)", A=a, b=b))
+        t_numpy = best_of(runs, lambda: np.linalg.solve(a, b))
+        if n <= 200:
+            a_list, b_list = a.tolist(), b.tolist()
+            python = f"{best_of(1, lambda: python_solve(a_list, b_list)) * 1e3:11.1f} ms"
+        else:
+            python = f"{'-':>14}"
+        print(f"{n:>6} {t_engine * 1e3:11.1f} ms {t_numpy * 1e3:11.1f} ms {python}")
+        n = n * 2 if n < 1000 else n + 1000
+
+    # Literal matrices typed into expressions: parsed once, then cached as constants
+    size = 30
+    r = random.Random(1)
+    literal = "[" + "; ".join(", ".join(str(r.randint(-9, 9)) for _ in range(size)) for _ in range(size)) + "]"
+    expression = f"det({literal} + {size * 10} * inv({literal} @ transpose({literal}) + [{', '.join(['1'] * size)}]))"
+    start = time.perf_counter()
+    engine.evaluate(expression)
+    cold = time.perf_counter() - start
+    warm = best_of(20, lambda: engine.evaluate(expression))
+    print(f"{size}x{size} literal expression: first run {cold * 1e3:.2f} ms, cached {warm * 1e3:.3f} ms")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,63 @@
+"""
+Cost of the numeric modes: float against decimal at several precisions and
+exact fractions, on arithmetic-heavy and function-heavy workloads.
+
+Run: python benchmarks/bench_numeric.py [count]
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from calculator import CalculatorEngine  # noqa: E402
+
+MODES = [
+    ("float", None),
+    ("decimal", 28),
+    ("decimal", 50),
+    ("decimal", 100),
+    ("decimal", 500),
+    ("fraction", None),
+]
+
+
+def arithmetic(count: int) -> list:
+    # ANS keeps the inputs from being folded into constants at compile time
+    return [f"(ANS + {i % 97}.25) / ({i % 13} + 3) * 1.5 - {i % 7}/3" for i in range(count)]
+
+
+def functions(count: int) -> list:
+    return [f"sqrt({i % 50} + ANS) + sin({i % 360}) + ln({i % 19 + 1})" for i in range(count)]
+
+
+def run(mode: str, precision: object, expressions: list) -> float:
+    engine = CalculatorEngine(load_session=False)
+    engine.set_numeric_mode(mode, precision)  # type: ignore[arg-type]
+    engine.evaluate_many(expressions[:100])  # warm the compile cache
+    start = time.perf_counter()
+    _, errors = engine.evaluate_many(expressions)
+    elapsed = time.perf_counter() - start
+    assert not any(errors), f"{mode}: {sum(1 for e in errors if e)} errors"
+    return elapsed
+
+
+def main() -> int:
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    for title, expressions in (("arithmetic", arithmetic(count)), ("functions", functions(count))):
+        print(f"{title}: {count} expressions")
+        baseline = None
+        for mode, precision in MODES:
+            if mode == "fraction" and title == "functions":
+                # Irrational functions fall back to floats in fraction mode
+                label = "fraction (float fallback)"
+            else:
+                label = mode if precision is None else f"{mode} ({precision} digits)"
+            elapsed = run(mode, precision, expressions)
+            baseline = baseline or elapsed
+            print(f"  {label:<26} {elapsed:7.3f} s  {count / elapsed:9.0f} expr/s  {elapsed / baseline:6.1f}x")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,51 @@
+"""
+Scaling of ParallelEvaluator against the serial evaluate() loop.
+
+Run: python benchmarks/bench_parallel.py [count] [max_jobs]
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from calculator import CalculatorEngine  # noqa: E402
+from parallel import ParallelEvaluator, chunked  # noqa: E402
+
+
+def make_expressions(count: int) -> list:
+    # Mostly distinct inputs, so workers pay for parsing as a real batch would
+    return [f"{i % 997}*sin({i % 360}) + sqrt({i % 50}) / (1 + {i % 13}^2)" for i in range(count)]
+
+
+def main() -> int:
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    max_jobs = int(sys.argv[2]) if len(sys.argv) > 2 else (os.cpu_count() or 1)
+    expressions = make_expressions(count)
+    print(f"{count} expressions, {os.cpu_count()} CPU(s)")
+
+    engine = CalculatorEngine(load_session=False)
+    start = time.perf_counter()
+    expected = [engine.evaluate(e) for e in expressions]
+    serial = time.perf_counter() - start
+    print(f"{'serial evaluate() loop':<26} {serial:7.2f} s  {count / serial:9.0f} expr/s   1.00x")
+
+    jobs = 1
+    while jobs <= max_jobs:
+        with ParallelEvaluator(jobs, engine=engine) as pool:
+            # Warm the workers so process start-up is not part of the timing
+            pool.evaluate_many(["1+1"] * jobs, chunk_size=1)
+            start = time.perf_counter()
+            results = []
+            for _, batch in pool.map_chunks(chunked(expressions, 2048), as_strings=True):
+                results.extend(batch.values)
+            elapsed = time.perf_counter() - start
+        assert results == expected, "parallel results differ from serial"
+        label = f"ParallelEvaluator jobs={jobs}"
+        print(f"{label:<26} {elapsed:7.2f} s  {count / elapsed:9.0f} expr/s  {serial / elapsed:5.2f}x")
+        jobs *= 2
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,94 @@
+"""
+Compare the AST parser/evaluator against the previous regex + eval() path.
+
+Run: python benchmarks/bench_parser.py [repeat]
+"""
+import os
+import re
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from calculator import CalculatorEngine  # noqa: E402
+from expression import compile_expression  # noqa: E402
+
+
+EXPRESSIONS = [
+    "1+2*3",
+    "2^10 - 3*(4+5)",
+    "sin(30) + cos(60)^2",
+    "sqrt(2)*pi/180",
+    "3x^2 + 2x + 1",
+    "50% * 120 + ANS",
+    "factorial(10) / (2ln(5) + log(100))",
+    'convert(12, "mi", "km") * 2',
+]
+
+
+def legacy_preprocess(expr: str) -> str:
+    """The regex rewrite evaluate() used before the parser existed."""
+    s = str(expr).strip()
+    s = s.replace("×", "*").replace("÷", "/")
+    s = s.replace("^", "**")
+    s = re.sub(r"\bANS\b", "(ANS)", s)
+    s = re.sub(r"(?<!\w)(\d+(?:\.\d+)?)%", r"(\1/100)", s)
+    s = re.sub(r"\b([iI])\b", "(1j)", s)
+    s = re.sub(r"(\d)(\()", r"\1*\2", s)
+    s = re.sub(r"(\))(\d)", r"\1*\2", s)
+    s = re.sub(r"(\d)([a-zA-Z])", r"\1*\2", s)
+    return s
+
+
+def bench(label: str, func, repeat: int) -> float:
+    per_call = min(timeit.repeat(func, number=repeat, repeat=3)) / (repeat * len(EXPRESSIONS))
+    print(f"{label:<34} {per_call * 1e6:8.2f} us/expr")
+    return per_call
+
+
+def main() -> int:
+    repeat = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    engine = CalculatorEngine()
+    names = engine._allowed_names()
+    names["x"] = 1.5
+    scope = {"x": 1.5, "ANS": 0, "MR": engine.memory_recall}
+    base = engine._base_names
+    legacy_globals = {"__builtins__": {}}
+    legacy_codes = [compile(legacy_preprocess(e), "<expression>", "eval") for e in EXPRESSIONS]
+    programs = [compile_expression(e) for e in EXPRESSIONS]
+    optimized = [
+        compile_expression(e, engine._pure_functions, engine._constants, engine._unit_factor) for e in EXPRESSIONS
+    ]
+
+    def legacy_eval() -> None:
+        for e in EXPRESSIONS:
+            eval(legacy_preprocess(e), legacy_globals, names)  # noqa: S307
+
+    def legacy_cached() -> None:
+        for code in legacy_codes:
+            eval(code, legacy_globals, names)  # noqa: S307
+
+    def parse_each_time() -> None:
+        for e in EXPRESSIONS:
+            compile_expression(e).evaluate(scope, base)
+
+    def parsed_once() -> None:
+        for program in programs:
+            program.evaluate(scope, base)
+
+    def optimized_once() -> None:
+        for program in optimized:
+            program.evaluate(scope, base)
+
+    print(f"{len(EXPRESSIONS)} expressions x {repeat} rounds")
+    slow = bench("regex + eval() per call", legacy_eval, repeat)
+    bench("eval() of cached code objects", legacy_cached, repeat)
+    bench("parse + compile per call", parse_each_time, repeat)
+    bench("parsed once, evaluate many", parsed_once, repeat)
+    fast = bench("parsed once, folded + CSE", optimized_once, repeat)
+    print(f"speedup vs regex + eval(): {slow / fast:.1f}x")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
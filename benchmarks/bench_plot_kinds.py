@@ -0,0 +1,85 @@
+"""
+Graph renders by kind (overlaid functions, parametric, polar and implicit
+curves): time per render, points drawn, how long the calling (UI) thread is
+busy when the render runs on a worker, and how soon a render stops once it
+is cancelled.
+
+Run: python benchmarks/bench_plot_kinds.py
+"""
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from calculator import CalculatorEngine  # noqa: E402
+
+try:
+    import numpy as np
+except Exception:
+    np = None
+
+WIDTH = 800
+
+
+def cases():
+    from plotting import FUNCTION, IMPLICIT, PARAMETRIC, POLAR, PlotSpec
+
+    return [
+        ("3 functions", PlotSpec(FUNCTION, ("sin(x)", "tan(x)", "x/360"), (-360.0, 360.0))),
+        ("scalar-only function", PlotSpec(FUNCTION, ("g(x)",), (-720.0, 720.0))),
+        ("lissajous", PlotSpec(PARAMETRIC, ("cos(3t), sin(2t)",), (-1.5, 1.5), t_range=(0.0, 360.0))),
+        ("rose + cardioid", PlotSpec(POLAR, ("2sin(5t)", "1 + cos(t)"), (-3.0, 3.0))),
+        ("circle + cubic", PlotSpec(IMPLICIT, ("x^2 + y^2 = 4", "y^2 = x^3 - x"), (-3.0, 3.0), (-3.0, 3.0))),
+        ("sin(x y) = 0.5", PlotSpec(IMPLICIT, ("sin(x*y*20) = 0.5",), (-3.0, 3.0), (-3.0, 3.0))),
+    ]
+
+
+def main() -> int:
+    if np is None:
+        print("NumPy is required for plotting (pip install numpy)")
+        return 1
+    from plotting import Cancelled, FunctionSampler, render
+
+    engine = CalculatorEngine(load_session=False)
+    engine.evaluate_vectorized("x", x=np.zeros(1))  # build the vector namespace up front
+    engine.evaluate("g(x) = if(x < 0, sqrt(-x), sin(x))")
+    executor = ThreadPoolExecutor(max_workers=1)
+    print(f"{'plot':<22} {'render':>10} {'points':>7} {'UI thread':>10} {'cancel latency':>15}")
+    for name, spec in cases():
+        # Uncached render on a fresh sampler, as for a newly typed curve
+        start = time.perf_counter()
+        curves = render(FunctionSampler(engine), spec, WIDTH)
+        elapsed = time.perf_counter() - start
+        points = sum(curve.xs.size for curve in curves)
+
+        # What the GUI does on the Tk thread: snapshot the session and submit
+        cancelled = threading.Event()
+        start = time.perf_counter()
+        snapshot = engine.fork()
+
+        def check() -> None:
+            if cancelled.is_set():
+                raise Cancelled()
+
+        future = executor.submit(render, FunctionSampler(snapshot), spec, WIDTH, check)
+        ui = time.perf_counter() - start
+
+        # Cancel halfway through and time until the worker gives up
+        time.sleep(elapsed / 2)
+        start = time.perf_counter()
+        cancelled.set()
+        try:
+            future.result()
+            latency = "finished"
+        except Cancelled:
+            latency = f"{(time.perf_counter() - start) * 1e3:12.2f} ms"
+        print(f"{name:<22} {elapsed * 1e3:7.1f} ms {points:7d} {ui * 1e3:7.2f} ms {latency:>15}")
+    executor.shutdown()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,135 @@
+"""
+Graph sampling: the old fixed 401-point grid (and a dense fixed grid)
+against the adaptive, tiled sampler, for the first plot, a pan and a zoom
+sequence, and how far each drawn curve strays from a dense reference (in
+pixels of an 800x400 plot). The last case is a user function that cannot run
+on arrays, so it is evaluated point by point (the fixed grid cannot plot it).
+
+Run: python benchmarks/bench_plotting.py
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from calculator import CalculatorEngine  # noqa: E402
+
+try:
+    import numpy as np
+except Exception:
+    np = None
+
+WIDTH, HEIGHT = 800, 400
+CASES = [
+    ("sin(x)", -360.0, 360.0),
+    ("tan(x)", -360.0, 360.0),
+    ("1/(x - 0.3)", -2.0, 2.0),
+    ("sqrt(x)*sin(1/x*10000)", 0.0, 50.0),
+    ("round(x/50)", -300.0, 300.0),
+    ("x*sin(x/1000)", -1e6, 1e6),
+    ("g(x)", -720.0, 720.0),
+]
+METHODS = [("fixed 401", 401), ("fixed 16001", 16001), ("adaptive", 0)]
+# x ranges the tiles cannot cover: rejected with a ValueError
+BAD_RANGES = [(-1e308, 1e308), (0.0, float("inf")), (float("nan"), 1.0), (1e300, 1.7e308), (0.0, 5e-324)]
+
+
+def fixed_grid(engine: CalculatorEngine, expression: str, xmin: float, xmax: float, points: int):
+    """The previous approach: uniform points, recomputed for every view."""
+    xs = np.linspace(xmin, xmax, points)
+    ys = np.real(engine.evaluate_vectorized(expression, x=xs)).astype(float)
+    ys[~np.isfinite(ys)] = np.nan
+    return xs, ys
+
+
+def pixel_error(engine: CalculatorEngine, expression: str, xmin: float, xmax: float, xs, ys) -> float:
+    """Share of reference points drawn more than one pixel off (within the plotted y range)."""
+    from plotting import robust_ylim
+
+    ref_x = np.linspace(xmin, xmax, 400_001)
+    ref_y = reference(engine, expression, ref_x)
+    ylim = robust_ylim(ref_y) or (np.nanmin(ref_y), np.nanmax(ref_y))
+    span = (ylim[1] - ylim[0]) or 1.0
+    drawn = np.interp(ref_x, xs, ys)
+    visible = np.isfinite(ref_y) & (ref_y >= ylim[0]) & (ref_y <= ylim[1])
+    with np.errstate(invalid="ignore"):
+        off = np.abs(drawn - ref_y) * (HEIGHT / span) > 1.0
+    # Gaps where the reference is defined count as errors too
+    return float(np.mean(off[visible] | np.isnan(drawn[visible])))
+
+
+def reference(engine: CalculatorEngine, expression: str, xs):
+    if expression == "g(x)":
+        ys = np.array([engine.evaluate_many([f"g({float(x)!r})"]).values[0] for x in xs[::50]], dtype=float)
+        return np.interp(xs, xs[::50], ys)
+    with np.errstate(all="ignore"):
+        ys = np.real(engine.evaluate_vectorized(expression, x=xs)).astype(float)
+    ys[~np.isfinite(ys)] = np.nan
+    return ys
+
+
+def views(xmin: float, xmax: float):
+    """A pan to the right in 10% steps and back, then zooming in and out."""
+    width = xmax - xmin
+    result = [(xmin + k * width / 10, xmax + k * width / 10) for k in range(1, 6)]
+    result += [(xmin + k * width / 10, xmax + k * width / 10) for k in range(4, -1, -1)]
+    center = (xmin + xmax) / 2
+    for scale in (0.5, 0.25, 0.5, 1.0):
+        result.append((center - scale * width / 2, center + scale * width / 2))
+    return result
+
+
+def main() -> int:
+    if np is None:
+        print("NumPy is required for plotting (pip install numpy)")
+        return 1
+    from plotting import FunctionSampler
+
+    engine = CalculatorEngine(load_session=False)
+    engine.evaluate_vectorized("x", x=np.zeros(1))  # build the vector namespace up front
+    # Scalar-only body (math.sin), with a kink at 0 and a jump at 360
+    engine.evaluate("g(x) = if(x < 0, sqrt(-x), sin(x) + if(x > 360, 2, 0))")
+    print(f"{'expression':<24} {'':>11} {'first plot':>11} {'13 views':>10} {'points':>7} {'>1px off':>9}")
+    for expression, xmin, xmax in CASES:
+        sampler = FunctionSampler(engine)
+        for i, (name, points) in enumerate(METHODS):
+            if points:
+                draw = lambda a, b: fixed_grid(engine, expression, a, b, points)  # noqa: E731
+            else:
+                draw = lambda a, b: sampler.sample(expression, a, b, WIDTH)  # noqa: E731
+            label = expression if i == 0 else ""
+            try:
+                start = time.perf_counter()
+                xs, ys = draw(xmin, xmax)
+            except Exception as ex:
+                print(f"{label:<24} {name:>11} {'cannot plot: ' + type(ex).__name__:>20}")
+                continue
+            first = time.perf_counter() - start
+            start = time.perf_counter()
+            for a, b in views(xmin, xmax):
+                draw(a, b)
+            moved = time.perf_counter() - start
+            error = pixel_error(engine, expression, xmin, xmax, xs, ys)
+            print(f"{label:<24} {name:>11} {first * 1e3:8.2f} ms {moved * 1e3:7.1f} ms {xs.size:7d} {error:8.2%}")
+    for xmin, xmax in BAD_RANGES:
+        try:
+            FunctionSampler(engine).sample("x", xmin, xmax, WIDTH)
+        except ValueError:
+            continue
+        raise AssertionError(f"plotted x from {xmin} to {xmax}")
+    # A new answer keeps the tiles of curves that do not use ANS
+    sampler = FunctionSampler(engine)
+    for expression in ("sin(x)", "x*ANS"):
+        sampler.sample(expression, -360.0, 360.0, WIDTH)
+    engine.evaluate("42")
+    sampler.misses = 0
+    sampler.sample("sin(x)", -360.0, 360.0, WIDTH)
+    assert sampler.misses == 0, sampler.misses
+    sampler.sample("x*ANS", -360.0, 360.0, WIDTH)
+    assert sampler.misses > 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,123 @@
+"""
+Load generator for the asyncio service: latency percentiles and throughput.
+
+Starts `src/service.py` in a subprocess, opens several pipelining clients and
+reports p50/p99 request latency and requests per second. A second round adds
+a client that keeps asking for big factorials, to show that expensive work
+does not stall everyone else.
+
+Run: python benchmarks/bench_service.py [clients] [requests_per_client] [pipeline_depth]
+"""
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from collections import deque
+from typing import List, Tuple
+
+SRC = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+USE_UNIX = hasattr(socket, "AF_UNIX")
+
+
+async def connect(address: str) -> Tuple[asyncio.StreamReader, asyncio.StreamWriter]:
+    if USE_UNIX:
+        return await asyncio.open_unix_connection(address)
+    return await asyncio.open_connection("127.0.0.1", int(address))
+
+
+async def client(address: str, count: int, depth: int, latencies: List[float]) -> None:
+    reader, writer = await connect(address)
+    sent: deque = deque()
+    done = 0
+    i = 0
+    while done < count:
+        # Keep up to `depth` requests in flight
+        while i < count and len(sent) < depth:
+            expr = f"{i % 97}*sin({i % 360}) + ANS/2"
+            writer.write((json.dumps({"id": i, "expr": expr}) + "\n").encode())
+            sent.append(time.perf_counter())
+            i += 1
+        await writer.drain()
+        line = await reader.readline()
+        latencies.append(time.perf_counter() - sent.popleft())
+        response = json.loads(line)
+        assert response["error"] == 0, response
+        done += 1
+    writer.close()
+
+
+async def heavy_client(address: str, stop: asyncio.Event, served: List[int]) -> None:
+    reader, writer = await connect(address)
+    n = 0
+    while not stop.is_set():
+        writer.write((json.dumps({"expr": f"factorial({30000 + n % 7})"}) + "\n").encode())
+        await writer.drain()
+        await reader.readline()
+        n += 1
+    served.append(n)
+    writer.close()
+
+
+async def run_round(address: str, clients: int, count: int, depth: int, with_heavy: bool) -> None:
+    latencies: List[float] = []
+    stop = asyncio.Event()
+    heavy_served: List[int] = []
+    heavy = asyncio.ensure_future(heavy_client(address, stop, heavy_served)) if with_heavy else None
+    start = time.perf_counter()
+    await asyncio.gather(*(client(address, count, depth, latencies) for _ in range(clients)))
+    elapsed = time.perf_counter() - start
+    if heavy is not None:
+        stop.set()
+        await heavy
+    latencies.sort()
+    p50 = latencies[len(latencies) // 2] * 1e3
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1e3
+    label = "with factorial client" if with_heavy else "cheap requests only"
+    extra = f"  ({heavy_served[0]} factorials served)" if heavy_served else ""
+    print(f"{label:<24} p50 {p50:7.3f} ms  p99 {p99:7.3f} ms  {len(latencies) / elapsed:9.0f} req/s{extra}")
+
+
+def wait_until_ready(address: str, timeout: float = 10.0) -> None:
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            if USE_UNIX:
+                with socket.socket(socket.AF_UNIX) as s:
+                    s.connect(address)
+            else:
+                socket.create_connection(("127.0.0.1", int(address)), timeout=0.2).close()
+            return
+        except OSError:
+            time.sleep(0.05)
+    raise RuntimeError("service did not start")
+
+
+def main() -> int:
+    clients = int(sys.argv[1]) if len(sys.argv) > 1 else 8
+    count = int(sys.argv[2]) if len(sys.argv) > 2 else 5000
+    depth = int(sys.argv[3]) if len(sys.argv) > 3 else 16
+    tmp = tempfile.mkdtemp()
+    if USE_UNIX:
+        address = os.path.join(tmp, "calculator.sock")
+        args = ["--unix", address]
+    else:
+        address = "8765"
+        args = ["--port", address]
+    server = subprocess.Popen([sys.executable, os.path.join(SRC, "service.py"), *args], stderr=subprocess.DEVNULL)
+    try:
+        wait_until_ready(address)
+        print(f"{clients} clients x {count} requests, pipeline depth {depth}")
+        asyncio.run(run_round(address, clients, count, depth, with_heavy=False))
+        asyncio.run(run_round(address, clients, count, depth, with_heavy=True))
+    finally:
+        server.terminate()
+        server.wait()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,106 @@
+"""
+Statistics over a data file of a few million values, streamed (stats.py)
+against loading the whole column with NumPy first: time, peak memory and
+accuracy. Values sit far from zero (1e9 plus unit noise), where the
+textbook one-pass variance, sum(x^2)/n - mean^2, cancels to nothing; the
+streaming summary merges Welford-style and keeps its digits. Quantiles from
+the t-digest are compared by rank against the exact ones, and the last
+line shows a repeated call answered from the per-file cache. The engine
+runs with the default limits: the file pass has its own time budget
+(max_file_seconds), so millions of values do not hit the 2 s one.
+
+Run: python benchmarks/bench_stats.py [values]
+"""
+import math
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+import stats  # noqa: E402
+from calculator import CalculatorEngine  # noqa: E402
+from limits import Limits  # noqa: E402
+
+try:
+    import numpy as np
+except Exception:
+    np = None
+
+OFFSET = 1e9
+PERCENTS = (0.1, 1.0, 50.0, 99.0, 99.9)
+
+
+def measure(run, setup=lambda: None):
+    """(result, seconds, peak MiB) of a call; memory is traced in a second run, as tracing slows it."""
+    setup()
+    start = time.perf_counter()
+    result = run()
+    elapsed = time.perf_counter() - start
+    setup()
+    tracemalloc.start()
+    run()
+    peak = tracemalloc.get_traced_memory()[1] / 2**20
+    tracemalloc.stop()
+    return result, elapsed, peak
+
+
+def textbook_stdev(values) -> float:
+    """One pass with sum and sum of squares: cancels for data far from zero."""
+    n = values.size
+    s, s2 = float(values.sum()), float(np.dot(values, values))
+    return math.sqrt(max(0.0, (s2 - s * s / n) / (n - 1)))
+
+
+def main() -> int:
+    if np is None:
+        print("NumPy is required for statistics on files (pip install numpy)")
+        return 1
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 5_000_000
+    rng = np.random.default_rng(7)
+    values = OFFSET + rng.standard_normal(count) * rng.choice([1.0, 3.0], count)
+    handle, path = tempfile.mkstemp(suffix=".csv")
+    os.close(handle)
+    try:
+        np.savetxt(path, values, fmt="%.17g", header="value", comments="")
+        size = os.path.getsize(path) / 2**20
+        engine = CalculatorEngine(load_session=False, limits=Limits())
+        quoted = path.replace("\\", "\\\\").replace("'", "\\'")
+        print(f"{count:,} values, {size:.0f} MiB file\n")
+
+        print(f"{'summary of the file':<32} {'time':>9} {'peak memory':>12}")
+        summary, streamed, streamed_peak = measure(lambda: engine.evaluate(f"stdev('{quoted}')"), stats.clear_cache)
+        assert not summary.startswith("Error"), summary  # whatever the pass took against the 2 s
+        print(f"  {'streamed (stats.py)':<30} {streamed:7.2f} s {streamed_peak:9.1f} MiB")
+        column, loaded, loaded_peak = measure(lambda: np.loadtxt(path, skiprows=1))
+        print(f"  {'whole column (np.loadtxt)':<30} {loaded:7.2f} s {loaded_peak:9.1f} MiB")
+        start = time.perf_counter()
+        engine.evaluate(f"percentile('{quoted}', 99)")
+        cached = time.perf_counter() - start
+        print(f"  {'next call, cached summary':<30} {cached * 1e3:7.2f} ms")
+
+        reference = float(np.std(column, ddof=1))  # two passes over the whole array
+        print(f"\n{'stdev (relative error)':<32} {'value':>18} {'error':>9}")
+        for name, value in [
+            ("streamed", float(engine.evaluate(f"stdev('{quoted}')"))),
+            ("textbook one pass", textbook_stdev(column)),
+        ]:
+            print(f"  {name:<30} {value:18.12g} {abs(value - reference) / reference:9.1e}")
+        mean = float(engine.evaluate(f"mean('{quoted}')"))
+        print(f"  {'mean (streamed)':<30} {mean:18.17g} {abs(mean - float(np.mean(column))) / OFFSET:9.1e}")
+
+        ordered = np.sort(column)
+        print(f"\n{'percentile (t-digest)':<32} {'value':>18} {'rank error':>11}")
+        for percent in PERCENTS:
+            value = float(engine.evaluate(f"percentile('{quoted}', {percent})"))
+            rank = np.searchsorted(ordered, value) / (count - 1) * 100
+            print(f"  {percent:<30g} {value:18.12g} {abs(rank - percent):10.4f}%")
+    finally:
+        os.remove(path)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,139 @@
+"""
+Exact (symbolic) derivatives against numerical ones: diff(...) at a point,
+diff(...) over a plot's worth of points, and solve(...) with an exact or a
+finite-difference Newton slope. The last part shows the hash-consed node
+table: how much of a tree with repeated subtrees is stored, and the cost of
+a derivative worked out for the first time against one found in the memo.
+
+Run: python benchmarks/bench_symbolic.py
+"""
+import math
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+import symbolic  # noqa: E402
+from calculator import CalculatorEngine  # noqa: E402
+from expression import parse  # noqa: E402
+
+try:
+    import numpy as np
+except Exception:
+    np = None
+
+D = math.pi / 180
+# diff(expression, x, at) with the derivative worked out by hand (degrees for trig)
+DIFF_CASES = [
+    ("x^3", 2.0, lambda x: 3 * x**2),
+    ("sin(x)*x^2", 30.0, lambda x: D * math.cos(x * D) * x**2 + 2 * x * math.sin(x * D)),
+    ("ln(x)/x", 0.001, lambda x: (1 - math.log(x)) / x**2),
+    ("sqrt(1 + x^2)", 3.0, lambda x: x / math.sqrt(1 + x**2)),
+    ("atan(x)", 0.5, lambda x: 1 / D / (1 + x**2)),
+    ("x^x", 1.5, lambda x: x**x * (math.log(x) + 1)),
+]
+CURVES = ["sin(x)*x^2", "e^(-x^2/2)*cos(20x)", "g(x)"]
+SOLVE_CASES = ["solve(x^5 - 3x + 1, x, 2)", "solve(cos(x) - x/100, x, 50)", "solve(e^x - 10x, x, 5)"]
+# User functions whose body binds the name passed in: (definition, expression, value)
+CAPTURE_CASES = [
+    ("f(a) = integrate(x^a, x, 0, 1)", "diff(f(x), x, 2)", -1 / 9),
+    ("k(a) = diff(x^a, x, 1)", "diff(k(x), x, 2)", 1.0),
+]
+# Undefined everywhere: simplify must not turn them into 0
+UNDEFINED_CASES = ["0/0", "0*ln(0)", "(x-x)/(x-x)", "x^2*0/0"]
+
+
+def best(run, repeat: int = 5, number: int = 20) -> float:
+    """Best time per call over `repeat` rounds of `number` calls."""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            run()
+        times.append((time.perf_counter() - start) / number)
+    return min(times)
+
+
+def nested(depth: int) -> str:
+    """sin(sin(...)) with each level used twice, so the tree doubles per level but shares."""
+    text = "x"
+    for _ in range(depth):
+        text = f"sin({text})*cos({text})"
+    return text
+
+
+def tree_size(node) -> int:
+    tag = node[0]
+    if tag == "bin":
+        return 1 + tree_size(node[2]) + tree_size(node[3])
+    if tag == "neg":
+        return 1 + tree_size(node[1])
+    if tag == "call":
+        return 1 + sum(tree_size(arg) for arg in node[2])
+    return 1
+
+
+def main() -> int:
+    if np is None:
+        print("NumPy is required for the calculus functions (pip install numpy)")
+        return 1
+    exact = CalculatorEngine(load_session=False)
+    numeric = CalculatorEngine(load_session=False)
+    # Turn the symbolic path off: every derivative is numerical
+    numeric.core.calculus.derivative = lambda func: None
+    for engine in (exact, numeric):
+        engine.evaluate_vectorized("x", x=np.zeros(1))  # build the vector namespace up front
+        engine.evaluate("g(x) = x^3/(1 + x^2)")
+
+    print(f"{'diff at a point':<28} {'exact err':>10} {'numeric err':>12} {'exact':>10} {'numeric':>10}")
+    for expression, at, reference in DIFF_CASES:
+        text = f"diff({expression}, x, {at!r})"
+        want = reference(at)
+        errors = [abs(float(engine.evaluate(text)) - want) / abs(want) for engine in (exact, numeric)]
+        times = [best(lambda: engine.evaluate(text)) for engine in (exact, numeric)]
+        print(f"  {expression:<26} {errors[0]:10.1e} {errors[1]:12.1e} {times[0] * 1e3:7.3f} ms {times[1] * 1e3:7.3f} ms")
+
+    xs = np.linspace(-5.0, 5.0, 801)
+    print(f"\n{'diff over 801 points (plot)':<28} {'max diff':>10} {'':>12} {'exact':>10} {'numeric':>10}")
+    for expression in CURVES:
+        text = f"diff({expression}, x, x)"
+        ys = [engine.evaluate_vectorized(text, x=xs) for engine in (exact, numeric)]
+        gap = float(np.max(np.abs(ys[0] - ys[1]) / np.maximum(1.0, np.abs(ys[0]))))
+        times = [best(lambda: engine.evaluate_vectorized(text, x=xs), repeat=3, number=1) for engine in (exact, numeric)]
+        print(f"  {expression:<26} {gap:10.1e} {'':>12} {times[0] * 1e3:7.2f} ms {times[1] * 1e3:7.1f} ms")
+
+    print(f"\n{'solve (Newton slope)':<28} {'':>10} {'':>12} {'exact':>10} {'numeric':>10}")
+    for text in SOLVE_CASES:
+        results = [engine.evaluate(text) for engine in (exact, numeric)]
+        assert abs(float(results[0]) - float(results[1])) <= 1e-9 * abs(float(results[1])), results
+        times = [best(lambda: engine.evaluate(text), repeat=9, number=50) for engine in (exact, numeric)]
+        print(f"  {text:<38} {'':>12} {times[0] * 1e3:7.3f} ms {times[1] * 1e3:7.3f} ms")
+
+    for definition, text, want in CAPTURE_CASES:
+        # Inlining renames the bound x, so it does not capture the x passed in
+        exact.evaluate(definition)
+        assert abs(float(exact.evaluate(text)) - want) <= 1e-6, (definition, text)
+    for text in UNDEFINED_CASES:
+        assert exact.simplify(text) != "0", text
+        assert exact.evaluate(f"diff({text}, x, 3)").startswith("Error"), text
+
+    print(f"\n{'hash-consing':<28} {'tree nodes':>10} {'shared':>12} {'first':>10} {'memoized':>10}")
+    for depth in (4, 8, 12):
+        tree = parse(nested(depth))
+        symbolic.TABLE.clear()
+        symbolic.intern(tree)
+        shared = len(symbolic.TABLE.nodes)
+        start = time.perf_counter()
+        result = symbolic.derivative(tree, "x")
+        first = time.perf_counter() - start
+        again = best(lambda: symbolic.derivative(tree, "x"))
+        print(
+            f"  nested depth {depth:<13} {tree_size(tree):10d} {shared:12d} {first * 1e3:7.2f} ms {again * 1e6:7.2f} us"
+        )
+        assert result is symbolic.derivative(parse(nested(depth)), "x")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
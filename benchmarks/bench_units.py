@@ -0,0 +1,64 @@
+"""
+Unit conversion: the old per-call table lookup against the cached registry
+factor, and scalar loops against one vectorized multiply over many values.
+
+Run: python benchmarks/bench_units.py [count]
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from units import REGISTRY  # noqa: E402
+
+try:
+    import numpy as np
+except Exception:
+    np = None
+
+
+def table_convert(value: float, from_unit: str, to_unit: str) -> float:
+    """The previous approach: rebuild the tables and scan them on every call."""
+    length_in_m = {"m": 1.0, "km": 1000.0, "cm": 0.01, "mm": 0.001, "mi": 1609.344, "yd": 0.9144, "ft": 0.3048, "in": 0.0254}
+    weight_in_kg = {"kg": 1.0, "g": 0.001, "lb": 0.45359237, "oz": 0.028349523125}
+    volume_in_l = {"l": 1.0, "ml": 0.001, "gal": 3.785411784}
+    src = from_unit.lower()
+    dst = to_unit.lower()
+    for table in (length_in_m, weight_in_kg, volume_in_l):
+        if src in table and dst in table:
+            return value * table[src] / table[dst]
+    raise ValueError("Incompatible or unsupported units")
+
+
+def timed(label: str, count: int, func) -> float:
+    start = time.perf_counter()
+    func()
+    elapsed = time.perf_counter() - start
+    print(f"{label:<38} {elapsed * 1e9 / count:9.1f} ns/value")
+    return elapsed
+
+
+def main() -> int:
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    scalar_count = min(count, 200_000)
+    values = [float(i % 1000) for i in range(scalar_count)]
+    print(f"scalar loops: {scalar_count} values, bulk: {count} values")
+
+    timed("tables rebuilt per call (mi -> km)", scalar_count, lambda: [table_convert(v, "mi", "km") for v in values])
+    timed("registry convert (mi -> km)", scalar_count, lambda: [REGISTRY.convert(v, "mi", "km") for v in values])
+    timed("registry convert (km/h -> m/s)", scalar_count, lambda: [REGISTRY.convert(v, "km/h", "m/s") for v in values])
+    factor = REGISTRY.factor("mi", "km")
+    timed("hoisted factor, Python multiply", scalar_count, lambda: [v * factor for v in values])
+
+    if np is None:
+        print("NumPy not installed; skipping the vectorized rows")
+        return 0
+    array = np.arange(count, dtype=float)
+    timed("convert_array (new array)", count, lambda: REGISTRY.convert_array(array, "kWh", "MJ"))
+    timed("convert_array (in place, out=)", count, lambda: REGISTRY.convert_array(array, "kWh", "MJ", out=array))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
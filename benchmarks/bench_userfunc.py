@@ -0,0 +1,61 @@
+"""
+User-defined functions: the cost of a call against the same formula typed
+inline, naive recursion with and without memoization, and how long a
+(re)definition takes.
+
+Run: python benchmarks/bench_userfunc.py [count] [fib_n]
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from calculator import CalculatorEngine  # noqa: E402
+
+
+def timed(label: str, count: int, func) -> None:
+    start = time.perf_counter()
+    func()
+    elapsed = time.perf_counter() - start
+    print(f"{label:<44} {elapsed * 1e6 / count:10.2f} us/expr")
+
+
+def main() -> int:
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    fib_n = int(sys.argv[2]) if len(sys.argv) > 2 else 22
+    engine = CalculatorEngine(load_session=False)
+    engine.evaluate("p(x) = x^2 + 3x + 1")
+    # Reading ANS (always 0 here) makes this variant impure, so it is never memoized
+    engine.evaluate("p2(x) = x^2 + 3x + 1 + 0*ANS")
+    # Few enough distinct texts to stay in the compile cache, so only evaluation is timed
+    inline = [f"({k % 1000})^2 + 3({k % 1000}) + 1" for k in range(count)]
+    calls = [f"p({k % 1000})" for k in range(count)]
+    impure_calls = [f"p2({k % 1000})" for k in range(count)]
+    for exprs in (inline, calls, impure_calls):
+        engine.evaluate_many(exprs)
+    timed("inline formula", count, lambda: engine.evaluate_many(inline))
+    timed("pure user function (memoized)", count, lambda: engine.evaluate_many(calls))
+    timed("impure user function", count, lambda: engine.evaluate_many(impure_calls))
+
+    engine.evaluate("fib(n) = if(n < 2, n, fib(n - 1) + fib(n - 2))")
+    engine.evaluate("slowfib(n) = if(n < 2, n + 0*ANS, slowfib(n - 1) + slowfib(n - 2))")
+    start = time.perf_counter()
+    slow = engine.evaluate(f"slowfib({fib_n})")
+    t_slow = time.perf_counter() - start
+    start = time.perf_counter()
+    fast = engine.evaluate(f"fib({fib_n})")
+    t_fast = time.perf_counter() - start
+    assert slow == fast, (slow, fast)
+    print(f"fib({fib_n}) = {fast}: unmemoized {t_slow * 1e3:.1f} ms, memoized {t_fast * 1e3:.3f} ms ({t_slow / t_fast:.0f}x)")
+
+    definitions = 2000
+    start = time.perf_counter()
+    for k in range(definitions):
+        engine.evaluate(f"q(x) = x * {k} + fib(x)")
+    print(f"{'redefinition (compile + invalidate)':<44} {(time.perf_counter() - start) * 1e6 / definitions:10.2f} us/def")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,11 +1,563 @@
+import decimal
+import functools
 import math
-import json
 import os
-import re
-from typing import Any, Callable, Dict, List, Tuple, Union
+import threading
+from collections import OrderedDict, deque
+from fractions import Fraction
+from typing import Any, Callable, Deque, Dict, Hashable, Iterable, List, NamedTuple, Optional, Tuple, Union
 
+try:
+    import numpy as np  # type: ignore
+except Exception:
+    np = None  # type: ignore
 
-Number = Union[int, float, complex]
+import symbolic
+from expression import CONDITIONAL, Definition, Node, ParseError, Program, compile_expression, parse, parse_definition
+from history import HistoryBuffer, HistoryIndex
+from currency import DEFAULT_TABLE_PATH, RateTable, is_currency_code, open_rate_table
+from limits import (
+    DEFAULT_LIMITS,
+    BudgetExceeded,
+    ExponentTooLarge,
+    IntegerTooLarge,
+    Limits,
+    TimeLimitExceeded,
+    check_factorial,
+)
+from calculus import Calculus
+from matrix import MATRIX_FUNCTIONS, is_matrix
+from numeric import FLOAT, NumericBackend, backend_for, backend_from_settings, deserialize_number, serialize_number
+from session import SessionStore
+from stats import READS_FILES, STATISTICS_FUNCTIONS
+from units import REGISTRY, UnitRegistry
+from userfunc import Scope, UserFunction, dependents, update_purity
+
+
+# Decimal and Fraction appear in the exact numeric modes (see numeric.py)
+Number = Union[int, float, complex, decimal.Decimal, Fraction]
+
+# Default number of entries kept in memory; the on-disk journal may hold more
+HISTORY_LIMIT = 1000
+
+# Per-item error codes reported by CalculatorEngine.evaluate_many
+ERR_OK = 0
+ERR_SYNTAX = 1
+ERR_DIVISION_BY_ZERO = 2
+ERR_VALUE = 3
+ERR_OVERFLOW = 4
+ERR_NAME = 5
+ERR_TYPE = 6
+ERR_OTHER = 7
+# Budget overruns (see limits.py)
+ERR_TIMEOUT = 8
+ERR_INTEGER_TOO_LARGE = 9
+ERR_EXPONENT_TOO_LARGE = 10
+
+
+class BatchResult(NamedTuple):
+    """Results of evaluate_many: one value (or None) and one error code per input."""
+
+    values: List[Any]
+    errors: List[int]
+
+
+# ------------------------- Scientific functions ----------------------------
+# Trig in degrees for sin/cos/tan; inverse trig returns degrees
+def _sin_deg(x: Number) -> float:
+    return math.sin(math.radians(float(x)))
+
+
+def _cos_deg(x: Number) -> float:
+    return math.cos(math.radians(float(x)))
+
+
+def _tan_deg(x: Number) -> float:
+    return math.tan(math.radians(float(x)))
+
+
+def _asin_deg(x: Number) -> float:
+    return math.degrees(math.asin(float(x)))
+
+
+def _acos_deg(x: Number) -> float:
+    return math.degrees(math.acos(float(x)))
+
+
+def _atan_deg(x: Number) -> float:
+    return math.degrees(math.atan(float(x)))
+
+
+def _ln(x: Number) -> float:
+    return math.log(float(x))
+
+
+def _log10(x: Number) -> float:  # base-10
+    return math.log10(float(x))
+
+
+def _sqrt(x: Number) -> Number:
+    if isinstance(x, (int, float)) and x < 0:
+        # allow complex sqrt
+        return complex(0, math.sqrt(abs(float(x))))
+    return math.sqrt(float(x))
+
+
+def _factorial(n: Number) -> int:
+    n_float = float(n)
+    if not n_float.is_integer() or n_float < 0:
+        raise ValueError("factorial() only defined for non-negative integers")
+    check_factorial(int(n_float))
+    return math.factorial(int(n_float))
+
+
+def _to_rad(x: Number) -> float:
+    return math.radians(float(x))
+
+
+def _to_deg(x: Number) -> float:
+    return math.degrees(float(x))
+
+
+# ----------------------- NumPy-aware scientific functions -------------------
+# Elementwise counterparts of the scalar helpers used by evaluate_vectorized.
+# Invalid points become nan (or complex for sqrt) instead of raising.
+def _np_sin_deg(x: Any) -> Any:
+    return np.sin(np.radians(x))
+
+
+def _np_cos_deg(x: Any) -> Any:
+    return np.cos(np.radians(x))
+
+
+def _np_tan_deg(x: Any) -> Any:
+    return np.tan(np.radians(x))
+
+
+def _np_asin_deg(x: Any) -> Any:
+    return np.degrees(np.arcsin(x))
+
+
+def _np_acos_deg(x: Any) -> Any:
+    return np.degrees(np.arccos(x))
+
+
+def _np_atan_deg(x: Any) -> Any:
+    return np.degrees(np.arctan(x))
+
+
+def _np_sqrt(x: Any) -> Any:
+    # Complex results only where the input is negative
+    return np.emath.sqrt(x)
+
+
+_NP_FACTORIALS: Any = None
+
+
+def _np_factorial(n: Any) -> Any:
+    global _NP_FACTORIALS
+    if _NP_FACTORIALS is None:
+        # 0!..170! fit in a float64; index 171 stands for overflow
+        _NP_FACTORIALS = np.array([float(math.factorial(k)) for k in range(171)] + [math.inf])
+    n = np.asarray(n, dtype=float)
+    valid = (n >= 0) & (n == np.floor(n))
+    idx = np.where(valid, np.minimum(n, 171), 0).astype(np.intp)
+    return np.where(valid, _NP_FACTORIALS[idx], np.nan)
+
+
+def _np_round(x: Any, ndigits: int = 0) -> Any:
+    return np.round(x, int(ndigits))
+
+
+def _np_min(*args: Any) -> Any:
+    if len(args) == 1:
+        return np.min(args[0])
+    return functools.reduce(np.minimum, args)
+
+
+def _np_max(*args: Any) -> Any:
+    if len(args) == 1:
+        return np.max(args[0])
+    return functools.reduce(np.maximum, args)
+
+
+def _error_code(ex: Exception) -> int:
+    if isinstance(ex, BudgetExceeded):
+        if isinstance(ex, TimeLimitExceeded):
+            return ERR_TIMEOUT
+        if isinstance(ex, ExponentTooLarge):
+            return ERR_EXPONENT_TOO_LARGE
+        if isinstance(ex, IntegerTooLarge):
+            return ERR_INTEGER_TOO_LARGE
+        return ERR_OTHER
+    if isinstance(ex, (ParseError, SyntaxError)):
+        return ERR_SYNTAX
+    if isinstance(ex, decimal.Overflow):
+        return ERR_OVERFLOW
+    if isinstance(ex, ZeroDivisionError):
+        return ERR_DIVISION_BY_ZERO
+    if isinstance(ex, (ValueError, decimal.InvalidOperation)):
+        return ERR_VALUE
+    if isinstance(ex, OverflowError):
+        return ERR_OVERFLOW
+    if isinstance(ex, NameError):
+        return ERR_NAME
+    if isinstance(ex, TypeError):
+        return ERR_TYPE
+    return ERR_OTHER
+
+
+def _pure(names: Dict[str, Any]) -> Dict[str, Callable[..., Any]]:
+    """Functions the optimizer may fold: every callable but those reading files."""
+    return {name: value for name, value in names.items() if callable(value) and name not in READS_FILES}
+
+
+class UserFunctions(dict):
+    """
+    Mapping of user-defined functions (name -> callable): UserFunction
+    objects for definitions typed as expressions, or any Python callable.
+    Every change is pushed to the engine's namespace overlay so evaluation
+    never has to rebuild or merge namespaces. Built-in names are reserved:
+    compiled expressions may have folded them into constants.
+    """
+
+    def __init__(
+        self,
+        on_change: Callable[[str, Optional[Callable[..., Number]]], None],
+        reserved: Iterable[str] = (),
+    ) -> None:
+        super().__init__()
+        self._on_change = on_change
+        self._reserved = frozenset(reserved)
+
+    def __setitem__(self, name: str, func: Callable[..., Number]) -> None:
+        if name in self._reserved:
+            raise ValueError(f"'{name}' is a built-in name and cannot be redefined")
+        super().__setitem__(name, func)
+        self._on_change(name, func)
+
+    def __delitem__(self, name: str) -> None:
+        super().__delitem__(name)
+        self._on_change(name, None)
+
+    def pop(self, name: str, *default: Any) -> Any:
+        existed = name in self
+        value = super().pop(name, *default)
+        if existed:
+            self._on_change(name, None)
+        return value
+
+    def popitem(self) -> Tuple[str, Callable[..., Number]]:
+        name, func = super().popitem()
+        self._on_change(name, None)
+        return name, func
+
+    def setdefault(self, name: str, default: Any = None) -> Any:
+        if name not in self:
+            self[name] = default
+        return self[name]
+
+    def update(self, *args: Any, **kwargs: Any) -> None:
+        for name, func in dict(*args, **kwargs).items():
+            self[name] = func
+
+    def clear(self) -> None:
+        for name in list(self):
+            del self[name]
+
+
+class ExpressionCache:
+    """
+    Bounded LRU cache mapping raw expressions to compiled programs.
+    Tracks hits, misses and evictions so callers can size it sensibly.
+    Safe to share between threads: lookups take no lock (single dict
+    operations are atomic), only inserts and evictions do. Counters are
+    approximate under concurrent use.
+    """
+
+    def __init__(self, maxsize: int = 4096) -> None:
+        self.maxsize = max(0, int(maxsize))
+        self._data: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        value = self._data.get(key)
+        if value is None:
+            self.misses += 1
+            return None
+        try:
+            self._data.move_to_end(key)
+        except KeyError:
+            # Evicted by another thread since the lookup; the value is still valid
+            pass
+        self.hits += 1
+        return value
+
+    def peek(self, key: Hashable) -> Optional[Any]:
+        """Look up without touching LRU order or counters."""
+        return self._data.get(key)
+
+    def put(self, key: Hashable, value: Any) -> None:
+        if self.maxsize == 0:
+            return
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class EngineCore:
+    """
+    Shared, read-only part of the calculator: the base namespace, unit
+    registry, optimizer inputs and the compiled-expression cache. It holds no
+    per-user state, so one core can back any number of CalculatorEngine
+    sessions across threads or asyncio tasks. Nothing changes after
+    construction except the cache (which locks only on inserts), the lazily
+    built vector namespace and the lazily opened exchange rate table.
+    """
+
+    def __init__(
+        self,
+        cache_size: int = 4096,
+        units: Optional[UnitRegistry] = None,
+        rates_path: Optional[str] = None,
+    ) -> None:
+        self.units = REGISTRY if units is None else units
+        self.rates_path = rates_path or DEFAULT_TABLE_PATH
+        self._rates: Optional[RateTable] = None
+        self._rates_loaded = False
+        # integrate/diff/solve/minimize evaluate their expression on NumPy batches
+        self.calculus = Calculus(lambda: self.vector_names)
+        self.base_names: Dict[str, Any] = self._build_base_names()
+        # What the optimizer may fold at compile time; ANS/MR/user functions stay live
+        self.constants: Dict[str, Any] = {"pi": math.pi, "e": math.e}
+        self.pure_functions: Dict[str, Callable[..., Any]] = _pure(self.base_names)
+        # Names a user function may call and still be memoized
+        self.stable_names = frozenset(self.base_names) - READS_FILES
+        self.reserved_names = frozenset(self.base_names) | {"ANS", "MR", "i", "I", CONDITIONAL}
+        # Compiled expressions keyed by raw input; ANS/MR are bound at eval time
+        self.expression_cache = ExpressionCache(cache_size)
+        self._vector_names: Optional[Dict[str, Any]] = None
+        # (names, pure functions, constants) per exact numeric backend
+        self._backend_names: Dict[Hashable, Tuple[Dict[str, Any], Dict[str, Any], Dict[str, Any]]] = {}
+        self._lock = threading.Lock()
+
+    def session(self, **kwargs: Any) -> "CalculatorEngine":
+        """
+        New per-session engine on this core. Cheap: no namespace building and,
+        unless load_session=True is passed, no disk I/O.
+        """
+        kwargs.setdefault("load_session", False)
+        return CalculatorEngine(core=self, **kwargs)
+
+    def compile(self, expression: str, backend: Optional[NumericBackend] = None) -> Program:
+        if backend is not None and backend is not FLOAT:
+            return self._compile_exact(expression, backend)
+        program = self.expression_cache.get(expression)
+        if program is None:
+            # Two threads may compile the same text at once; either result is fine
+            program = compile_expression(
+                "" if expression is None else expression,
+                self.pure_functions,
+                self.constants,
+                self.unit_factor,
+            )
+            self.expression_cache.put(expression, program)
+        return program
+
+    def _compile_exact(self, expression: str, backend: NumericBackend) -> Program:
+        # Literals and folded constants depend on the backend, so it is part of the key
+        key = (backend.key, expression)
+        program = self.expression_cache.get(key)
+        if program is None:
+            _, pure, constants = self._exact_names(backend)
+            with backend.context():
+                program = compile_expression(
+                    "" if expression is None else expression,
+                    pure,
+                    constants,
+                    lambda a, b: backend.from_ratio(self.exact_unit_factor(a, b)),
+                    backend.literal,
+                )
+            self.expression_cache.put(key, program)
+        return program
+
+    def names_for(self, backend: NumericBackend) -> Dict[str, Any]:
+        """Base namespace for a numeric backend (float uses base_names)."""
+        if backend is FLOAT:
+            return self.base_names
+        return self._exact_names(backend)[0]
+
+    def _exact_names(self, backend: NumericBackend) -> Tuple[Dict[str, Any], Dict[str, Any], Dict[str, Any]]:
+        entry = self._backend_names.get(backend.key)
+        if entry is None:
+            with self._lock:
+                names = dict(self.base_names)
+                names.update(backend.functions(self.exact_unit_factor))
+                pure = _pure(names)
+                entry = (names, pure, backend.constants())
+                self._backend_names[backend.key] = entry
+        return entry
+
+    @property
+    def vector_names(self) -> Dict[str, Any]:
+        """NumPy namespace for evaluate_vectorized, built on first use."""
+        if self._vector_names is None:
+            with self._lock:
+                if self._vector_names is None:
+                    self._vector_names = self._build_vector_names()
+        return self._vector_names
+
+    @property
+    def rates(self) -> Optional[RateTable]:
+        """Exchange rate table, memory-mapped on first use; None if there is none."""
+        if not self._rates_loaded:
+            with self._lock:
+                if not self._rates_loaded:
+                    try:
+                        self._rates = open_rate_table(self.rates_path)
+                    except (OSError, ValueError):
+                        self._rates = None
+                    self._rates_loaded = True
+        return self._rates
+
+    def reload_rates(self) -> None:
+        """Pick up a newly imported rate table."""
+        with self._lock:
+            self._rates = None
+            self._rates_loaded = False
+        # Compiled programs may hold folded conversions at the old rates
+        self.expression_cache.clear()
+
+    # ------------------------------ Namespace ------------------------------
+    def _build_base_names(self) -> Dict[str, Any]:
+        """Immutable part of the namespace: constants and pure functions."""
+        return {
+            # constants
+            "pi": math.pi,
+            "e": math.e,
+            # trig/log
+            "sin": _sin_deg,
+            "cos": _cos_deg,
+            "tan": _tan_deg,
+            "asin": _asin_deg,
+            "acos": _acos_deg,
+            "atan": _atan_deg,
+            "ln": _ln,
+            "log": _log10,
+            "sqrt": _sqrt,
+            "factorial": _factorial,
+            "rad": _to_rad,
+            "deg": _to_deg,
+            # conversions
+            "convert": self.convert,
+            # built-in safe functions
+            "abs": abs,
+            "round": round,
+            "min": min,
+            "max": max,
+            # linear algebra on matrix literals (NumPy)
+            **MATRIX_FUNCTIONS,
+            # numerical calculus (solve(A, b) still solves linear systems)
+            **self.calculus.functions(),
+            # statistics over lists, arrays and data files
+            **STATISTICS_FUNCTIONS,
+        }
+
+    def _build_vector_names(self) -> Dict[str, Any]:
+        """Base namespace with NumPy-aware functions for evaluate_vectorized."""
+        names = dict(self.base_names)
+        names.update(
+            {
+                "sin": _np_sin_deg,
+                "cos": _np_cos_deg,
+                "tan": _np_tan_deg,
+                "asin": _np_asin_deg,
+                "acos": _np_acos_deg,
+                "atan": _np_atan_deg,
+                "ln": np.log,
+                "log": np.log10,
+                "sqrt": _np_sqrt,
+                "factorial": _np_factorial,
+                "rad": np.radians,
+                "deg": np.degrees,
+                "convert": self.convert_array,
+                "abs": np.abs,
+                "round": _np_round,
+                "min": _np_min,
+                "max": _np_max,
+            }
+        )
+        return names
+
+    # --------------------------- Unit conversion ---------------------------
+    # Units and currencies share convert(); `when` (a date) picks historical rates
+    def convert(self, value: Number, from_unit: str, to_unit: str, when: Any = None) -> float:
+        return float(value) * self.unit_factor(from_unit, to_unit, when)
+
+    def unit_factor(self, from_unit: str, to_unit: str, when: Any = None) -> float:
+        # Conversions are linear, so convert(v, a, b) == v * factor(a, b)
+        from_unit, to_unit = str(from_unit), str(to_unit)
+        rates = self.rates
+        if rates is not None and from_unit in rates.index and to_unit in rates.index:
+            return rates.rate(from_unit, to_unit, when)
+        if when is not None:
+            raise ValueError("A date only applies to currency conversion")
+        try:
+            return self.units.factor(from_unit, to_unit)
+        except ValueError:
+            self._check_currencies(from_unit, to_unit)
+            raise
+
+    def exact_unit_factor(self, from_unit: str, to_unit: str, when: Any = None) -> Fraction:
+        """unit_factor() as an exact ratio, for the decimal and fraction modes."""
+        from_unit, to_unit = str(from_unit), str(to_unit)
+        rates = self.rates
+        if rates is not None and from_unit in rates.index and to_unit in rates.index:
+            return rates.exact_rate(from_unit, to_unit, when)
+        if when is not None:
+            raise ValueError("A date only applies to currency conversion")
+        try:
+            return self.units.exact_factor(from_unit, to_unit)
+        except ValueError:
+            self._check_currencies(from_unit, to_unit)
+            raise
+
+    def _check_currencies(self, from_unit: str, to_unit: str) -> None:
+        # Neither units nor known currencies: explain currency codes specifically
+        if is_currency_code(from_unit) and is_currency_code(to_unit):
+            rates = self.rates
+            if rates is None:
+                raise ValueError("No exchange rates loaded (import them with currency.py)")
+            raise ValueError(f"Unknown currency '{from_unit if from_unit not in rates.index else to_unit}'")
+
+    def convert_array(self, value: Any, from_unit: str, to_unit: str, when: Any = None) -> Any:
+        # One cached factor serves every element
+        return np.asarray(value, dtype=float) * self.unit_factor(from_unit, to_unit, when)
+
+    def convert_units(self, value: float, from_unit: str, to_unit: str) -> float:
+        return value * self.unit_factor(from_unit, to_unit)
 
 
 class CalculatorEngine:
@@ -14,47 +566,242 @@ class CalculatorEngine:
     - Safe expression evaluation with scientific functions
     - Memory operations (MC, MR, M+, M-)
     - Calculation history and last answer (ANS)
-    - Session persistence (history, memory, last_answer)
+    - User-defined functions ("f(x) = x^2"), compiled once
+    - Symbolic simplify, derivative and expand (see symbolic.py)
+    - Statistics over lists, arrays and data files (see stats.py)
+    - Session persistence (history, memory, last_answer, definitions)
+
+    The engine is one session: ANS, memory, history and user functions are
+    its own, and it should be used by one thread (or task) at a time. The
+    namespaces and compile cache live in an EngineCore, which sessions can
+    share; pass core= (or use EngineCore.session()) to create sessions
+    cheaply for concurrent servers.
     """
 
-    def __init__(self) -> None:
+    def __init__(
+        self,
+        cache_size: int = 4096,
+        history_size: int = HISTORY_LIMIT,
+        session_path: Optional[str] = None,
+        load_session: bool = True,
+        core: Optional[EngineCore] = None,
+        limits: Optional[Limits] = None,
+        numeric: Optional[NumericBackend] = None,
+    ) -> None:
+        # cache_size only applies when this engine creates its own core
+        self._core = core if core is not None else EngineCore(cache_size)
+        # Time and integer-size budget applied to every evaluation (None disables it)
+        self.limits: Optional[Limits] = limits if limits is not None else DEFAULT_LIMITS
+        # Namespace = shared immutable base + thin per-session overlay of live values.
+        # MR is a bound method, so memory changes need no overlay update.
+        self._backend: NumericBackend = numeric if numeric is not None else FLOAT
+        self._base_names: Dict[str, Any] = self._core.names_for(self._backend)
+        self._constants = self._core.constants
+        self._pure_functions = self._core.pure_functions
+        self.reserved_names = self._core.reserved_names
+        self._last_answer: Number = 0
+        self._overlay: Dict[str, Any] = {"ANS": self._last_answer, "MR": self.memory_recall}
+        # What user function bodies see besides their parameters
+        self._scope = Scope(self._overlay, self._base_names)
         self.memory_value: Number = 0
-        self.last_answer: Number = 0
-        self.history: List[Tuple[str, str]] = []  # (expression, result)
-        self._session_file_path = os.path.join(
+        self.history = HistoryBuffer(history_size)  # (expression, result) ring buffer
+        self._session_file_path = session_path or os.path.join(
             os.path.dirname(os.path.abspath(__file__)), "..", ".calculator_session.json"
         )
+        self._session_store = SessionStore(self._session_file_path)
+        # History entries not yet appended to the journal
+        self._unsaved: Deque[Tuple[str, str]] = deque(maxlen=self._session_store.journal_limit)
+        self._journal_reset = False  # history was cleared; rewrite journal on save
+        # Search index over the whole persisted history, built on first search
+        self._history_index: Optional[HistoryIndex] = None
         # User-defined functions mapping: name -> callable
-        self.user_functions: Dict[str, Callable[..., Number]] = {}
-        self.load_session()
+        self._user_functions = UserFunctions(self._sync_user_function, self.reserved_names)
+        self.expression_cache = self._core.expression_cache
+        if load_session:
+            self.load_session()
+
+    @property
+    def last_answer(self) -> Number:
+        return self._last_answer
+
+    @last_answer.setter
+    def last_answer(self, value: Number) -> None:
+        self._last_answer = value
+        self._overlay["ANS"] = value
+
+    @property
+    def core(self) -> EngineCore:
+        return self._core
+
+    @property
+    def numeric_backend(self) -> NumericBackend:
+        return self._backend
+
+    @numeric_backend.setter
+    def numeric_backend(self, backend: NumericBackend) -> None:
+        self._use_backend(backend)
+        # Carry ANS and memory over into the new representation
+        for name in ("last_answer", "memory_value"):
+            try:
+                setattr(self, name, backend.coerce(getattr(self, name)))
+            except Exception:
+                setattr(self, name, backend.coerce(0))
+
+    def _use_backend(self, backend: NumericBackend) -> None:
+        self._backend = backend
+        self._base_names = self._scope.second = self._core.names_for(backend)
+        # Bodies hold literals of the old mode: compile them again
+        for name, func in list(self._user_functions.items()):
+            if isinstance(func, UserFunction):
+                self._user_functions[name] = self._user_function(func.definition)
+
+    def set_numeric_mode(self, mode: str, precision: Optional[int] = None) -> None:
+        """Switch between "float" (default), "decimal" (with precision) and "fraction"."""
+        self.numeric_backend = backend_for(mode, precision)
+
+    def parse_number(self, text: str) -> Number:
+        """Read a displayed result (e.g. "1/3", "0.25", "(1+2j)") as a number of the current mode."""
+        text = str(text).strip()
+        try:
+            return self._backend.coerce(self._backend.literal(text))
+        except (ValueError, ArithmeticError):
+            return self._backend.coerce(complex(text))
+
+    @property
+    def user_functions(self) -> UserFunctions:
+        return self._user_functions
+
+    @user_functions.setter
+    def user_functions(self, functions: Dict[str, Callable[..., Number]]) -> None:
+        self._user_functions.clear()
+        self._user_functions.update(functions)
+
+    def define_function(self, definition: str) -> UserFunction:
+        """
+        Define or replace a function from text such as "f(x, y) = x^2 + y"
+        (what evaluate() does for definitions, without touching history).
+        """
+        parsed = parse_definition(definition)
+        if parsed is None:
+            raise ParseError("Expected a definition such as f(x) = x^2")
+        return self._define(parsed)
+
+    def function_definitions(self) -> List[str]:
+        """Source of every function defined from text, in definition order."""
+        return [func.source for func in self._user_functions.values() if isinstance(func, UserFunction)]
+
+    def fork(self) -> "CalculatorEngine":
+        """
+        Independent copy of this session's state (mode, limits, ANS, memory and
+        functions) on the same core, without history. Lets a worker thread
+        evaluate while this engine keeps changing.
+        """
+        engine = CalculatorEngine(core=self._core, load_session=False, limits=self.limits, numeric=self._backend)
+        engine.last_answer = self._last_answer
+        engine.memory_value = self.memory_value
+        for name, func in self._user_functions.items():
+            if isinstance(func, UserFunction):
+                engine._define(func.definition)
+            else:
+                engine._user_functions[name] = func
+        return engine
 
     # ----------------------------- Session ---------------------------------
-    def save_session(self) -> None:
+    def save_session(self) -> Optional[str]:
+        """
+        Append new history to the journal and atomically replace the snapshot.
+        Returns None when everything was saved, else what was not; a value that
+        cannot be stored is left out without holding back the rest.
+        """
+        problems: List[str] = []
+        snapshot: Dict[str, Any] = {
+            "version": 2,
+            "numeric": self._backend.describe(),
+            "functions": self.function_definitions(),
+        }
+        for key, value in (("memory_value", self.memory_value), ("last_answer", self.last_answer)):
+            try:
+                snapshot[key] = self._serialize_number(value)
+            except Exception as ex:
+                problems.append(f"{key} not saved: {ex}")
         try:
-            data = {
-                "memory_value": self._serialize_number(self.memory_value),
-                "last_answer": self._serialize_number(self.last_answer),
-                "history": [(expr, res) for expr, res in self.history[-200:]],
-            }
-            with open(self._session_file_path, "w", encoding="utf-8") as f:
-                json.dump(data, f, ensure_ascii=False, indent=2)
-        except Exception:
-            # Best-effort persistence; ignore errors
-            pass
+            store = self._session_store
+            if self._journal_reset:
+                store.reset(self._unsaved)
+                self._journal_reset = False
+            else:
+                store.append(self._unsaved)
+            self._unsaved.clear()
+            store.write_snapshot(snapshot)
+        except Exception as ex:
+            problems.append(f"session not saved: {ex}")
+        return "; ".join(problems) or None
 
     def load_session(self) -> None:
+        """Load memory/ANS from the snapshot and only the newest history from the journal."""
+        self._unsaved.clear()
+        self._journal_reset = False
+        self._history_index = None
         try:
-            if os.path.exists(self._session_file_path):
-                with open(self._session_file_path, "r", encoding="utf-8") as f:
-                    data = json.load(f)
-                self.memory_value = self._deserialize_number(data.get("memory_value", 0))
-                self.last_answer = self._deserialize_number(data.get("last_answer", 0))
-                self.history = list(data.get("history", []))
+            store = self._session_store
+            data = store.read_snapshot()
+            if "numeric" in data:
+                self._use_backend(backend_from_settings(data["numeric"]))
+            for source in data.get("functions", ()):
+                try:
+                    self.define_function(source)
+                except Exception:
+                    # Skip definitions that no longer compile (e.g. a name became built-in)
+                    pass
+            self.memory_value = self._deserialize_number(data.get("memory_value", 0))
+            self.last_answer = self._deserialize_number(data.get("last_answer", 0))
+            legacy = data.get("history")
+            self.history.clear()
+            if legacy:
+                # Pre-journal session files kept history inline; migrate on next save
+                entries = [(str(expr), str(res)) for expr, res in legacy]
+                self.history.extend(entries)
+                self._unsaved.extend(entries)
+            else:
+                self.history.extend(store.read_tail(self.history.capacity))
         except Exception:
             # Ignore broken session files
             self.memory_value = 0
             self.last_answer = 0
-            self.history = []
+            self.history.clear()
+
+    def clear_history(self) -> None:
+        self.history.clear()
+        self._unsaved.clear()
+        self._journal_reset = True
+        if self._history_index is not None:
+            self._history_index.clear()
+
+    # ----------------------------- Search ----------------------------------
+    @property
+    def history_index(self) -> HistoryIndex:
+        """
+        Trigram index over all persisted history plus unsaved entries. Built
+        by streaming the journal on first use, then updated on every append.
+        """
+        if self._history_index is None:
+            index = HistoryIndex()
+            if not self._journal_reset:
+                try:
+                    for expr, res in self._session_store.iter_entries():
+                        index.add(expr, res)
+                except Exception:
+                    # Unreadable journal: search what this session has
+                    index.clear()
+            for expr, res in self._unsaved:
+                index.add(expr, res)
+            self._history_index = index
+        return self._history_index
+
+    def search_history(self, query: str, limit: Optional[int] = 200) -> List[Tuple[str, str]]:
+        """Newest `limit` history entries containing query (case-insensitive), oldest first."""
+        index = self.history_index
+        return [index.entry(entry_id) for entry_id in reversed(index.search(query, limit))]
 
     # ----------------------------- Memory ----------------------------------
     def memory_clear(self) -> None:
@@ -64,241 +811,307 @@ class CalculatorEngine:
         return self.memory_value
 
     def memory_add(self, value: Number) -> Number:
-        self.memory_value = self._coerce_number(self.memory_value + value)
+        self.memory_value = self._coerce_number(self.memory_value + self._memory_operand(value))
         return self.memory_value
 
     def memory_subtract(self, value: Number) -> Number:
-        self.memory_value = self._coerce_number(self.memory_value - value)
+        self.memory_value = self._coerce_number(self.memory_value - self._memory_operand(value))
         return self.memory_value
 
+    def _memory_operand(self, value: Any) -> Number:
+        value = self._coerce_number(value)
+        if is_matrix(value):
+            raise ValueError("Memory holds single numbers, not matrices")
+        return value
+
     # ----------------------------- Evaluate --------------------------------
     def evaluate(self, expression: str) -> str:
-        """Evaluate an expression and return a string result or error message."""
-        cleaned = self._preprocess_expression(expression)
+        """
+        Evaluate an expression and return a string result or error message.
+        A definition such as "f(x) = x^2" defines f and returns "Defined f(x)".
+        """
         try:
-            allowed = self._allowed_names()
-            # Restrict builtins
-            result: Number = eval(cleaned, {"__builtins__": {}}, allowed)  # noqa: S307
-            result = self._coerce_number(result)
-            result_str = self._format_result(result)
-            self.last_answer = result
-            self._append_history(expression, result_str)
-            return result_str
-        except ZeroDivisionError:
-            return "Error: Division by zero"
-        except ValueError as ve:
-            return f"Error: {ve}"
-        except OverflowError:
-            return "Error: Number too large"
-        except Exception as ex:  # catch-all for syntax/math errors
-            return f"Error: {type(ex).__name__}"
+            definition = parse_definition(expression)
+            if definition is not None:
+                result_str = f"Defined {self._define(definition).signature}"
+                self._append_history(expression, result_str)
+                return result_str
+            program = self._compile(expression)
+            value = self._backend.evaluate(program, self._overlay, self._base_names, self.limits)
+            return self.record_result(expression, value)
+        except Exception as ex:
+            return self._error_message(ex)
 
-    # ----------------------------- Helpers ---------------------------------
-    def _append_history(self, expr: str, result_str: str) -> None:
-        self.history.append((expr, result_str))
-        # Trim history to a reasonable size
-        if len(self.history) > 1000:
-            self.history = self.history[-1000:]
+    def compute(self, expression: str) -> Number:
+        """Value of an expression (not a definition), recording nothing; raises on errors."""
+        program = self._compile(expression)
+        return self._coerce_number(self._backend.evaluate(program, self._overlay, self._base_names, self.limits))
 
-    @staticmethod
-    def _format_result(value: Number) -> str:
-        if isinstance(value, complex):
-            # Normalize very small parts to zero for readability
-            real = 0.0 if abs(value.real) < 1e-12 else value.real
-            imag = 0.0 if abs(value.imag) < 1e-12 else value.imag
-            value = complex(real, imag)
-            return str(value)
-        # For floats, strip trailing zeros
-        if isinstance(value, float):
-            return ("%.*g" % (15, value)).rstrip(".0").rstrip(".") if value != int(value) else str(int(value))
-        return str(value)
+    @classmethod
+    def describe_error(cls, ex: Exception) -> Tuple[int, str]:
+        """The ERR_* code and message evaluate_many() and evaluate() report for an exception."""
+        return _error_code(ex), cls._error_message(ex)
 
-    @staticmethod
-    def _coerce_number(value: Any) -> Number:
-        # Accept int/float/complex; raise for other types
-        if isinstance(value, (int, float, complex)):
-            return value
-        raise ValueError("Unsupported result type")
+    def record_result(self, expression: str, value: Number) -> str:
+        """
+        Record a result as evaluate() would (ANS and history) and return its
+        text; used when the value was computed elsewhere, e.g. in a worker.
+        """
+        result = self._coerce_number(value)
+        result_str = self._format_result(result)
+        self.last_answer = result
+        self._append_history(expression, result_str, result)
+        return result_str
 
-    @staticmethod
-    def _serialize_number(value: Number) -> Union[float, Dict[str, float]]:
-        if isinstance(value, complex):
-            return {"real": value.real, "imag": value.imag}
-        return float(value)
+    def evaluate_many(
+        self,
+        expressions: Iterable[str],
+        *,
+        record_history: bool = False,
+        as_strings: bool = False,
+    ) -> BatchResult:
+        """
+        Evaluate a batch of expressions with one shared namespace and compile cache.
+        Values are numbers (None on error) unless as_strings is set, in which case
+        they are formatted like evaluate() output. With record_history each success
+        updates ANS and the history, as consecutive evaluate() calls would;
+        otherwise the batch leaves the engine state untouched. Definitions
+        ("f(x) = x^2") always take effect; their value is None (or the
+        "Defined f(x)" text with as_strings).
+        """
+        compile_expr = self._core.compile
+        backend = self._backend
+        run = backend.evaluate
+        base = self._base_names
+        overlay = self._overlay
+        coerce = self._coerce_number
+        format_result = self._format_result
+        budget = self.limits
+        values: List[Any] = []
+        errors: List[int] = []
+        recorded: List[Tuple[str, str, Number]] = []
+        for expression in expressions:
+            try:
+                definition = parse_definition(expression) if "=" in expression else None
+                if definition is None:
+                    # Each expression gets its own budget, so one bad line cannot stall the batch
+                    result = coerce(run(compile_expr(expression, backend), overlay, base, budget))
+                else:
+                    result_str = f"Defined {self._define(definition).signature}"
+            except Exception as ex:
+                values.append(self._error_message(ex) if as_strings else None)
+                errors.append(_error_code(ex))
+                continue
+            if definition is not None:
+                if record_history:
+                    recorded.append((expression, result_str, None))
+                values.append(result_str if as_strings else None)
+            elif record_history:
+                result_str = format_result(result)
+                self.last_answer = result
+                recorded.append((expression, result_str, result))
+                values.append(result_str if as_strings else result)
+            else:
+                values.append(format_result(result) if as_strings else result)
+            errors.append(ERR_OK)
+        if recorded:
+            self._extend_history(recorded)
+        return BatchResult(values, errors)
 
-    @staticmethod
-    def _deserialize_number(value: Union[float, Dict[str, float], None]) -> Number:
-        if isinstance(value, dict) and "real" in value and "imag" in value:
-            return complex(value["real"], value["imag"])
-        try:
-            return float(value) if value is not None else 0.0
-        except Exception:
-            return 0.0
-
-    def _preprocess_expression(self, expr: str) -> str:
-        if expr is None:
-            return ""
-        s = str(expr).strip()
-        # Replace UI symbols
-        s = s.replace("×", "*").replace("÷", "/")
-        s = s.replace("^", "**")
-        # Replace ANS token with last answer
-        s = re.sub(r"\bANS\b", f"({self.last_answer})", s)
-        # Support simple percentage postfix (e.g., 50%)
-        s = re.sub(r"(?<!\w)(\d+(?:\.\d+)?)%", r"(\1/100)", s)
-        # Allow imaginary unit i/I
-        s = re.sub(r"\b([iI])\b", "(1j)", s)
-        # Implicit multiplication: number followed by ( or variable/function
-        s = re.sub(r"(\d)(\()", r"\1*\2", s)
-        s = re.sub(r"(\))(\d)", r"\1*\2", s)
-        s = re.sub(r"(\d)([a-zA-Z])", r"\1*\2", s)
-        return s
-
-    # -------------------------- Allowed namespace --------------------------
-    def _allowed_names(self) -> Dict[str, Any]:
-        # Trig in degrees for sin/cos/tan; inverse trig returns degrees
-        def sin_deg(x: Number) -> float:
-            return math.sin(math.radians(float(x)))
+    def evaluate_vectorized(self, expression: str, **arrays: Any) -> Any:
+        """
+        Evaluate one expression elementwise over NumPy arrays bound to variable
+        names, e.g. evaluate_vectorized("sin(x)^2", x=xs). The expression is
+        compiled once (through the shared cache) and run a single time on whole
+        arrays, which are taken as float (integer ones are converted). Points
+        outside a function's domain yield nan; errors such as syntax or unknown
+        names raise. Requires NumPy.
+        """
+        if np is None:
+            raise RuntimeError("NumPy is required for vectorized evaluation (pip install numpy)")
+        # Arrays are always float, whatever the numeric mode
+        program = self._core.compile(expression)
+        vector_names = self._core.vector_names
+        clashes = self.reserved_names.intersection(arrays)
+        if clashes:
+            raise ValueError(f"Cannot bind built-in name(s): {', '.join(sorted(clashes))}")
+        local = dict(self._overlay)
+        bound = {}
+        for name, value in arrays.items():
+            array = np.asarray(value)
+            # Integer arrays would wrap around (2^40 * 2^40) and reject negative powers
+            bound[name] = array if array.dtype.kind in "fc" else array.astype(float)
+        local.update(bound)
+        with np.errstate(all="ignore"):
+            result = np.asarray(program.evaluate(local, vector_names, self.limits))
+        shape = np.broadcast_shapes(*(a.shape for a in bound.values())) if bound else ()
+        if result.shape != shape:
+            # Constant sub-results (e.g. "2" or "pi") still produce one value per point
+            result = np.array(np.broadcast_to(result, shape))
+        return result
 
-        def cos_deg(x: Number) -> float:
-            return math.cos(math.radians(float(x)))
+    def evaluate_matrix(self, expression: str, **matrices: Any) -> Any:
+        """
+        Evaluate a linear-algebra expression over NumPy arrays bound to names,
+        e.g. evaluate_matrix("solve(A, b)", A=a, b=rhs). Unlike
+        evaluate_vectorized nothing is broadcast: the result is whatever the
+        expression produces (a matrix, vector or number). Float arrays are
+        bound without copying. Errors raise. Requires NumPy.
+        """
+        if np is None:
+            raise RuntimeError("NumPy is required for matrix evaluation (pip install numpy)")
+        program = self._core.compile(expression)
+        clashes = self.reserved_names.intersection(matrices)
+        if clashes:
+            raise ValueError(f"Cannot bind built-in name(s): {', '.join(sorted(clashes))}")
+        local = dict(self._overlay)
+        for name, value in matrices.items():
+            array = np.asarray(value)
+            local[name] = array if array.dtype.kind in "fc" else array.astype(float)
+        return program.evaluate(local, self._core.base_names, self.limits)
 
-        def tan_deg(x: Number) -> float:
-            return math.tan(math.radians(float(x)))
+    # ----------------------------- Symbolic --------------------------------
+    def simplify(self, expression: str) -> str:
+        """Simplified form of an expression as text, e.g. "x*x + x^2 - 1/2" -> "2*x^2 - 1/2"."""
+        return symbolic.to_text(symbolic.simplify(self._symbolic_tree(expression)))
 
-        def asin_deg(x: Number) -> float:
-            return math.degrees(math.asin(float(x)))
+    def derivative(self, expression: str, variable: str = "x") -> str:
+        """
+        Exact derivative as text; trig functions take degrees, so "sin(x)"
+        gives "pi*cos(x)/180". Raises ValueError for functions without a
+        derivative rule (round, factorial, ...).
+        """
+        if not variable.isidentifier():
+            raise ValueError(f"'{variable}' is not a variable name")
+        if variable in self.reserved_names:
+            raise ValueError(f"'{variable}' is a built-in name and cannot be a variable")
+        return symbolic.to_text(symbolic.derivative(self._symbolic_tree(expression), variable))
 
-        def acos_deg(x: Number) -> float:
-            return math.degrees(math.acos(float(x)))
+    def expand(self, expression: str) -> str:
+        """Expression with products and integer powers of sums multiplied out, as text."""
+        return symbolic.to_text(symbolic.expand(self._symbolic_tree(expression)))
 
-        def atan_deg(x: Number) -> float:
-            return math.degrees(math.atan(float(x)))
+    def cache_stats(self) -> Dict[str, int]:
+        """Return hit/miss/eviction counters of the compiled-expression cache."""
+        return self.expression_cache.stats()
 
-        def ln(x: Number) -> float:
-            return math.log(float(x))
+    # ----------------------------- Helpers ---------------------------------
+    def _compile(self, expression: str) -> Program:
+        return self._core.compile(expression, self._backend)
 
-        def log(x: Number) -> float:  # base-10
-            return math.log10(float(x))
+    def _symbolic_tree(self, expression: str) -> Node:
+        # User functions are written out with their current definitions
+        functions = self._user_functions
 
-        def sqrt(x: Number) -> Number:
-            if isinstance(x, (int, float)) and x < 0:
-                # allow complex sqrt
-                return complex(0, math.sqrt(abs(float(x))))
-            return math.sqrt(float(x))
+        def definition(name: str) -> Optional[Tuple[Tuple[str, ...], Node]]:
+            func = functions.get(name)
+            return (func.params, func.program.tree) if isinstance(func, UserFunction) else None
 
-        def factorial(n: Number) -> int:
-            n_float = float(n)
-            if not n_float.is_integer() or n_float < 0:
-                raise ValueError("factorial() only defined for non-negative integers")
-            return math.factorial(int(n_float))
+        return symbolic.inline(parse(expression), definition)
 
-        def to_rad(x: Number) -> float:
-            return math.radians(float(x))
+    def _define(self, definition: Definition) -> UserFunction:
+        clashes = [param for param in definition.params if param in self.reserved_names]
+        if clashes:
+            raise ValueError(f"'{clashes[0]}' is a built-in name and cannot be a parameter")
+        func = self._user_function(definition)
+        self._user_functions[definition.name] = func
+        return func
 
-        def to_deg(x: Number) -> float:
-            return math.degrees(float(x))
+    def _user_function(self, definition: Definition) -> UserFunction:
+        vector = functools.partial(self._vector_body, definition.body)
+        return UserFunction(definition, self._compile(definition.body), self._scope, vector)
 
-        # Unit conversion
-        def convert(value: Number, from_unit: str, to_unit: str) -> float:
-            return self._convert_units(float(value), str(from_unit), str(to_unit))
+    def _vector_body(self, body: str) -> Tuple[Program, Scope]:
+        # Arrays are always float, whatever the numeric mode; other user functions dispatch on their arguments
+        return self._core.compile(body), Scope(self._overlay, self._core.vector_names)
 
-        allowed: Dict[str, Any] = {
-            # constants
-            "pi": math.pi,
-            "e": math.e,
-            "ANS": self.last_answer,
-            # trig/log
-            "sin": sin_deg,
-            "cos": cos_deg,
-            "tan": tan_deg,
-            "asin": asin_deg,
-            "acos": acos_deg,
-            "atan": atan_deg,
-            "ln": ln,
-            "log": log,
-            "sqrt": sqrt,
-            "factorial": factorial,
-            "rad": to_rad,
-            "deg": to_deg,
-            # memory convenience
-            "MR": lambda: self.memory_recall(),
-            # conversions
-            "convert": convert,
-            # built-in safe functions
-            "abs": abs,
-            "round": round,
-            "min": min,
-            "max": max,
-        }
+    def _append_history(self, expr: str, result_str: str, value: Optional[Number] = None) -> None:
+        # The ring buffer overwrites the oldest entry once full
+        self.history.append(expr, result_str, value)
+        self._unsaved.append((expr, result_str))
+        if self._history_index is not None:
+            self._history_index.add(expr, result_str)
 
-        # Expose user-defined functions (if any)
-        allowed.update(self.user_functions)
-        return allowed
+    def _extend_history(self, entries: List[Tuple[str, str, Number]]) -> None:
+        self.history.extend(entries)
+        self._unsaved.extend((expr, res) for expr, res, _ in entries)
+        if self._history_index is not None:
+            for expr, res, _ in entries:
+                self._history_index.add(expr, res)
 
-    # --------------------------- Unit conversion ---------------------------
-    def _convert_units(self, value: float, from_unit: str, to_unit: str) -> float:
-        length_in_m = {
-            "m": 1.0,
-            "meter": 1.0,
-            "meters": 1.0,
-            "km": 1000.0,
-            "kilometer": 1000.0,
-            "kilometers": 1000.0,
-            "cm": 0.01,
-            "mm": 0.001,
-            "mi": 1609.344,
-            "mile": 1609.344,
-            "miles": 1609.344,
-            "yd": 0.9144,
-            "yard": 0.9144,
-            "ft": 0.3048,
-            "foot": 0.3048,
-            "feet": 0.3048,
-            "in": 0.0254,
-            "inch": 0.0254,
-            "inches": 0.0254,
-        }
-        weight_in_kg = {
-            "kg": 1.0,
-            "kilogram": 1.0,
-            "kilograms": 1.0,
-            "g": 0.001,
-            "gram": 0.001,
-            "grams": 0.001,
-            "lb": 0.45359237,
-            "pound": 0.45359237,
-            "pounds": 0.45359237,
-            "oz": 0.028349523125,
-            "ounce": 0.028349523125,
-            "ounces": 0.028349523125,
-        }
-        volume_in_l = {
-            "l": 1.0,
-            "liter": 1.0,
-            "liters": 1.0,
-            "ml": 0.001,
-            "milliliter": 0.001,
-            "gallon": 3.785411784,
-            "gallons": 3.785411784,
-            "gal": 3.785411784,
-        }
+    @staticmethod
+    def _error_message(ex: Exception) -> str:
+        if isinstance(ex, BudgetExceeded):
+            return f"Error: {ex}"
+        if isinstance(ex, ZeroDivisionError):
+            return "Error: Division by zero"
+        if isinstance(ex, decimal.Overflow):
+            return "Error: Number too large"
+        if isinstance(ex, decimal.InvalidOperation):
+            return "Error: Invalid operation"
+        if isinstance(ex, ValueError):
+            return f"Error: {ex}"
+        if isinstance(ex, OverflowError):
+            return "Error: Number too large"
+        # catch-all for syntax/math errors
+        return f"Error: {type(ex).__name__}"
 
-        def convert_through_base(v: float, table: Dict[str, float], src: str, dst: str) -> float:
-            if src not in table or dst not in table:
-                raise ValueError("Unsupported unit")
-            return v * table[src] / table[dst]
+    def _format_result(self, value: Number) -> str:
+        return self._backend.format(value)
 
-        src = from_unit.lower()
-        dst = to_unit.lower()
-        if src in length_in_m and dst in length_in_m:
-            return convert_through_base(value, length_in_m, src, dst)
-        if src in weight_in_kg and dst in weight_in_kg:
-            return convert_through_base(value, weight_in_kg, src, dst)
-        if src in volume_in_l and dst in volume_in_l:
-            return convert_through_base(value, volume_in_l, src, dst)
-        raise ValueError("Incompatible or unsupported units")
+    def _coerce_number(self, value: Any) -> Number:
+        # Numbers of the current mode; raises ValueError for other types
+        return self._backend.coerce(value)
+
+    @staticmethod
+    def _serialize_number(value: Number) -> Union[int, float, Dict[str, Any]]:
+        return serialize_number(value)
+
+    @staticmethod
+    def _deserialize_number(value: Any) -> Number:
+        return deserialize_number(value)
+
+    # ------------------------------ Namespace ------------------------------
+    def _sync_user_function(self, name: str, func: Optional[Callable[..., Number]]) -> None:
+        if func is None:
+            self._overlay.pop(name, None)
+        else:
+            self._overlay[name] = func
+        # Results memoized through the old definition are stale
+        for caller in dependents(self._user_functions, name):
+            self._user_functions[caller].clear_memo()
+        update_purity(self._user_functions, self._core.stable_names)
+
+    def _allowed_names(self) -> Dict[str, Any]:
+        """Flattened copy of the evaluation namespace (base plus overlay)."""
+        allowed = dict(self._base_names)
+        allowed.update(self._overlay)
+        return allowed
+
+    def _unit_factor(self, from_unit: str, to_unit: str) -> float:
+        return self._core.unit_factor(from_unit, to_unit)
+
+    def _convert_units(self, value: float, from_unit: str, to_unit: str) -> float:
+        return self._core.convert_units(value, from_unit, to_unit)
 
 
-__all__ = ["CalculatorEngine"]
+__all__ = [
+    "BatchResult",
+    "CalculatorEngine",
+    "EngineCore",
+    "ERR_DIVISION_BY_ZERO",
+    "ERR_EXPONENT_TOO_LARGE",
+    "ERR_INTEGER_TOO_LARGE",
+    "ERR_NAME",
+    "ERR_OK",
+    "ERR_OTHER",
+    "ERR_OVERFLOW",
+    "ERR_SYNTAX",
+    "ERR_TIMEOUT",
+    "ERR_TYPE",
+    "ERR_VALUE",
+    "Limits",
+    "ParseError",
+    "UserFunction",
+]
 
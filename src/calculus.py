@@ -0,0 +1,642 @@
+"""
+Numerical calculus in expressions: integrate, diff, solve and minimize.
+
+Each takes an expression in a variable named by its second argument, e.g.
+integrate(x^2, x, 0, 3) or solve(x^3 - 2x - 5, x, 2). The parser keeps that
+expression unevaluated and the compiler turns it into a BoundExpression,
+compiled once along with the rest of the input. The methods here evaluate it
+on whole batches of points with the NumPy versions of the built-ins (one run
+per refinement round rather than one per point), and fall back to one point
+at a time for bodies that cannot run on arrays (e.g. user functions that
+call math functions).
+
+- integrate: adaptive Gauss-Kronrod quadrature (7-point Gauss inside a
+  15-point Kronrod rule). Every round evaluates all intervals being refined
+  in one batch, splitting those that carry most of the estimated error.
+- diff: the exact derivative from symbolic.py, compiled once per body and
+  run on all the points of a vectorized call in one batch. For bodies it
+  has no rule for (round, factorial, recursive user functions, ...), and at
+  points where the exact form is undefined (abs(x) at 0), central
+  differences at shrinking steps, extrapolated to step zero (Ridders'
+  method); one-sided at the edge of a domain.
+- solve: Newton's method from the guess, with the exact slope where there
+  is one (a central-difference slope otherwise).
+  If it fails, a batch scan around the guess looks for a sign change and
+  Brent's method finishes inside it. With a range instead of a
+  guess, the range is scanned for a sign change.
+- minimize: the x where the expression is smallest. A scan finds a bracket
+  (downhill from the guess, or the lowest sample in a range) and Brent's
+  method refines it to about 8 significant digits.
+
+Trig functions take degrees here as everywhere else, so diff(sin(x), x, 0)
+is pi/180. Array arguments (from vectorized evaluation) are handled one
+element at a time, except by exact derivatives. Results are floats (complex
+for complex integrands).
+"""
+import cmath
+import functools
+import math
+from decimal import Decimal
+from typing import Any, Callable, Dict, List, Mapping, Optional, Tuple
+
+try:
+    import numpy as np  # type: ignore
+except Exception:
+    np = None  # type: ignore
+
+import limits
+import matrix
+import symbolic
+from expression import BoundExpression, Evaluator, Node, compile_tree
+from limits import BudgetExceeded
+from userfunc import Scope, UserFunction
+
+EPS = 2.220446049250313e-16
+
+# integrate: target relative error, and caps that stop divergent integrals
+REL_TOL = 1e-12
+MAX_INTERVALS = 20_000
+MAX_ROUNDS = 200
+# diff: first step (relative to max(1, |at|)), shrink factor, steps per batch
+# and batches (each starting 100 times smaller)
+DIFF_STEP = 0.1
+DIFF_SHRINK = 1.4
+DIFF_STEPS = 20
+DIFF_TRIES = 4
+# solve and minimize
+NEWTON_STEPS = 50
+BRENT_STEPS = 200
+SCAN_STEPS = 60  # geometric scan from the guess: 2^0 .. 2^59 times the first offset
+RANGE_SAMPLES = 65
+MIN_TOL = math.sqrt(EPS)
+# Compiled exact derivatives kept per core; cleared when full
+DERIVATIVE_LIMIT = 1024
+# Symbolic derivatives use these as constants (not as the variable)
+_CONSTANT_NAMES = frozenset({"pi", "e"})
+
+# Gauss-Kronrod 15-point nodes on [-1, 1], with the 7-point Gauss weights on
+# every other node (QUADPACK qk15)
+_GK_X = (
+    0.991455371120812639206854697526329,
+    0.949107912342758524526189684047851,
+    0.864864423359769072789712788640926,
+    0.741531185599394439863864773280788,
+    0.586087235467691130294144845693013,
+    0.405845151377397166906606412076961,
+    0.207784955007898467600689403773245,
+)
+_GK_W = (
+    0.022935322010529224963732008058970,
+    0.063092092629978553290700663189204,
+    0.104790010322250183839876322541518,
+    0.140653259715525918745189590510238,
+    0.169004726639267902826583426598550,
+    0.190350578064785409913256402421014,
+    0.204432940075298892414161999234649,
+)
+_GK_W0 = 0.209482141084727828012999174891714
+_G_W = (0.129484966168869693270611432679082, 0.279705391489276667901467771423780, 0.381830050505118944950369775488975)
+_G_W0 = 0.417959183673469387755102040816327
+
+if np is not None:
+    _NODES = np.array([-x for x in _GK_X] + [0.0] + list(reversed(_GK_X)))
+    _KRONROD = np.array(list(_GK_W) + [_GK_W0] + list(reversed(_GK_W)))
+    _gauss = [0.0, _G_W[0], 0.0, _G_W[1], 0.0, _G_W[2], 0.0]
+    _GAUSS = np.array(_gauss + [_G_W0] + list(reversed(_gauss)))
+
+
+class _Points:
+    """Values of a bound expression at batches of points (NaN where undefined)."""
+
+    __slots__ = ("func", "names", "number")
+
+    def __init__(
+        self, func: BoundExpression, vector_names: Optional[Mapping[str, Any]], number: Optional[Callable[[float], Any]] = None
+    ) -> None:
+        self.func = func
+        # NumPy built-ins first; ANS, user functions and outer variables as in the caller
+        self.names = None if vector_names is None else Scope(vector_names, func.globals)
+        # Type of the points in one-at-a-time evaluation (default float)
+        self.number = number
+
+    def __call__(self, xs: Any) -> Any:
+        xs = np.asarray(xs, dtype=float)
+        if self.names is not None:
+            try:
+                with np.errstate(all="ignore"):
+                    values = np.asarray(self.func(xs, self.names))
+                if values.dtype.kind in "biufc":
+                    return _as_inexact(np.broadcast_to(values, xs.shape))
+            except (BudgetExceeded, RecursionError, NameError):
+                raise
+            except Exception:
+                pass
+            # Not array-friendly: evaluate point by point from now on
+            self.names = None
+        return _as_inexact(np.array([self.scalar(x) for x in xs.ravel().tolist()]).reshape(xs.shape))
+
+    def scalar(self, x: float) -> Any:
+        try:
+            value = self.func(x if self.number is None else self.number(x))
+        except (BudgetExceeded, RecursionError):
+            raise
+        except (ValueError, ArithmeticError):
+            # Outside the domain (sqrt(-1) in exact modes, 1/0, ...)
+            return math.nan
+        if isinstance(value, complex):
+            return value
+        try:
+            return float(value)
+        except TypeError:
+            raise ValueError("The expression must give a number") from None
+
+    def result(self, value: Any) -> Any:
+        """A computed value as a plain float (complex if the imaginary part is not zero)."""
+        value = complex(value)
+        if value.imag:
+            return value
+        if self.number is Decimal:
+            # Like other float-computed functions in decimal mode: 15 significant digits
+            return Decimal("%.15g" % value.real)
+        return value.real
+
+
+def _as_inexact(values: Any) -> Any:
+    if values.dtype.kind == "c":
+        return values.astype(complex)
+    return values.astype(float)
+
+
+def _real(value: Any, name: str) -> float:
+    """A finite float argument (integration limit, guess, ...)."""
+    if isinstance(value, complex) or (np is not None and isinstance(value, np.complexfloating)):
+        if value.imag != 0:
+            raise ValueError(f"The {name} must be a real number")
+        value = value.real
+    try:
+        result = float(value)
+    except TypeError:
+        raise ValueError(f"The {name} must be a number") from None
+    if not math.isfinite(result):
+        raise ValueError(f"The {name} must be finite")
+    return result
+
+
+def _finite(value: Any) -> bool:
+    return cmath.isfinite(value) if isinstance(value, complex) else math.isfinite(value)
+
+
+def _definition(func: BoundExpression, name: str) -> Optional[Tuple[Tuple[str, ...], Node]]:
+    """Parameters and body of a user function as seen from func's body (None for anything else)."""
+    value = func.locals.get(name)
+    if value is None:
+        value = func.globals.get(name)
+    if isinstance(value, UserFunction):
+        return value.params, value.program.tree
+    return None
+
+
+def _elementwise(method: Callable[..., Any]) -> Callable[..., Any]:
+    """Apply a calculus method once per element when a limit or guess is an array."""
+
+    @functools.wraps(method)
+    def wrapper(self: "Calculus", func: BoundExpression, *args: Any) -> Any:
+        if np is not None and any(isinstance(arg, np.ndarray) for arg in args):
+            arrays = np.broadcast_arrays(*args)
+            results = [method(self, func, *values) for values in zip(*(a.ravel().tolist() for a in arrays))]
+            return np.array(results).reshape(arrays[0].shape)
+        return method(self, func, *args)
+
+    return wrapper
+
+
+class Calculus:
+    """
+    The calculus functions of one engine core. `vector_names` returns the
+    NumPy namespace used for batches (built lazily by the core).
+    """
+
+    def __init__(self, vector_names: Callable[[], Mapping[str, Any]]) -> None:
+        self._vector_names = vector_names
+        # (key, compiled code, tree) by id of the key: a derivative tree, or a
+        # body that calls only built-ins (nothing can redefine those)
+        self._derivatives: Dict[int, Tuple[Node, Evaluator, Node]] = {}
+
+    def functions(self) -> Dict[str, Any]:
+        """Names added to the calculator's base namespace."""
+        return {"integrate": self.integrate, "diff": self.diff, "solve": self.solve, "minimize": self.minimize}
+
+    def points(self, func: BoundExpression, *args: Any) -> _Points:
+        """Batch evaluator for func; args are the call's numeric arguments."""
+        if np is None:
+            raise ValueError("Calculus functions need NumPy (pip install numpy)")
+        # Decimal does not mix with float: in decimal mode, points are Decimals too
+        number = Decimal if any(isinstance(arg, Decimal) for arg in args) else None
+        return _Points(func, self._vector_names(), number)
+
+    def derivative(self, func: BoundExpression) -> Optional[BoundExpression]:
+        """The exact derivative of func's body (see symbolic.py), or None if there is no rule for it."""
+        body = func.tree
+        if body is None or func.variable in _CONSTANT_NAMES:
+            return None
+        entry = self._derivatives.get(id(body))
+        if entry is None or entry[0] is not body:
+            try:
+                # User functions are written out with their current definitions
+                inlined = symbolic.inline(body, functools.partial(_definition, func))
+                tree = symbolic.evaluable(symbolic.derivative(inlined, func.variable))
+            except (ValueError, RecursionError):
+                return None
+            if len(self._derivatives) >= DERIVATIVE_LIMIT:
+                self._derivatives.clear()
+            entry = self._derivatives.get(id(tree))
+            if entry is None or entry[0] is not tree:
+                entry = self._derivatives[id(tree)] = (tree, compile_tree(tree), tree)
+            if inlined is symbolic.intern(body):
+                self._derivatives[id(body)] = (body, entry[1], tree)
+        return func.rebound(entry[1], entry[2])
+
+    # ------------------------------ Integrate -------------------------------
+    @_elementwise
+    def integrate(self, func: BoundExpression, a: Any, b: Any) -> Any:
+        """Integral of the expression over its variable from a to b."""
+        points = self.points(func, a, b)
+        a, b = _real(a, "lower limit"), _real(b, "upper limit")
+        if a == b:
+            return 0.0
+        if a > b:
+            return -self.integrate(func, b, a)
+        return points.result(_gauss_kronrod(points, a, b))
+
+    # -------------------------------- Diff ----------------------------------
+    def diff(self, func: BoundExpression, at: Any) -> Any:
+        """Derivative of the expression with respect to its variable at a point."""
+        exact = self.derivative(func)
+        if exact is None or isinstance(at, complex):
+            return self._diff(func, at)
+        # Exact forms run on floats, whatever the mode; results are formatted as func's
+        slope = self.points(exact)
+        if isinstance(at, np.ndarray):
+            if at.dtype.kind not in "biuf":
+                return self._diff(func, at)
+            values = slope(at)
+            undefined = ~np.isfinite(values)
+            if undefined.any():
+                values[undefined] = self._diff(func, at[undefined])
+            return values
+        value = slope.scalar(_real(at, "point"))
+        if not _finite(value):
+            # Removable (abs(x) at 0) or no derivative at all: the numeric method decides
+            return self._diff(func, at)
+        return self.points(func, at).result(value)
+
+    @_elementwise
+    def _diff(self, func: BoundExpression, at: Any) -> Any:
+        points = self.points(func, at)
+        at = _real(at, "point")
+        first = DIFF_STEP * max(1.0, abs(at))
+        # Smaller steps again when the first ones reach past a singularity or domain edge
+        for _ in range(DIFF_TRIES):
+            estimate = _derivative(points, at, first)
+            if estimate is not None and estimate[1] <= 1e-5 * max(1.0, abs(estimate[0])):
+                return points.result(estimate[0])
+            first /= 100
+        # Estimates that never settle mean a kink, jump or vertical tangent
+        raise ValueError(f"The derivative does not exist at {at:g}")
+
+    # -------------------------------- Solve ---------------------------------
+    def solve(self, func: Any, *args: Any) -> Any:
+        """A root of the expression near a guess or within a range; solve(A, b) solves a linear system."""
+        if not isinstance(func, BoundExpression):
+            return matrix.solve(func, *args)
+        return self._solve(func, *args)
+
+    @_elementwise
+    def _solve(self, func: BoundExpression, *args: Any) -> Any:
+        points = self.points(func, *args)
+        if len(args) == 2:
+            a, b = sorted((_real(args[0], "lower limit"), _real(args[1], "upper limit")))
+            xs = np.linspace(a, b, RANGE_SAMPLES)
+            bracket = _sign_change(xs, points(xs), (a + b) / 2)
+            if bracket is None:
+                raise ValueError(f"No sign change between {a:g} and {b:g}")
+            return points.result(_brent_root(points.scalar, *bracket))
+        guess = _real(args[0], "guess")
+        exact = self.derivative(func)
+        root = _newton(points, guess, None if exact is None else self.points(exact).scalar)
+        if root is None:
+            xs = _scan(guess)
+            bracket = _sign_change(xs, points(xs), guess)
+            if bracket is None:
+                raise ValueError(f"No root found near {guess:g}")
+            root = _brent_root(points.scalar, *bracket)
+        # Tiny roots are usually rounding noise around an exact zero
+        if root != 0 and abs(root) <= 1e-12 * max(1.0, abs(guess)) and points.scalar(0.0) == 0:
+            root = 0.0
+        return points.result(root)
+
+    # ------------------------------- Minimize -------------------------------
+    @_elementwise
+    def minimize(self, func: BoundExpression, *args: Any) -> Any:
+        """The value of the variable where the expression is smallest (near a guess or within a range)."""
+        points = self.points(func, *args)
+
+        def value(x: float) -> float:
+            y = points.scalar(x)
+            # Complex or undefined values never count as a minimum
+            return y if isinstance(y, float) and not math.isnan(y) else math.inf
+
+        if len(args) == 2:
+            a, b = sorted((_real(args[0], "lower limit"), _real(args[1], "upper limit")))
+            xs = np.linspace(a, b, RANGE_SAMPLES)
+            ys = _comparable(points(xs))
+            best = int(np.argmin(ys))
+        else:
+            guess = _real(args[0], "guess")
+            xs = _scan(guess)
+            ys = _comparable(points(xs))
+            best = _downhill(ys, SCAN_STEPS)
+            if best in (0, len(xs) - 1):
+                raise ValueError(f"No minimum found near {guess:g}")
+        if not np.isfinite(ys[best]):
+            raise ValueError("The expression is undefined in the searched range")
+        low, high = xs[max(best - 1, 0)], xs[min(best + 1, len(xs) - 1)]
+        return points.result(_brent_min(value, float(low), float(high), float(xs[best]), float(ys[best])))
+
+
+# ----------------------------- Quadrature -----------------------------------
+def _gauss_kronrod(points: _Points, a: float, b: float) -> Any:
+    lo = np.array([a])
+    hi = np.array([b])
+    kronrod, error, magnitude = _rule(points, lo, hi)
+    for _ in range(MAX_ROUNDS):
+        limits.check_deadline()
+        estimate = kronrod.sum()
+        if not np.isfinite(estimate):
+            raise ValueError("The integrand is not finite on the interval")
+        total = error.sum()
+        # Relative to the integral, or to the integral of |f| when that cancels to ~0
+        tolerance = REL_TOL * max(abs(estimate), 1e-3 * magnitude.sum())
+        if total <= tolerance:
+            # Cancellation down to rounding error (e.g. sin over a full period) is zero
+            return 0.0 if abs(estimate) <= 64 * EPS * magnitude.sum() else estimate
+        # Split the intervals that carry the larger half of the error
+        order = np.argsort(error)[::-1]
+        count = int(np.searchsorted(np.cumsum(error[order]), total / 2)) + 1
+        chosen = order[:count]
+        # Intervals at the resolution of floats cannot be split further
+        chosen = chosen[(hi[chosen] - lo[chosen]) > 64 * EPS * np.maximum(abs(lo[chosen]), abs(hi[chosen]))]
+        if not chosen.size or lo.size + chosen.size > MAX_INTERVALS:
+            break
+        mid = (lo[chosen] + hi[chosen]) / 2
+        new_lo = np.concatenate([lo[chosen], mid])
+        new_hi = np.concatenate([mid, hi[chosen]])
+        new_kronrod, new_error, new_magnitude = _rule(points, new_lo, new_hi)
+        keep = np.ones(lo.size, dtype=bool)
+        keep[chosen] = False
+        lo = np.concatenate([lo[keep], new_lo])
+        hi = np.concatenate([hi[keep], new_hi])
+        kronrod = np.concatenate([kronrod[keep], new_kronrod])
+        error = np.concatenate([error[keep], new_error])
+        magnitude = np.concatenate([magnitude[keep], new_magnitude])
+    estimate = kronrod.sum()
+    # Out of splits: accept a result that is still good to about 6 digits
+    if np.isfinite(estimate) and error.sum() <= 1e-6 * max(abs(estimate), 1e-3 * magnitude.sum()):
+        return estimate
+    raise ValueError("The integral does not converge")
+
+
+def _rule(points: _Points, lo: Any, hi: Any) -> Tuple[Any, Any, Any]:
+    """Kronrod estimate, |Kronrod - Gauss| and integral of |f| per interval, all in one batch."""
+    half = (hi - lo) / 2
+    values = points((lo + hi)[:, None] / 2 + half[:, None] * _NODES)
+    with np.errstate(all="ignore"):
+        kronrod = half * (values @ _KRONROD)
+        error = abs(kronrod - half * (values @ _GAUSS))
+        magnitude = half * (abs(values) @ _KRONROD)
+    return kronrod, error, magnitude
+
+
+# --------------------------- Differentiation --------------------------------
+def _derivative(points: _Points, at: float, first: float) -> Optional[Tuple[Any, float]]:
+    """Extrapolated derivative and its error estimate from one batch of steps."""
+    steps = first / DIFF_SHRINK ** np.arange(DIFF_STEPS)
+    # All steps in one batch: at + h, at - h for every h, then at itself
+    values = points(np.concatenate([at + steps, at - steps, [at]]))
+    ahead, behind, here = values[:DIFF_STEPS], values[DIFF_STEPS:-1], values[-1]
+    # inf - inf where the function blows up: nan, and no estimate from that step
+    with np.errstate(all="ignore"):
+        estimate = _extrapolate((ahead - behind) / (2 * steps), 2)
+        if estimate is None and np.isfinite(here):
+            # At the edge of the domain: one-sided differences (error odd and even in h)
+            estimate = _extrapolate((ahead - here) / steps, 1) or _extrapolate((here - behind) / steps, 1)
+    return estimate
+
+
+def _extrapolate(estimates: Any, power: int) -> Optional[Tuple[Any, float]]:
+    """
+    Richardson extrapolation of derivative estimates at steps shrinking by
+    DIFF_SHRINK (error in powers of h**power). Returns the entry of the
+    Neville tableau with the smallest error and that error, or None if
+    nothing is finite.
+    """
+    finite = np.flatnonzero(np.isfinite(estimates))
+    if not finite.size:
+        return None
+    # Large steps may reach outside the domain; start at the first usable one
+    column: List[Any] = list(estimates[finite[0]:])
+    if not all(np.isfinite(column)):
+        column = column[: next(i for i, v in enumerate(column) if not np.isfinite(v))]
+    best, best_error = column[0], math.inf
+    previous = [column[0]]
+    for i in range(1, len(column)):
+        row = [column[i]]
+        factor = DIFF_SHRINK ** power
+        for j in range(1, i + 1):
+            row.append((row[j - 1] * factor - previous[j - 1]) / (factor - 1))
+            factor *= DIFF_SHRINK ** power
+            error = max(abs(row[j] - row[j - 1]), abs(row[j] - previous[j - 1]))
+            if error <= best_error:
+                best, best_error = row[j], error
+        # Stop once higher orders get worse (rounding error has taken over)
+        if abs(row[i] - previous[i - 1]) >= 2 * best_error:
+            break
+        previous = row
+    return best, best_error
+
+
+# ----------------------------- Root finding ---------------------------------
+def _newton(points: _Points, x: float, exact: Optional[Callable[[float], Any]] = None) -> Optional[float]:
+    """
+    Newton's method with the exact slope when given, else (or where it is
+    undefined) a central-difference one; None if it does not converge.
+    """
+    for _ in range(NEWTON_STEPS):
+        limits.check_deadline()
+        here = points.scalar(x)
+        if here == 0:
+            return x
+        slope = math.nan if exact is None else exact(x)
+        if not _finite(slope):
+            h = 6e-6 * max(1.0, abs(x))
+            # Points are cheaper one at a time than as a NumPy batch
+            slope = (points.scalar(x + h) - points.scalar(x - h)) / (2 * h)
+        if isinstance(here, complex) or isinstance(slope, complex) or not math.isfinite(here) or not slope:
+            return None
+        if not math.isfinite(slope):
+            return None
+        step = here / slope
+        x -= step
+        if not math.isfinite(x):
+            return None
+        if abs(step) <= 4 * EPS * max(abs(x), 1e-12):
+            return x
+    # Still moving by tiny steps: rounding noise in f (e.g. near a double root)
+    if abs(step) <= 1e-8 * max(abs(x), 1e-12):
+        return x
+    return None
+
+
+def _scan(center: float) -> Any:
+    """Points at geometrically growing distances on both sides of center, in order."""
+    offsets = 1e-3 * max(1.0, abs(center)) * 2.0 ** np.arange(SCAN_STEPS)
+    return np.concatenate([center - offsets[::-1], [center], center + offsets])
+
+
+def _sign_change(xs: Any, ys: Any, near: float) -> Optional[Tuple[float, float, float, float]]:
+    """The neighbouring pair of samples closest to `near` whose values differ in sign."""
+    if ys.dtype.kind == "c":
+        ys = np.where(ys.imag == 0, ys.real, np.nan)
+    zero = np.flatnonzero(ys == 0)
+    if zero.size:
+        x = float(xs[zero[np.argmin(abs(xs[zero] - near))]])
+        return x, x, 0.0, 0.0
+    with np.errstate(invalid="ignore"):
+        changes = np.flatnonzero(np.sign(ys[:-1]) * np.sign(ys[1:]) < 0)
+    if not changes.size:
+        return None
+    i = int(changes[np.argmin(abs((xs[changes] + xs[changes + 1]) / 2 - near))])
+    return float(xs[i]), float(xs[i + 1]), float(ys[i]), float(ys[i + 1])
+
+
+def _brent_root(f: Callable[[float], Any], a: float, b: float, fa: float, fb: float) -> float:
+    """Brent's method (bisection, secant and inverse quadratic steps) on a bracket."""
+    if fa == 0:
+        return a
+    if fb == 0:
+        return b
+    tol = EPS * max(abs(a), abs(b))
+    c, fc = b, fb
+    d = e = b - a
+    for _ in range(BRENT_STEPS):
+        limits.check_deadline()
+        if (fb > 0) == (fc > 0):
+            c, fc = a, fa
+            d = e = b - a
+        if abs(fc) < abs(fb):
+            a, b, c = b, c, b
+            fa, fb, fc = fb, fc, fb
+        tol1 = 2 * EPS * abs(b) + 0.5 * tol
+        half = (c - b) / 2
+        if abs(half) <= tol1 or fb == 0:
+            break
+        if abs(e) >= tol1 and abs(fa) > abs(fb):
+            s = fb / fa
+            if a == c:
+                p, q = 2 * half * s, 1 - s
+            else:
+                q, r = fa / fc, fb / fc
+                p = s * (2 * half * q * (q - r) - (b - a) * (r - 1))
+                q = (q - 1) * (r - 1) * (s - 1)
+            if p > 0:
+                q = -q
+            p = abs(p)
+            if 2 * p < min(3 * half * q - abs(tol1 * q), abs(e * q)):
+                e, d = d, p / q
+            else:
+                d = e = half
+        else:
+            d = e = half
+        a, fa = b, fb
+        b += d if abs(d) > tol1 else math.copysign(tol1, half)
+        fb = f(b)
+        if isinstance(fb, complex) or math.isnan(fb):
+            raise ValueError("The expression is undefined near the root")
+    # A sign change across a pole (tan, 1/x) is not a root
+    if abs(fb) > 1e-6 * max(abs(fa), abs(fc), 1.0):
+        raise ValueError(f"No root found: the expression changes sign at a discontinuity near {b:g}")
+    return b
+
+
+# ------------------------------ Minimization --------------------------------
+def _comparable(ys: Any) -> Any:
+    """Real values with undefined and complex points as +inf."""
+    if ys.dtype.kind == "c":
+        ys = np.where(ys.imag == 0, ys.real, np.inf)
+    return np.where(np.isnan(ys), np.inf, ys)
+
+
+def _downhill(ys: Any, start: int) -> int:
+    """Walk from index start towards lower values until they stop decreasing."""
+    i = start
+    step = -1 if ys[i - 1] < ys[i + 1] else 1
+    if ys[i + step] >= ys[i]:
+        return i
+    while 0 < i < len(ys) - 1 and ys[i + step] < ys[i]:
+        i += step
+    return i
+
+
+def _brent_min(f: Callable[[float], float], a: float, b: float, x: float, fx: float) -> float:
+    """Brent's minimization (golden section with parabolic steps) on [a, b] starting from x."""
+    golden = (3 - math.sqrt(5)) / 2
+    floor = 1e-12 * (b - a)
+    w = v = x
+    fw = fv = fx
+    d = e = 0.0
+    for _ in range(BRENT_STEPS):
+        limits.check_deadline()
+        middle = (a + b) / 2
+        tol1 = MIN_TOL * abs(x) + floor
+        tol2 = 2 * tol1
+        if abs(x - middle) <= tol2 - (b - a) / 2:
+            break
+        parabolic = False
+        if abs(e) > tol1:
+            r = (x - w) * (fx - fv)
+            q = (x - v) * (fx - fw)
+            p = (x - v) * q - (x - w) * r
+            q = 2 * (q - r)
+            if q > 0:
+                p = -p
+            q = abs(q)
+            if abs(p) < abs(q * e / 2) and q * (a - x) < p < q * (b - x):
+                e, d = d, p / q
+                parabolic = True
+                if (x + d) - a < tol2 or b - (x + d) < tol2:
+                    d = math.copysign(tol1, middle - x)
+        if not parabolic:
+            e = (a if x >= middle else b) - x
+            d = golden * e
+        u = x + d if abs(d) >= tol1 else x + math.copysign(tol1, d)
+        fu = f(u)
+        if fu <= fx:
+            if u >= x:
+                a = x
+            else:
+                b = x
+            v, w, x = w, x, u
+            fv, fw, fx = fw, fx, fu
+        else:
+            if u < x:
+                a = u
+            else:
+                b = u
+            if fu <= fw or w == x:
+                v, w, fv, fw = w, u, fw, fu
+            elif fu <= fv or v == x or v == w:
+                v, fv = u, fu
+    return x
+
+
+__all__ = ["Calculus"]
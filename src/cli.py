@@ -0,0 +1,185 @@
+"""
+Headless command-line front end for CalculatorEngine.
+
+Reads expressions (one per line) from files or stdin and streams results to
+stdout as plain text, JSON Lines or CSV. Input is consumed in fixed-size
+chunks, so memory use stays constant regardless of input size. Importing
+this module does not import tkinter.
+
+Examples:
+    python src/cli.py formulas.txt --format csv > results.csv
+    printf '2+2\\nANS*10\\n' | python src/cli.py --history record
+    python src/cli.py -e "sqrt(2)" -e "convert(5, 'mi', 'km')"
+    python src/cli.py huge.txt --jobs 8 > results.txt
+"""
+import argparse
+import csv
+import itertools
+import json
+import sys
+from typing import IO, Iterable, Iterator, List, Optional
+
+from calculator import CalculatorEngine, EngineCore
+from numeric import MODES
+from parallel import ParallelEvaluator, chunked
+
+
+SESSION_POLICIES = ("none", "load", "save", "update")
+
+
+def iter_expressions(sources: Iterable[IO[str]]) -> Iterator[str]:
+    """Yield non-blank, non-comment lines from each source in turn."""
+    for source in sources:
+        for line in source:
+            text = line.strip()
+            if text and not text.startswith("#"):
+                yield text
+
+
+class ResultWriter:
+    """Formats (expression, result, error code) rows for one output format."""
+
+    def __init__(self, out: IO[str], fmt: str) -> None:
+        self.out = out
+        self.fmt = fmt
+        self._csv = csv.writer(out, lineterminator="\n") if fmt == "csv" else None
+        if self._csv is not None:
+            self._csv.writerow(["expression", "result", "error"])
+
+    def write(self, expressions: List[str], results: List[str], errors: List[int]) -> None:
+        if self._csv is not None:
+            self._csv.writerows(zip(expressions, results, errors))
+        elif self.fmt == "json":
+            self.out.writelines(
+                json.dumps({"expression": expr, "result": res, "error": err}, ensure_ascii=False) + "\n"
+                for expr, res, err in zip(expressions, results, errors)
+            )
+        else:
+            self.out.writelines(res + "\n" for res in results)
+        self.out.flush()
+
+
+def run(
+    expressions: Iterable[str],
+    out: IO[str],
+    engine: CalculatorEngine,
+    fmt: str = "text",
+    record_history: bool = False,
+    save_session: bool = False,
+    chunk_size: int = 1024,
+    pool: Optional[ParallelEvaluator] = None,
+) -> int:
+    """
+    Evaluate a stream of expressions; returns the number of failed lines.
+    With a pool, chunks are evaluated in worker processes (no history recording).
+    """
+    writer = ResultWriter(out, fmt)
+    failures = 0
+    chunks = chunked(expressions, chunk_size)
+    if pool is not None:
+        batches = pool.map_chunks(chunks, as_strings=True)
+    else:
+        batches = (
+            (chunk, engine.evaluate_many(chunk, record_history=record_history, as_strings=True))
+            for chunk in chunks
+        )
+    for chunk, batch in batches:
+        writer.write(chunk, batch.values, batch.errors)
+        failures += sum(1 for err in batch.errors if err)
+        if save_session and record_history:
+            # Flush the journal per chunk so pending history stays bounded
+            _report_save(engine.save_session())
+    if save_session:
+        _report_save(engine.save_session())
+    return failures
+
+
+def _report_save(problem: Optional[str]) -> None:
+    if problem:
+        print(f"Warning: {problem}", file=sys.stderr)
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Evaluate calculator expressions without the GUI.")
+    parser.add_argument("inputs", nargs="*", help="input files, one expression per line ('-' for stdin)")
+    parser.add_argument("-e", "--expr", action="append", default=[], help="evaluate this expression (repeatable)")
+    parser.add_argument("-f", "--format", choices=("text", "json", "csv"), default="text", help="output format")
+    parser.add_argument(
+        "--history",
+        choices=("none", "record"),
+        default="none",
+        help="record: update ANS and history after each result (default: none, ANS stays fixed)",
+    )
+    parser.add_argument(
+        "--session",
+        choices=SESSION_POLICIES,
+        default="none",
+        help="load and/or save the calculator session (memory, ANS, history)",
+    )
+    parser.add_argument("--session-file", help="session snapshot path (default: the GUI's session file)")
+    parser.add_argument("--chunk-size", type=int, default=None, help="lines evaluated per batch")
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=1,
+        help="worker processes for large batches (0 = one per CPU; not with --history record)",
+    )
+    parser.add_argument("--mode", choices=MODES, help="number mode (default: float, or the loaded session's mode)")
+    parser.add_argument("--precision", type=int, help="significant digits in decimal mode (default: 28)")
+    parser.add_argument("--rates", help="exchange rate table for currency conversion (see currency.py)")
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.jobs != 1 and args.history == "record":
+        parser.error("--jobs cannot be combined with --history record (each line depends on the previous ANS)")
+    if args.precision is not None and (args.mode != "decimal" or args.precision < 1):
+        parser.error("--precision needs --mode decimal and a positive number of digits")
+    load = args.session in ("load", "update")
+    save = args.session in ("save", "update")
+    core = EngineCore(rates_path=args.rates) if args.rates else None
+    engine = CalculatorEngine(session_path=args.session_file, load_session=load, core=core)
+    if args.mode is not None:
+        engine.set_numeric_mode(args.mode, args.precision)
+
+    sources: List[IO[str]] = []
+    pool: Optional[ParallelEvaluator] = None
+    try:
+        for path in args.inputs:
+            sources.append(sys.stdin if path == "-" else open(path, "r", encoding="utf-8"))
+        if not sources and not args.expr:
+            sources.append(sys.stdin)
+        expressions = itertools.chain(args.expr, iter_expressions(sources))
+        chunk_size = args.chunk_size
+        if chunk_size is None:
+            # Answer interactive input line by line; batch everything else
+            chunk_size = 1 if sys.stdin in sources and sys.stdin.isatty() else 1024
+        if args.jobs != 1:
+            pool = ParallelEvaluator(args.jobs or None, engine=engine)
+        failures = run(
+            expressions,
+            sys.stdout,
+            engine,
+            fmt=args.format,
+            record_history=args.history == "record",
+            save_session=save,
+            chunk_size=max(1, chunk_size),
+            pool=pool,
+        )
+    except BrokenPipeError:
+        # Downstream closed the pipe (e.g. `| head`); nothing left to report
+        return 0
+    finally:
+        if pool is not None:
+            pool.close()
+        for source in sources:
+            if source is not sys.stdin:
+                source.close()
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
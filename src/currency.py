@@ -0,0 +1,320 @@
+"""
+Offline currency conversion from a local, memory-mapped rate table.
+
+Rates are imported from CSV (for example the ECB's historical reference
+rates) into a compact binary file, then read through mmap. Opening a table
+only parses the small header (currency codes and dates); a rate is read with
+a single struct unpack when first needed. Cross rates are cached per
+(from, to, date), so batch conversions cost a dict lookup each.
+
+File layout (little-endian):
+
+    header   8s magic, 3s base currency, 1 pad, I currencies, I dates
+    codes    3 ASCII bytes per currency, padded to 8 bytes
+    dates    i4 proleptic Gregorian ordinal per snapshot (ascending), padded
+    rates    f8 [dates][currencies], units of each currency per 1 base;
+             NaN where a snapshot has no rate for a currency
+
+A snapshot applies from its date until the next one, so historical lookups
+use the latest snapshot on or before the requested date.
+
+Usage:
+    python src/currency.py import eurofxref-hist.csv [--base EUR]
+    python src/currency.py list
+    python src/currency.py convert 100 USD EUR [--date 2024-01-15]
+"""
+import argparse
+import bisect
+import csv
+import datetime
+import math
+import mmap
+import os
+import re
+import struct
+import sys
+from array import array
+from fractions import Fraction
+from typing import Any, Dict, Hashable, List, Mapping, Optional, Tuple
+
+MAGIC = b"CALCFX01"
+_HEADER = struct.Struct("<8s3sxII")
+DEFAULT_TABLE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".calculator_rates.bin")
+# Cross rates kept per table; cleared when full
+_CACHE_LIMIT = 65536
+
+_CURRENCY_CODE = re.compile(r"[A-Z]{3}")
+
+Snapshots = Dict[datetime.date, Dict[str, float]]
+
+
+def is_currency_code(text: str) -> bool:
+    return bool(_CURRENCY_CODE.fullmatch(text))
+
+
+def parse_date(value: Any) -> datetime.date:
+    """A date from a datetime.date or ISO text ("2024-01-15")."""
+    if isinstance(value, datetime.datetime):
+        return value.date()
+    if isinstance(value, datetime.date):
+        return value
+    try:
+        return datetime.date.fromisoformat(str(value).strip())
+    except ValueError:
+        raise ValueError(f"Invalid date '{value}' (expected YYYY-MM-DD)") from None
+
+
+def _padded(length: int) -> int:
+    return (length + 7) & ~7
+
+
+class RateTable:
+    """A read-only rate table file, mapped into memory."""
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        with open(path, "rb") as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            magic, base, count, date_count = _HEADER.unpack_from(self._map, 0)
+            if magic != MAGIC:
+                raise ValueError(f"Not a rate table: {path}")
+            offset = _HEADER.size
+            codes = self._map[offset:offset + 3 * count].decode("ascii")
+            offset += _padded(3 * count)
+            self.dates: List[int] = list(struct.unpack_from(f"<{date_count}i", self._map, offset))
+            offset += _padded(4 * date_count)
+            if len(self._map) < offset + 8 * count * date_count:
+                raise ValueError(f"Truncated rate table: {path}")
+        except Exception:
+            self._map.close()
+            raise
+        self.base = base.decode("ascii")
+        self.currencies: List[str] = [codes[i:i + 3] for i in range(0, len(codes), 3)]
+        self.index: Dict[str, int] = {code: i for i, code in enumerate(self.currencies)}
+        self._rates_offset = offset
+        self._cross: Dict[Tuple[str, str, Hashable], float] = {}
+        self._exact: Dict[Tuple[str, str, Hashable], Fraction] = {}
+
+    def close(self) -> None:
+        self._map.close()
+
+    def __enter__(self) -> "RateTable":
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.close()
+
+    # ------------------------------- Lookups --------------------------------
+    def _row(self, when: Any) -> int:
+        if not self.dates:
+            raise ValueError("The exchange rate table is empty")
+        if when is None:
+            return len(self.dates) - 1
+        day = parse_date(when)
+        row = bisect.bisect_right(self.dates, day.toordinal()) - 1
+        if row < 0:
+            raise ValueError(f"No exchange rates on or before {day.isoformat()}")
+        return row
+
+    def _stored(self, row: int, code: str) -> float:
+        try:
+            column = self.index[code]
+        except KeyError:
+            raise ValueError(f"Unknown currency '{code}'") from None
+        value = struct.unpack_from("<d", self._map, self._rates_offset + 8 * (row * len(self.currencies) + column))[0]
+        if math.isnan(value):
+            day = datetime.date.fromordinal(self.dates[row]).isoformat()
+            raise ValueError(f"No {code} rate for {day}")
+        return value
+
+    def rate(self, from_code: str, to_code: str, when: Any = None) -> float:
+        """Units of to_code per 1 from_code, latest or as of `when`."""
+        key = (from_code, to_code, when)
+        try:
+            return self._cross[key]
+        except KeyError:
+            pass
+        row = self._row(when)
+        value = self._stored(row, to_code) / self._stored(row, from_code)
+        if len(self._cross) >= _CACHE_LIMIT:
+            self._cross.clear()
+        self._cross[key] = value
+        return value
+
+    def exact_rate(self, from_code: str, to_code: str, when: Any = None) -> Fraction:
+        """rate() from the stored rates' decimal digits, for the exact number modes."""
+        key = (from_code, to_code, when)
+        value = self._exact.get(key)
+        if value is None:
+            row = self._row(when)
+            value = Fraction(repr(self._stored(row, to_code))) / Fraction(repr(self._stored(row, from_code)))
+            if len(self._exact) >= _CACHE_LIMIT:
+                self._exact.clear()
+            self._exact[key] = value
+        return value
+
+    def convert(self, value: Any, from_code: str, to_code: str, when: Any = None) -> Any:
+        return value * self.rate(from_code, to_code, when)
+
+    def snapshots(self) -> Snapshots:
+        """All stored rates, e.g. to merge with newly imported ones."""
+        result: Snapshots = {}
+        for row, ordinal in enumerate(self.dates):
+            rates = {}
+            for code in self.currencies:
+                try:
+                    rates[code] = self._stored(row, code)
+                except ValueError:
+                    pass
+            result[datetime.date.fromordinal(ordinal)] = rates
+        return result
+
+
+def open_rate_table(path: Optional[str] = None) -> Optional[RateTable]:
+    """The table at `path` (default: next to the session file), or None if there is none."""
+    path = path or DEFAULT_TABLE_PATH
+    if not os.path.exists(path):
+        return None
+    return RateTable(path)
+
+
+# -------------------------------- Writing -----------------------------------
+def write_rate_table(path: str, snapshots: Mapping[datetime.date, Mapping[str, float]], base: str) -> None:
+    """Write snapshots (units per 1 `base`, per date) as a rate table, atomically."""
+    if not is_currency_code(base):
+        raise ValueError(f"Invalid base currency '{base}'")
+    codes = sorted({code for rates in snapshots.values() for code in rates} | {base})
+    dates = sorted(snapshots)
+    data = bytearray(_HEADER.pack(MAGIC, base.encode("ascii"), len(codes), len(dates)))
+    data += "".join(codes).encode("ascii").ljust(_padded(3 * len(codes)), b"\0")
+    data += struct.pack(f"<{len(dates)}i", *(day.toordinal() for day in dates)).ljust(_padded(4 * len(dates)), b"\0")
+    rates = array("d")
+    for day in dates:
+        snapshot = snapshots[day]
+        rates.extend(1.0 if code == base else float(snapshot.get(code, math.nan)) for code in codes)
+    if sys.byteorder != "little":
+        rates.byteswap()
+    data += rates.tobytes()
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    # Open tables keep mapping the old file, so readers never see a partial write
+    os.replace(tmp_path, path)
+
+
+def read_rates_csv(path: str) -> Snapshots:
+    """
+    Rates from CSV, in either layout:
+    - long: columns date, currency, rate (one row per rate)
+    - wide: a date column followed by one column per currency (the ECB format)
+    Blank and "N/A" cells are skipped.
+    """
+    snapshots: Snapshots = {}
+    with open(path, "r", encoding="utf-8-sig", newline="") as f:
+        reader = csv.reader(f)
+        header = [cell.strip() for cell in next(reader, [])]
+        lowered = [cell.lower() for cell in header]
+        if not header:
+            return snapshots
+        if {"date", "currency", "rate"} <= set(lowered):
+            date_col, code_col, rate_col = (lowered.index(name) for name in ("date", "currency", "rate"))
+            for row in reader:
+                if len(row) > max(date_col, code_col, rate_col) and _is_rate(row[rate_col]):
+                    day = parse_date(row[date_col])
+                    snapshots.setdefault(day, {})[row[code_col].strip().upper()] = float(row[rate_col])
+        else:
+            codes = [cell.upper() for cell in header[1:]]
+            for row in reader:
+                if not row or not row[0].strip():
+                    continue
+                rates = snapshots.setdefault(parse_date(row[0]), {})
+                for code, cell in zip(codes, row[1:]):
+                    if is_currency_code(code) and _is_rate(cell):
+                        rates[code] = float(cell)
+    return snapshots
+
+
+def _is_rate(cell: str) -> bool:
+    try:
+        return float(cell) > 0
+    except ValueError:
+        return False
+
+
+def import_csv(csv_path: str, table_path: Optional[str] = None, base: str = "EUR", replace: bool = False) -> Tuple[int, int]:
+    """
+    Add the rates in a CSV file to the table (rebasing existing snapshots if
+    the base differs); returns (dates, currencies) in the written table.
+    """
+    table_path = table_path or DEFAULT_TABLE_PATH
+    base = base.upper()
+    snapshots: Snapshots = {}
+    if not replace and os.path.exists(table_path):
+        with RateTable(table_path) as existing:
+            for day, rates in existing.snapshots().items():
+                if base in rates:
+                    scale = rates[base]
+                    snapshots[day] = {code: rate / scale for code, rate in rates.items()}
+    for day, rates in read_rates_csv(csv_path).items():
+        snapshots.setdefault(day, {}).update(rates)
+    write_rate_table(table_path, snapshots, base)
+    return len(snapshots), len({code for rates in snapshots.values() for code in rates} | {base})
+
+
+# ---------------------------------- CLI -------------------------------------
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Manage the offline exchange rate table.")
+    parser.add_argument("--table", help="rate table path (default: .calculator_rates.bin next to the session)")
+    commands = parser.add_subparsers(dest="command", required=True)
+    importer = commands.add_parser("import", help="add rates from a CSV file")
+    importer.add_argument("csv_file")
+    importer.add_argument("--base", default="EUR", help="currency the CSV rates are quoted against (default: EUR)")
+    importer.add_argument("--replace", action="store_true", help="discard the existing table instead of merging")
+    commands.add_parser("list", help="show the table's currencies and date range")
+    converter = commands.add_parser("convert", help="convert an amount")
+    converter.add_argument("amount", type=float)
+    converter.add_argument("from_code")
+    converter.add_argument("to_code")
+    converter.add_argument("--date", help="use the rates as of this date (YYYY-MM-DD)")
+    args = parser.parse_args(argv)
+
+    try:
+        if args.command == "import":
+            dates, currencies = import_csv(args.csv_file, args.table, args.base, args.replace)
+            print(f"{dates} snapshots, {currencies} currencies")
+            return 0
+        table = open_rate_table(args.table)
+        if table is None:
+            print("No rate table; import one first (currency.py import FILE.csv)", file=sys.stderr)
+            return 1
+        with table:
+            if args.command == "list":
+                first = datetime.date.fromordinal(table.dates[0]) if table.dates else None
+                last = datetime.date.fromordinal(table.dates[-1]) if table.dates else None
+                print(f"base {table.base}, {len(table.dates)} snapshots ({first} to {last})")
+                print(" ".join(table.currencies))
+            else:
+                print(f"{table.convert(args.amount, args.from_code.upper(), args.to_code.upper(), args.date):.6g}")
+    except (OSError, ValueError) as ex:
+        print(f"Error: {ex}", file=sys.stderr)
+        return 1
+    return 0
+
+
+__all__ = [
+    "DEFAULT_TABLE_PATH",
+    "RateTable",
+    "import_csv",
+    "is_currency_code",
+    "open_rate_table",
+    "parse_date",
+    "read_rates_csv",
+    "write_rate_table",
+]
+
+
+if __name__ == "__main__":
+    sys.exit(main())
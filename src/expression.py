@@ -0,0 +1,851 @@
+import operator
+import re
+from typing import Any, Callable, Dict, List, Mapping, NamedTuple, Optional, Tuple
+
+import limits
+from limits import Limits
+from matrix import constant_array, is_matrix, make_array, where
+
+
+# ------------------------------- AST nodes ---------------------------------
+# Nodes are plain tuples tagged by their first item, which keeps the tree
+# compact and hashable:
+#   (NUM, value)            numeric literal (int, float or complex)
+#   (STR, text)             string literal (unit names for convert)
+#   (NAME, identifier)      constant, variable, ANS or function reference
+#   (NEG, operand)          unary minus
+#   (BIN, op, left, right)  binary operator, op is one of BINARY_OPS
+#   (CALL, name, args)      function call, args is a tuple of nodes
+#   (LIST, items)           matrix/vector literal; rows are nested LIST nodes
+NUM = "num"
+STR = "str"
+NAME = "name"
+NEG = "neg"
+BIN = "bin"
+CALL = "call"
+LIST = "list"
+
+BINARY_OPS: Dict[str, Callable[[Any, Any], Any]] = {
+    "+": operator.add,
+    "-": operator.sub,
+    # Integer results are size-checked against the active budget (see limits.py)
+    "*": limits.checked_mul,
+    "/": operator.truediv,
+    "//": operator.floordiv,
+    "%": operator.mod,
+    "**": limits.checked_pow,
+    # Matrix product (elementwise * stays elementwise on arrays, as in NumPy)
+    "@": operator.matmul,
+}
+
+# Comparisons give 1 or 0 (elementwise on arrays), mainly for if(...)
+COMPARISON_OPS: Dict[str, Callable[[Any, Any], Any]] = {
+    "<": lambda a, b: (a < b) * 1,
+    "<=": lambda a, b: (a <= b) * 1,
+    ">": lambda a, b: (a > b) * 1,
+    ">=": lambda a, b: (a >= b) * 1,
+    "==": lambda a, b: (a == b) * 1,
+    "!=": lambda a, b: (a != b) * 1,
+}
+BINARY_OPS.update(COMPARISON_OPS)
+
+# if(condition, then, else) only evaluates the branch it picks
+CONDITIONAL = "if"
+
+# integrate(expression, x, a, b) and friends: the first argument is an
+# expression in the variable named by the second, handed to the function
+# unevaluated (as a BoundExpression). Values are the accepted argument counts;
+# solve(A, b) with two arguments stays the linear solver.
+CALCULUS_FORMS: Dict[str, Tuple[int, ...]] = {"integrate": (4,), "diff": (3,), "solve": (3, 4), "minimize": (3, 4)}
+_CALCULUS_USAGE = {
+    "integrate": "integrate(expression, x, from, to)",
+    "diff": "diff(expression, x, at)",
+    "solve": "solve(expression, x, guess), solve(expression, x, from, to) or solve(A, b)",
+    "minimize": "minimize(expression, x, guess) or minimize(expression, x, from, to)",
+}
+
+# Names that always mean the imaginary unit
+IMAGINARY_UNITS = frozenset({"i", "I"})
+
+Node = Tuple[Any, ...]
+
+
+class ParseError(ValueError):
+    """Raised for malformed expressions; the message includes the position."""
+
+    def __init__(self, message: str, position: Optional[int] = None) -> None:
+        super().__init__(message if position is None else f"{message} at position {position + 1}")
+        self.position = position
+
+
+# ------------------------------- Tokenizer ---------------------------------
+_TOKEN_RE = re.compile(
+    r"""
+    (?P<ws>\s+)
+    | (?P<num>(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?(?:[jJ](?![A-Za-z0-9_]))?)
+    | (?P<name>[A-Za-z_][A-Za-z0-9_]*)
+    | (?P<str>"[^"]*"|'[^']*')
+    | (?P<op>\*\*|//|==|!=|<=|>=|[-+*/%^(),×÷@\[\];<>=])
+    """,
+    re.VERBOSE,
+)
+
+_OP_ALIASES = {"^": "**", "×": "*", "÷": "/"}
+
+Token = Tuple[str, Any, int]  # (kind, value, position)
+
+
+# Turns numeric literal text into a value; see numeric.py for exact modes
+NumberReader = Callable[[str], Any]
+
+
+def tokenize(text: str, number: Optional[NumberReader] = None) -> List[Token]:
+    read_number = number or _parse_number
+    tokens: List[Token] = []
+    pos = 0
+    length = len(text)
+    while pos < length:
+        m = _TOKEN_RE.match(text, pos)
+        if m is None:
+            raise ParseError(f"Unexpected character {text[pos]!r}", pos)
+        kind = m.lastgroup
+        raw = m.group()
+        if kind == "num":
+            try:
+                tokens.append(("num", read_number(raw), pos))
+            except ValueError as ex:
+                raise ParseError(str(ex), pos) from None
+        elif kind == "name":
+            tokens.append(("name", raw, pos))
+        elif kind == "str":
+            tokens.append(("str", raw[1:-1], pos))
+        elif kind == "op":
+            tokens.append(("op", _OP_ALIASES.get(raw, raw), pos))
+        pos = m.end()
+    tokens.append(("end", None, length))
+    return tokens
+
+
+def _parse_number(text: str) -> Any:
+    if text[-1] in "jJ":
+        return complex(0, float(text[:-1]))
+    if "." in text or "e" in text or "E" in text:
+        return float(text)
+    return int(text)
+
+
+# -------------------------------- Parser -----------------------------------
+class _Parser:
+    """
+    Recursive-descent parser for calculator expressions.
+
+    Grammar (highest binding last):
+        compare := expr (("<" | "<=" | ">" | ">=" | "==" | "!=") expr)?
+        expr    := term (("+" | "-") term)*
+        term    := unary (("*" | "/" | "//" | "%" | "@") unary | <implicit> power)*
+        unary   := ("+" | "-") unary | power
+        power   := percent ("**" unary)?
+        percent := primary "%"?          (postfix only right after a number literal: "50%";
+                                          "5 % 2", with a space, is modulo)
+        primary := NUM | STR | NAME | NAME "(" args ")" | "(" compare ")" | matrix
+        matrix  := "[" items (";" items)* "]"    items := compare ("," compare)*
+
+    "[1, 2; 3, 4]" is shorthand for "[[1, 2], [3, 4]]".
+
+    Implicit multiplication covers "2x", "2(3)", "(1)(2)", "2 pi" and "50%3".
+    """
+
+    def __init__(self, text: str, number: Optional[NumberReader] = None) -> None:
+        self.text = text
+        self.number = number or _parse_number
+        self.tokens = tokenize(text, self.number)
+        self.index = 0
+
+    # Token helpers
+    def peek(self) -> Token:
+        return self.tokens[self.index]
+
+    def advance(self) -> Token:
+        tok = self.tokens[self.index]
+        self.index += 1
+        return tok
+
+    def expect_op(self, op: str) -> None:
+        kind, value, pos = self.advance()
+        if kind != "op" or value != op:
+            raise ParseError(f"Expected {op!r} but found {self._describe(kind, value)}", pos)
+
+    @staticmethod
+    def _describe(kind: str, value: Any) -> str:
+        if kind == "end":
+            return "end of expression"
+        if kind == "str":
+            return repr(value)
+        return repr(str(value))
+
+    def error(self, message: Optional[str] = None) -> ParseError:
+        kind, value, pos = self.peek()
+        return ParseError(message or f"Unexpected {self._describe(kind, value)}", pos)
+
+    # Grammar rules
+    def parse(self) -> Node:
+        if self.peek()[0] == "end":
+            raise ParseError("Empty expression")
+        node = self.compare()
+        if self.peek()[0] != "end":
+            raise self.error()
+        return node
+
+    def compare(self) -> Node:
+        node = self.expr()
+        kind, value, _ = self.peek()
+        if kind == "op" and value in COMPARISON_OPS:
+            self.advance()
+            node = (BIN, value, node, self.expr())
+        return node
+
+    def expr(self) -> Node:
+        node = self.term()
+        while True:
+            kind, value, _ = self.peek()
+            if kind == "op" and value in ("+", "-"):
+                self.advance()
+                node = (BIN, value, node, self.term())
+            else:
+                return node
+
+    def term(self) -> Node:
+        node = self.unary()
+        while True:
+            kind, value, _ = self.peek()
+            if kind == "op" and value in ("*", "/", "//", "%", "@"):
+                self.advance()
+                node = (BIN, value, node, self.unary())
+            elif self._implicit_multiplication():
+                node = (BIN, "*", node, self.power())
+            else:
+                return node
+
+    def _implicit_multiplication(self) -> bool:
+        kind, value, _ = self.peek()
+        if kind == "name" or (kind == "op" and value == "("):
+            return True
+        if kind == "num":
+            # "(2)3" and "50%3" multiply; "2 3" stays an error
+            prev_kind, prev_value, _ = self.tokens[self.index - 1]
+            return prev_kind == "op" and prev_value in (")", "%")
+        return False
+
+    def unary(self) -> Node:
+        kind, value, _ = self.peek()
+        if kind == "op" and value in ("+", "-"):
+            self.advance()
+            operand = self.unary()
+            return operand if value == "+" else (NEG, operand)
+        return self.power()
+
+    def power(self) -> Node:
+        node = self.percent()
+        kind, value, _ = self.peek()
+        if kind == "op" and value == "**":
+            self.advance()
+            # Right-associative; the exponent may carry its own sign (2^-1)
+            node = (BIN, "**", node, self.unary())
+        return node
+
+    def percent(self) -> Node:
+        node = self.primary()
+        kind, value, pos = self.peek()
+        if (
+            node[0] == NUM
+            and kind == "op"
+            and value == "%"
+            and self.tokens[self.index - 1][0] == "num"
+            # Touching the number: whitespace in between makes it modulo
+            and not self.text[pos - 1].isspace()
+        ):
+            self.advance()
+            node = (BIN, "/", node, (NUM, 100))
+        return node
+
+    def primary(self) -> Node:
+        kind, value, pos = self.peek()
+        if kind == "num":
+            self.advance()
+            return (NUM, value)
+        if kind == "str":
+            self.advance()
+            return (STR, value)
+        if kind == "name":
+            self.advance()
+            if self.peek()[0] == "op" and self.peek()[1] == "(":
+                args = self.arguments()
+                if value == CONDITIONAL and len(args) != 3:
+                    raise ParseError("if needs three arguments: if(condition, then, else)", pos)
+                if value in CALCULUS_FORMS:
+                    self._check_calculus(value, args, pos)
+                return (CALL, value, args)
+            if value in IMAGINARY_UNITS:
+                try:
+                    return (NUM, self.number("1j"))
+                except ValueError as ex:
+                    raise ParseError(str(ex), pos) from None
+            return (NAME, value)
+        if kind == "op" and value == "(":
+            self.advance()
+            node = self.compare()
+            self.expect_op(")")
+            return node
+        if kind == "op" and value == "[":
+            return self.matrix()
+        raise self.error()
+
+    @staticmethod
+    def _check_calculus(name: str, args: Tuple[Node, ...], pos: int) -> None:
+        if len(args) not in CALCULUS_FORMS[name]:
+            if name == "solve" and len(args) == 2:
+                return
+            raise ParseError(f"Usage: {_CALCULUS_USAGE[name]}", pos)
+        if args[1][0] != NAME:
+            raise ParseError(f"The second argument of {name} must be a variable name, as in {_CALCULUS_USAGE[name]}", pos)
+
+    def matrix(self) -> Node:
+        self.expect_op("[")
+        rows: List[Node] = []
+        items: List[Node] = []
+        while True:
+            items.append(self.compare())
+            kind, value, pos = self.advance()
+            if kind == "op" and value == ",":
+                continue
+            if kind == "op" and value in (";", "]"):
+                rows.append((LIST, tuple(items)))
+                items = []
+                if value == "]":
+                    break
+                continue
+            raise ParseError(f"Expected ',', ';' or ']' but found {self._describe(kind, value)}", pos)
+        return rows[0] if len(rows) == 1 else (LIST, tuple(rows))
+
+    def arguments(self) -> Tuple[Node, ...]:
+        self.expect_op("(")
+        args: List[Node] = []
+        if self.peek()[0] == "op" and self.peek()[1] == ")":
+            self.advance()
+            return ()
+        while True:
+            args.append(self.compare())
+            kind, value, pos = self.advance()
+            if kind == "op" and value == ")":
+                return tuple(args)
+            if not (kind == "op" and value == ","):
+                raise ParseError(f"Expected ',' or ')' but found {self._describe(kind, value)}", pos)
+
+
+def parse(text: str, number: Optional[NumberReader] = None) -> Node:
+    """Parse an expression into an AST; raises ParseError on bad input."""
+    return _Parser(str(text).strip(), number).parse()
+
+
+class Definition(NamedTuple):
+    """A function definition such as "f(x, y) = x^2 + y", split at the "="."""
+
+    name: str
+    params: Tuple[str, ...]
+    body: str
+
+
+def parse_definition(text: str) -> Optional[Definition]:
+    """
+    Split "name(params) = body" into its parts, or return None if the text
+    is not shaped like a definition. Only the head is checked here; the body
+    is compiled like any other expression.
+    """
+    text = str(text).strip()
+    if "=" not in text:
+        return None
+    try:
+        tokens = tokenize(text)
+    except ParseError:
+        return None
+    if len(tokens) < 4 or tokens[0][0] != "name" or tokens[1][1] != "(":
+        return None
+    params: List[str] = []
+    index = 2
+    if tokens[index][1] == ")":
+        index += 1
+    else:
+        while True:
+            kind, value, pos = tokens[index]
+            if kind != "name":
+                return None
+            params.append(value)
+            separator = tokens[index + 1][1]
+            index += 2
+            if separator == ")":
+                break
+            if separator != ",":
+                return None
+    kind, value, pos = tokens[index]
+    if kind != "op" or value != "=":
+        return None
+    body = text[tokens[index + 1][2]:].strip()
+    if not body:
+        raise ParseError("Missing function body", pos + 1)
+    duplicates = {param for param in params if params.count(param) > 1}
+    if duplicates:
+        raise ParseError(f"Repeated parameter '{min(duplicates)}'", tokens[2][2])
+    return Definition(tokens[0][1], tuple(params), body)
+
+
+# ------------------------------- Optimizer ---------------------------------
+# Optional pass run once per compiled expression. Only names listed in
+# `constants` and `pure` are treated as fixed; anything else (ANS, MR, user
+# functions, variables) is left to be resolved at evaluation time.
+_NUMBER_TYPES = (int, float, complex)
+
+
+def fold_constants(
+    node: Node,
+    pure: Mapping[str, Callable[..., Any]],
+    constants: Mapping[str, Any],
+    unit_factor: Optional[Callable[[str, str], float]] = None,
+) -> Node:
+    """
+    Fold operators and pure calls over literals into single literals, and turn
+    convert(v, "a", "b") with literal units into v * factor. Subtrees whose
+    evaluation raises are kept as-is so the error still surfaces at run time.
+    """
+    tag = node[0]
+    if tag == NAME:
+        name = node[1]
+        if name in constants:
+            return (NUM, constants[name])
+        return node
+    if tag == NEG:
+        operand = fold_constants(node[1], pure, constants, unit_factor)
+        if operand[0] == NUM:
+            return _folded(lambda: -operand[1], (NEG, operand))
+        return (NEG, operand)
+    if tag == BIN:
+        left = fold_constants(node[2], pure, constants, unit_factor)
+        right = fold_constants(node[3], pure, constants, unit_factor)
+        rebuilt = (BIN, node[1], left, right)
+        if left[0] == NUM and right[0] == NUM:
+            op = BINARY_OPS[node[1]]
+            return _folded(lambda: op(left[1], right[1]), rebuilt)
+        return rebuilt
+    if tag == CALL:
+        name = node[1]
+        if is_calculus(node):
+            body, variable = node[2][0], node[2][1]
+            # The variable shadows constants of the same name (e.g. e) in the body
+            if variable[1] in constants:
+                constants = {key: value for key, value in constants.items() if key != variable[1]}
+            rest = tuple(fold_constants(arg, pure, constants, unit_factor) for arg in node[2][2:])
+            return (CALL, name, (fold_constants(body, pure, constants, unit_factor), variable) + rest)
+        args = tuple(fold_constants(arg, pure, constants, unit_factor) for arg in node[2])
+        rebuilt = (CALL, name, args)
+        if name == CONDITIONAL and len(args) == 3 and args[0][0] == NUM:
+            # A literal condition picks its branch now
+            return args[1] if args[0][1] else args[2]
+        if name not in pure:
+            return rebuilt
+        if all(arg[0] in (NUM, STR) for arg in args):
+            func = pure[name]
+            return _folded(lambda: func(*[arg[1] for arg in args]), rebuilt)
+        if name == "convert" and unit_factor is not None and len(args) == 3 and args[1][0] == STR and args[2][0] == STR:
+            try:
+                factor = unit_factor(args[1][1], args[2][1])
+            except Exception:
+                return rebuilt
+            return (BIN, "*", args[0], (NUM, factor))
+        return rebuilt
+    if tag == LIST:
+        # Items are folded; the array itself is built once by the compiler
+        return (LIST, tuple(fold_constants(item, pure, constants, unit_factor) for item in node[1]))
+    return node
+
+
+def _folded(compute: Callable[[], Any], fallback: Node) -> Node:
+    try:
+        value = compute()
+    except Exception:
+        return fallback
+    if isinstance(value, _NUMBER_TYPES) and not isinstance(value, bool):
+        return (NUM, value)
+    return fallback
+
+
+def shared_subtrees(node: Node, pure: Mapping[str, Callable[..., Any]]) -> Dict[str, int]:
+    """
+    Find repeated side-effect-free subtrees. Returns a slot index per subtree
+    key; compiled code evaluates each of them at most once per run.
+    """
+    counts: Dict[str, int] = {}
+
+    def visit(cur: Node) -> bool:
+        # Returns True when the subtree is free of impure calls
+        tag = cur[0]
+        if tag in (NUM, STR, NAME):
+            return True
+        if tag == LIST:
+            # Arrays are not shared: a literal is already built only once
+            return all([visit(item) for item in cur[1]])
+        if tag == NEG:
+            ok = visit(cur[1])
+        elif tag == BIN:
+            ok = visit(cur[2]) & visit(cur[3])
+        elif is_calculus(cur):
+            # The body runs once per value of its variable: nothing in it is shared
+            all([visit(arg) for arg in cur[2][2:]])
+            ok = False
+        else:
+            ok = all([visit(arg) for arg in cur[2]]) and cur[1] in pure
+        if ok:
+            key = _node_key(cur)
+            counts[key] = counts.get(key, 0) + 1
+        return ok
+
+    visit(node)
+    shared = [key for key, count in counts.items() if count > 1]
+    return {key: slot for slot, key in enumerate(shared)}
+
+
+def _node_key(node: Node) -> str:
+    # repr keeps 1, 1.0 and 1+0j apart, unlike tuple equality
+    return repr(node)
+
+
+# ------------------------------- Evaluator ---------------------------------
+class Frame:
+    """Per-evaluation state handed to compiled code."""
+
+    __slots__ = ("locals", "globals", "memo")
+
+    def __init__(self, local_names: Mapping[str, Any], global_names: Mapping[str, Any], memo: Optional[List[Any]] = None) -> None:
+        self.locals = local_names
+        self.globals = global_names
+        self.memo = memo
+
+
+_MISSING = object()
+Evaluator = Callable[[Frame], Any]
+
+
+class BoundExpression:
+    """
+    The expression argument of integrate(...) and friends, callable with a
+    value (or array of values) for its variable. Other names resolve as in the
+    calling expression, or in `global_names` when given (e.g. NumPy functions
+    for evaluating a whole batch of points at once). `tree` is the body as a
+    tree, for symbolic work such as exact derivatives.
+    """
+
+    __slots__ = ("_code", "variable", "locals", "globals", "tree")
+
+    def __init__(self, code: Evaluator, variable: str, frame: Frame, tree: Optional[Node] = None) -> None:
+        self._code = code
+        self.variable = variable
+        self.locals = frame.locals
+        self.globals = frame.globals
+        self.tree = tree
+
+    def __call__(self, value: Any, global_names: Optional[Mapping[str, Any]] = None) -> Any:
+        local = dict(self.locals)
+        local[self.variable] = value
+        return self._code(Frame(local, self.globals if global_names is None else global_names))
+
+    def rebound(self, code: Evaluator, tree: Optional[Node] = None) -> "BoundExpression":
+        """Another body (e.g. the derivative of this one) with the same variable and names."""
+        return BoundExpression(code, self.variable, Frame(self.locals, self.globals), tree)
+
+
+def _compile_node(node: Node, shared: Optional[Dict[str, int]] = None) -> Evaluator:
+    """Turn an AST node into a nest of closures (compiled once, run many times)."""
+    if shared and node[0] in (NEG, BIN, CALL):
+        slot = shared.get(_node_key(node))
+        if slot is not None:
+            return _memoized(_compile_plain(node, shared), slot)
+    return _compile_plain(node, shared)
+
+
+def compile_tree(node: Node) -> Evaluator:
+    """Compile a tree built elsewhere (e.g. by symbolic.py) as is: no folding or sharing."""
+    return _compile_node(node)
+
+
+def _memoized(inner: Evaluator, slot: int) -> Evaluator:
+    def cached(fr: Frame) -> Any:
+        memo = fr.memo
+        value = memo[slot]
+        if value is _MISSING:
+            value = memo[slot] = inner(fr)
+        return value
+
+    return cached
+
+
+def _compile_plain(node: Node, shared: Optional[Dict[str, int]]) -> Evaluator:
+    tag = node[0]
+    if tag == NUM or tag == STR:
+        value = node[1]
+        return lambda fr: value
+    if tag == NAME:
+        return _compile_name(node[1])
+    if tag == NEG:
+        operand = _compile_node(node[1], shared)
+        return lambda fr: -operand(fr)
+    if tag == BIN:
+        left_node, right_node = node[2], node[3]
+        op = _binary_op(node[1], left_node, right_node)
+        left = _compile_node(left_node, shared)
+        if right_node[0] == NUM:
+            const = right_node[1]
+            return lambda fr: op(left(fr), const)
+        right = _compile_node(right_node, shared)
+        if left_node[0] == NUM:
+            const = left_node[1]
+            return lambda fr: op(const, right(fr))
+        return lambda fr: op(left(fr), right(fr))
+    if tag == CALL and node[1] == CONDITIONAL:
+        return _compile_conditional(*[_compile_node(arg, shared) for arg in node[2]])
+    if tag == CALL and is_calculus(node):
+        return _compile_calculus(node, shared)
+    if tag == CALL:
+        func = _compile_name(node[1])
+        args = [_compile_node(arg, shared) for arg in node[2]]
+        if not args:
+            return lambda fr: func(fr)()
+        if len(args) == 1:
+            arg0 = args[0]
+            return lambda fr: func(fr)(arg0(fr))
+        if len(args) == 2:
+            arg0, arg1 = args
+            return lambda fr: func(fr)(arg0(fr), arg1(fr))
+        return lambda fr: func(fr)(*[arg(fr) for arg in args])
+    if tag == LIST:
+        if _is_literal_list(node):
+            # Built once at compile time and shared (read-only) by every run
+            value = constant_array(_literal_rows(node))
+            return lambda fr: value
+        rows = _compile_rows(node, shared)
+        return lambda fr: make_array(rows(fr))
+    raise TypeError(f"Unknown node type {tag!r}")
+
+
+def _compile_conditional(condition: Evaluator, then: Evaluator, otherwise: Evaluator) -> Evaluator:
+    def conditional(fr: Frame) -> Any:
+        test = condition(fr)
+        if is_matrix(test):
+            # Elementwise over arrays (vectorized evaluation): both sides are needed
+            return where(test, then(fr), otherwise(fr))
+        return then(fr) if test else otherwise(fr)
+
+    return conditional
+
+
+def _compile_calculus(node: Node, shared: Optional[Dict[str, int]]) -> Evaluator:
+    func = _compile_name(node[1])
+    # Compiled once; the function runs it for as many points as it needs
+    tree = node[2][0]
+    body = _compile_node(tree)
+    variable = node[2][1][1]
+    args = [_compile_node(arg, shared) for arg in node[2][2:]]
+
+    def calculus(fr: Frame) -> Any:
+        return func(fr)(BoundExpression(body, variable, fr, tree), *[arg(fr) for arg in args])
+
+    return calculus
+
+
+def is_calculus(node: Node) -> bool:
+    """True for integrate(...), diff(...), solve(...) and minimize(...) calls with a bound variable."""
+    return node[0] == CALL and len(node[2]) in CALCULUS_FORMS.get(node[1], ())
+
+
+def _is_literal_list(node: Node) -> bool:
+    return all(item[0] == NUM or (item[0] == LIST and _is_literal_list(item)) for item in node[1])
+
+
+def _literal_rows(node: Node) -> List[Any]:
+    return [_literal_rows(item) if item[0] == LIST else item[1] for item in node[1]]
+
+
+def _compile_rows(node: Node, shared: Optional[Dict[str, int]]) -> Evaluator:
+    # Nested rows evaluate to plain lists so the array is built (copied) once
+    items = [_compile_rows(item, shared) if item[0] == LIST else _compile_node(item, shared) for item in node[1]]
+    return lambda fr: [item(fr) for item in items]
+
+
+# With a float or complex literal operand the result cannot be a huge integer
+_UNCHECKED_OPS = {"*": operator.mul, "**": operator.pow}
+_INEXACT_TYPES = (float, complex)
+
+
+def _binary_op(op: str, left: Node, right: Node) -> Callable[[Any, Any], Any]:
+    if op in _UNCHECKED_OPS and (
+        (left[0] == NUM and type(left[1]) in _INEXACT_TYPES) or (right[0] == NUM and type(right[1]) in _INEXACT_TYPES)
+    ):
+        return _UNCHECKED_OPS[op]
+    return BINARY_OPS[op]
+
+
+def _compile_name(name: str) -> Evaluator:
+    def load(fr: Frame) -> Any:
+        value = fr.locals.get(name, _MISSING)
+        if value is _MISSING:
+            value = fr.globals.get(name, _MISSING)
+            if value is _MISSING:
+                raise NameError(f"name {name!r} is not defined")
+        return value
+
+    return load
+
+
+def names_in(node: Node) -> frozenset:
+    """All identifiers referenced by a tree (variables and called functions)."""
+    found = set()
+    stack = [node]
+    while stack:
+        cur = stack.pop()
+        tag = cur[0]
+        if tag == NAME:
+            found.add(cur[1])
+        elif tag == NEG:
+            stack.append(cur[1])
+        elif tag == BIN:
+            stack.append(cur[2])
+            stack.append(cur[3])
+        elif tag == CALL:
+            if cur[1] != CONDITIONAL:
+                found.add(cur[1])
+            if is_calculus(cur):
+                # The bound variable is local to the body
+                found.update(names_in(cur[2][0]) - {cur[2][1][1]})
+                stack.extend(cur[2][2:])
+            else:
+                stack.extend(cur[2])
+        elif tag == LIST:
+            stack.extend(cur[1])
+    return frozenset(found)
+
+
+# ------------------------------- Cost hint ---------------------------------
+# Functions whose running time grows with the size of their argument
+_GROWING_FUNCTIONS = frozenset({"factorial"})
+
+
+def is_expensive(node: Node, limit: int = 1000) -> bool:
+    """
+    Conservative static check for expressions that may run long: factorial
+    of anything but a literal up to `limit`, or a power whose exponent is not
+    a literal within `limit` (big-integer powers grow without bound). Works
+    on the unfolded tree, so it is cheap enough to run before compiling.
+    """
+    stack = [node]
+    while stack:
+        cur = stack.pop()
+        tag = cur[0]
+        if tag == NEG:
+            stack.append(cur[1])
+        elif tag == BIN:
+            if cur[1] == "**" and not _small_literal(cur[3], limit):
+                return True
+            stack.append(cur[2])
+            stack.append(cur[3])
+        elif tag == CALL:
+            if cur[1] in _GROWING_FUNCTIONS and not all(_small_literal(arg, limit) for arg in cur[2]):
+                return True
+            stack.extend(cur[2])
+        elif tag == LIST:
+            stack.extend(cur[1])
+    return False
+
+
+def _small_literal(node: Node, limit: int) -> bool:
+    if node[0] == NEG:
+        node = node[1]
+    return node[0] == NUM and abs(node[1]) <= limit
+
+
+class Program:
+    """A parsed and compiled expression, reusable across evaluations."""
+
+    __slots__ = ("source", "tree", "names", "optimized", "expensive", "_code", "_memo_size")
+
+    def __init__(
+        self,
+        source: str,
+        tree: Node,
+        pure: Optional[Mapping[str, Callable[..., Any]]] = None,
+        constants: Optional[Mapping[str, Any]] = None,
+        unit_factor: Optional[Callable[[str, str], float]] = None,
+    ) -> None:
+        self.source = source
+        self.tree = tree
+        self.names = names_in(tree)
+        # Judged before folding, which is when a literal factorial would run
+        self.expensive = is_expensive(tree)
+        shared: Dict[str, int] = {}
+        if pure is not None:
+            token = limits.activate(limits.FOLD_LIMITS)
+            try:
+                tree = fold_constants(tree, pure, constants or {}, unit_factor)
+            finally:
+                limits.deactivate(token)
+            shared = shared_subtrees(tree, pure)
+        self.optimized = tree
+        self._memo_size = len(shared)
+        self._code = _compile_node(tree, shared)
+
+    def evaluate(
+        self, local_names: Mapping[str, Any], global_names: Mapping[str, Any], budget: Optional[Limits] = None
+    ) -> Any:
+        """
+        Run the program; names resolve in local_names first, then global_names.
+        With a budget, the run is bounded by its time and integer-size limits.
+        """
+        frame = Frame(local_names, global_names, [_MISSING] * self._memo_size if self._memo_size else None)
+        if budget is None:
+            return self._code(frame)
+        token = limits.activate(budget)
+        try:
+            return self._code(frame)
+        finally:
+            limits.deactivate(token)
+
+
+def compile_expression(
+    text: str,
+    pure: Optional[Mapping[str, Callable[..., Any]]] = None,
+    constants: Optional[Mapping[str, Any]] = None,
+    unit_factor: Optional[Callable[[str, str], float]] = None,
+    number: Optional[NumberReader] = None,
+) -> Program:
+    """
+    Parse and compile text; raises ParseError on bad input. Passing the pure
+    functions (and constants) of the target namespace enables constant folding
+    and common-subexpression elimination; `number` reads numeric literals
+    (int/float/complex by default).
+    """
+    return Program(text, parse(text, number), pure, constants, unit_factor)
+
+
+__all__ = [
+    "CALCULUS_FORMS",
+    "CONDITIONAL",
+    "BoundExpression",
+    "Definition",
+    "ParseError",
+    "Program",
+    "compile_expression",
+    "compile_tree",
+    "fold_constants",
+    "is_calculus",
+    "is_expensive",
+    "parse",
+    "parse_definition",
+    "shared_subtrees",
+    "tokenize",
+]
@@ -1,9 +1,14 @@
 import tkinter as tk
+from tkinter import font as tkfont
+from tkinter import filedialog
 from tkinter import messagebox
 from tkinter import ttk
 import sys
 import os
 import json
+import re
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, List, Optional
 
 try:
     import winsound  # type: ignore
@@ -11,6 +16,21 @@ except Exception:
     winsound = None  # type: ignore
 
 from calculator import CalculatorEngine
+from plotting import (
+    FUNCTION,
+    IMPLICIT,
+    PARAMETRIC,
+    POLAR,
+    Cancelled,
+    FunctionSampler,
+    PlotSpec,
+    render,
+    robust_ylim,
+    split_top_level,
+)
+
+# Plain decimal results whose integer part can be digit-grouped as-is
+_PLAIN_NUMBER = re.compile(r"-?\d+(\.\d+)?")
 
 
 class CalculatorApp(tk.Tk):
@@ -26,6 +46,11 @@ class CalculatorApp(tk.Tk):
         self.large_buttons = False
         self._prefs_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".calculator_ui.json")
         self._history_index = None  # type: ignore[var-annotated]
+        # Tape filter state: matching history-index ids (None when unfiltered)
+        self._tape_query = ""
+        self._tape_matches: Optional[List[int]] = None
+        self._tape_index_len = 0
+        self._tape_filter_job: Optional[str] = None
         self._build_menu()
         self._build_ui()
         self._bind_keys()
@@ -64,11 +89,17 @@ class CalculatorApp(tk.Tk):
 
         tools_menu = tk.Menu(menubar, tearoff=0)
         tools_menu.add_command(label="Unit Converter", command=self._open_unit_converter)
-        tools_menu.add_command(label="Graph Function", command=self._open_graph_window)
+        tools_menu.add_command(label="Graph", command=self._open_graph_window)
+        tools_menu.add_command(label="Import Exchange Rates...", command=self._import_exchange_rates)
         menubar.add_cascade(label="Tools", menu=tools_menu)
 
         options_menu = tk.Menu(menubar, tearoff=0)
         options_menu.add_checkbutton(label="Enable Sounds", command=self._toggle_sounds)
+        mode_menu = tk.Menu(options_menu, tearoff=0)
+        self._numeric_mode_var = tk.StringVar(value=self.engine.numeric_backend.name)
+        for label, mode in (("Float", "float"), ("Decimal", "decimal"), ("Exact Fraction", "fraction")):
+            mode_menu.add_radiobutton(label=label, value=mode, variable=self._numeric_mode_var, command=self._set_numeric_mode)
+        options_menu.add_cascade(label="Number Mode", menu=mode_menu)
         menubar.add_cascade(label="Options", menu=options_menu)
 
         help_menu = tk.Menu(menubar, tearoff=0)
@@ -121,16 +152,14 @@ class CalculatorApp(tk.Tk):
         self.tape_filter_var = tk.StringVar()
         search = ttk.Entry(controls, textvariable=self.tape_filter_var, width=16)
         search.pack(side=tk.LEFT, padx=4)
-        search.bind("<KeyRelease>", lambda e: self._refresh_tape())
+        search.bind("<KeyRelease>", self._schedule_tape_filter)
         ttk.Button(controls, text="Clear", command=self._clear_tape).pack(side=tk.LEFT)
-        # Tape list
-        list_wrap = ttk.Frame(tape_frame)
-        list_wrap.pack(side=tk.TOP, fill=tk.BOTH, expand=True)
-        self.tape_list = tk.Listbox(list_wrap, height=20)
-        self.tape_list.pack(side=tk.LEFT, fill=tk.BOTH, expand=True, padx=(6, 0))
-        scroll = ttk.Scrollbar(list_wrap, orient=tk.VERTICAL, command=self.tape_list.yview)
-        scroll.pack(side=tk.RIGHT, fill=tk.Y)
-        self.tape_list.config(yscrollcommand=scroll.set)
+        # Tape list: only the visible rows of the (possibly huge) history exist as widget items
+        self.tape_view = VirtualList(
+            tape_frame, self._tape_row_count, self._tape_row_key, self._tape_row_text, height=20
+        )
+        self.tape_view.pack(side=tk.TOP, fill=tk.BOTH, expand=True)
+        self.tape_list = self.tape_view.listbox
         self.tape_list.bind("<Double-Button-1>", self._reuse_from_tape)
         self.tape_list.bind("<Button-3>", self._tape_context_menu)
         self._refresh_tape()
@@ -254,26 +283,75 @@ class CalculatorApp(tk.Tk):
         self._status("Subtracted from memory")
         self._update_memory_indicator()
 
-    def _current_result_or_eval(self) -> float:
+    def _current_result_or_eval(self) -> Any:
         text = self.result_var.get()
         if not text:
             text = self.engine.evaluate(self.equation_var.get())
             self.result_var.set(text)
         try:
-            return float(text)
+            # Parsed in the current number mode so memory keeps every digit
+            return self.engine.parse_number(text.replace(",", ""))
         except Exception:
             return 0.0
 
     # ----------------------------- Tape -----------------------------------
     def _refresh_tape(self) -> None:
-        self.tape_list.delete(0, tk.END)
-        items = self.engine.history[-200:]
+        """Bring the tape up to date after new results; only changed rows are touched."""
+        if self._tape_matches is not None:
+            index = self.engine.history_index
+            new_ids = range(self._tape_index_len, len(index))
+            self._tape_matches.extend(index.refine(new_ids, self._tape_query))
+            self._tape_index_len = len(index)
+        self.tape_view.refresh()
+
+    def _schedule_tape_filter(self, _event: object = None) -> None:
+        # Debounce typing in the search box
+        if self._tape_filter_job is not None:
+            self.after_cancel(self._tape_filter_job)
+        self._tape_filter_job = self.after(150, self._apply_tape_filter)
+
+    def _apply_tape_filter(self) -> None:
+        self._tape_filter_job = None
         q = (self.tape_filter_var.get() or "").strip().lower()
-        if q:
-            items = [(e, r) for (e, r) in items if q in e.lower() or q in r.lower()]
-        for expr, result in items:
-            self.tape_list.insert(tk.END, f"{expr} = {result}")
-        self.tape_list.see(tk.END)
+        if q == self._tape_query and (self._tape_matches is not None) == bool(q):
+            return
+        if not q:
+            self._tape_matches = None
+        else:
+            # Filtering searches the whole persisted history, not just the ring buffer
+            index = self.engine.history_index
+            if (
+                self._tape_matches is not None
+                and self._tape_query
+                and q.startswith(self._tape_query)
+                and self._tape_index_len == len(index)
+            ):
+                # Extending the query can only narrow the previous matches
+                self._tape_matches = index.refine(self._tape_matches, q)
+            else:
+                self._tape_matches = index.search(q)[::-1]
+            self._tape_index_len = len(index)
+        self._tape_query = q
+        self.tape_view.refresh(reset=True)
+
+    def _tape_row_count(self) -> int:
+        if self._tape_matches is not None:
+            return len(self._tape_matches)
+        return len(self.engine.history)
+
+    def _tape_row_key(self, row: int) -> int:
+        if self._tape_matches is not None:
+            return self._tape_matches[row]
+        # Absolute sequence number, stable while older entries are evicted
+        history = self.engine.history
+        return history.total_appended - len(history) + row
+
+    def _tape_row_text(self, row: int) -> str:
+        if self._tape_matches is not None:
+            expr, result = self.engine.history_index.entry(self._tape_matches[row])
+        else:
+            expr, result = self.engine.history[row]
+        return f"{expr} = {result}"
 
     def _reuse_from_tape(self, _event: object) -> None:
         sel = self.tape_list.curselection()
@@ -423,22 +501,13 @@ class CalculatorApp(tk.Tk):
         display = text
         if self.readable_numbers:
             try:
-                if "j" not in text and "(" not in text and ")" not in text and text not in ("inf", "-inf", "nan"):
-                    if "." not in text and "e" not in text and "E" not in text:
-                        # integer
-                        display = f"{int(float(text)):,}"
-                    else:
-                        val = float(text)
-                        # 15 sig figs then group integer part
-                        s = ("%.*g" % (15, val))
-                        if "e" in s or "E" in s:
-                            display = s
-                        else:
-                            if "." in s:
-                                whole, frac = s.split(".", 1)
-                                display = f"{int(whole):,}." + frac
-                            else:
-                                display = f"{int(s):,}"
+                # Group the text itself: going through float would drop the
+                # extra digits of decimal and exact results
+                if _PLAIN_NUMBER.fullmatch(text):
+                    whole, dot, frac = text.partition(".")
+                    display = f"{int(whole):,}{dot}{frac}"
+                    if whole == "-0":
+                        display = "-" + display
             except Exception:
                 display = text
         self.result_var.set(display)
@@ -546,84 +615,261 @@ class CalculatorApp(tk.Tk):
                 res = self.engine._convert_units(v, from_var.get(), to_var.get())
                 result_var.set(str(res))
             except Exception as ex:
-                result_var.set(f"Error: {type(ex).__name__}")
+                result_var.set(f"Error: {ex}" if isinstance(ex, ValueError) else f"Error: {type(ex).__name__}")
 
         ttk.Button(frm, text="Convert", command=do_convert).grid(row=4, column=0, columnspan=2, pady=(10, 0))
         frm.columnconfigure(1, weight=1)
 
+    def _import_exchange_rates(self) -> None:
+        path = filedialog.askopenfilename(
+            parent=self, title="Import Exchange Rates (CSV)", filetypes=[("CSV files", "*.csv"), ("All files", "*.*")]
+        )
+        if not path:
+            return
+        try:
+            from currency import import_csv
+
+            dates, currencies = import_csv(path, self.engine.core.rates_path)
+        except Exception as ex:
+            messagebox.showerror("Exchange Rates", f"Could not import rates: {ex}")
+            return
+        self.engine.core.reload_rates()
+        self._status(f"Imported rates: {currencies} currencies, {dates} dates")
+
     def _open_graph_window(self) -> None:
         try:
             import matplotlib
+            import numpy as np
             matplotlib.use("TkAgg")
-            from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+            from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg, NavigationToolbar2Tk
             from matplotlib.figure import Figure
         except Exception:
             messagebox.showinfo("Graphing", "Install matplotlib to use graphing (pip install matplotlib)")
             return
 
         win = tk.Toplevel(self)
-        win.title("Graph Function")
-        win.geometry("520x420")
+        win.title("Graph")
+        win.geometry("600x560")
 
         frm = ttk.Frame(win)
         frm.pack(fill=tk.BOTH, expand=True, padx=8, pady=8)
 
-        ttk.Label(frm, text="f(x) =").grid(row=0, column=0, sticky="w")
-        fx_var = tk.StringVar(value="sin(x)")
-        ttk.Entry(frm, textvariable=fx_var).grid(row=0, column=1, sticky="ew")
-        ttk.Label(frm, text="x min").grid(row=1, column=0, sticky="w")
-        xmin_var = tk.StringVar(value="-360")
-        ttk.Entry(frm, textvariable=xmin_var).grid(row=1, column=1, sticky="ew")
-        ttk.Label(frm, text="x max").grid(row=2, column=0, sticky="w")
-        xmax_var = tk.StringVar(value="360")
-        ttk.Entry(frm, textvariable=xmax_var).grid(row=2, column=1, sticky="ew")
+        kinds = {
+            "Function y = f(x)": FUNCTION,
+            "Parametric x(t), y(t)": PARAMETRIC,
+            "Polar r(t)": POLAR,
+            "Implicit F(x, y) = G(x, y)": IMPLICIT,
+        }
+        examples = {
+            FUNCTION: "sin(x); cos(x)",
+            PARAMETRIC: "cos(3t), sin(2t)",
+            POLAR: "1 + cos(t); 2sin(3t)",
+            IMPLICIT: "x^2 + y^2 = 4; y^2 = x^3 - x",
+        }
+        ttk.Label(frm, text="Kind").grid(row=0, column=0, sticky="w")
+        kind_var = tk.StringVar(value=next(iter(kinds)))
+        kind_box = ttk.Combobox(frm, textvariable=kind_var, values=list(kinds), state="readonly")
+        kind_box.grid(row=0, column=1, sticky="ew")
+        ttk.Label(frm, text="Curves").grid(row=1, column=0, sticky="w")
+        curves_var = tk.StringVar(value=examples[FUNCTION])
+        ttk.Entry(frm, textvariable=curves_var).grid(row=1, column=1, sticky="ew")
+        ttk.Label(frm, text="Separate curves with ';'. t is in degrees.").grid(row=2, column=1, sticky="w")
+
+        # x range for every kind, y range for implicit plots, t range for curves
+        ranges = ttk.Frame(frm)
+        ranges.grid(row=3, column=0, columnspan=2, sticky="ew", pady=(4, 0))
+        range_vars = {}
+        for col, (name, default) in enumerate(
+            (("x min", "-360"), ("x max", "360"), ("y min", "-3"), ("y max", "3"), ("t min", "0"), ("t max", "360"))
+        ):
+            ttk.Label(ranges, text=name).grid(row=0, column=2 * col, sticky="w", padx=(0 if col == 0 else 6, 2))
+            range_vars[name] = tk.StringVar(value=default)
+            ttk.Entry(ranges, textvariable=range_vars[name], width=7).grid(row=0, column=2 * col + 1)
+
+        controls = ttk.Frame(frm)
+        controls.grid(row=4, column=0, columnspan=2, sticky="ew", pady=(6, 0))
+        status_label = ttk.Label(controls, text="")
+        status_label.pack(side=tk.RIGHT)
 
         fig = Figure(figsize=(5, 3), dpi=100)
         ax = fig.add_subplot(111)
         canvas = FigureCanvasTkAgg(fig, master=frm)
-        canvas.get_tk_widget().grid(row=4, column=0, columnspan=2, sticky="nsew", pady=(8, 0))
-
-        def plot() -> None:
+        canvas.get_tk_widget().grid(row=5, column=0, columnspan=2, sticky="nsew", pady=(8, 0))
+        # Pan/zoom tools; function and implicit plots are resampled for each new view
+        toolbar = NavigationToolbar2Tk(canvas, frm, pack_toolbar=False)
+        toolbar.grid(row=6, column=0, columnspan=2, sticky="ew")
+
+        # Sampling runs on one worker thread so the window stays responsive. Each
+        # render gets a generation number; starting another one makes the running
+        # render's check() raise Cancelled at its next refinement round.
+        executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="graph")
+        # Only used on the worker thread; its tiles are cached across renders
+        sampler = FunctionSampler(self.engine)
+        state: dict = {"generation": 0, "spec": None, "lines": [], "view_job": None, "input_job": None, "closed": False}
+
+        def pixels() -> int:
+            return max(canvas.get_tk_widget().winfo_width(), 100)
+
+        def cancel() -> None:
+            state["generation"] += 1
+
+        def submit(spec: PlotSpec, keep_view: bool) -> None:
+            cancel()
+            generation = state["generation"]
+            # The worker evaluates on a snapshot, so the calculator can keep changing
+            engine = self.engine.fork()
+            width = pixels()
+
+            def check() -> None:
+                if state["generation"] != generation:
+                    raise Cancelled()
+
+            def work() -> list:
+                check()
+                sampler.engine = engine
+                return render(sampler, spec, width, check)
+
+            future = executor.submit(work)
+            status_label.configure(text="Rendering...")
+            # Polled from the main window, which outlives this one
+            self.after(30, poll, future, generation, spec, keep_view)
+
+        def poll(future: Any, generation: int, spec: PlotSpec, keep_view: bool) -> None:
+            # Results come back through the Tk loop; stale ones are dropped
+            if state["closed"] or state["generation"] != generation:
+                return
+            if not future.done():
+                self.after(30, poll, future, generation, spec, keep_view)
+                return
             try:
-                xmin = float(xmin_var.get())
-                xmax = float(xmax_var.get())
-                if xmax <= xmin:
-                    raise ValueError("x max must be greater than x min")
-                fx = fx_var.get()
-                xs = []
-                ys = []
-                allowed = self.engine._allowed_names()
-                steps = 400
-                step = (xmax - xmin) / steps
-                for i in range(steps + 1):
-                    x = xmin + i * step
-                    local = dict(allowed)
-                    local.update({"x": x})
-                    try:
-                        y = eval(self.engine._preprocess_expression(fx), {"__builtins__": {}}, local)  # noqa: S307
-                        if isinstance(y, complex):
-                            y = y.real
-                        xs.append(x)
-                        ys.append(float(y))
-                    except Exception:
-                        continue
-                ax.clear()
-                ax.plot(xs, ys)
-                ax.set_xlabel("x")
-                ax.set_ylabel("f(x)")
-                ax.grid(True, alpha=0.3)
-                canvas.draw()
+                curves = future.result()
+            except Cancelled:
+                return
             except Exception as ex:
-                messagebox.showerror("Graphing", f"Error: {ex}")
+                status_label.configure(text=f"Error: {ex}")
+                return
+            status_label.configure(text="")
+            draw(spec, curves, keep_view)
+
+        def draw(spec: PlotSpec, curves: list, keep_view: bool) -> None:
+            if keep_view and len(curves) == len(state["lines"]):
+                for line, curve in zip(state["lines"], curves):
+                    line.set_data(curve.xs, curve.ys)
+                canvas.draw_idle()
+                return
+            # clear() also drops the axes' callbacks, so connect again afterwards
+            ax.clear()
+            state["lines"] = [ax.plot(curve.xs, curve.ys, label=curve.label)[0] for curve in curves]
+            state["spec"] = spec
+            if spec.kind == FUNCTION:
+                ax.set_xlim(*spec.x_range)
+                ylim = robust_ylim(np.concatenate([curve.ys for curve in curves]))
+                if ylim is not None:
+                    # Keep poles from flattening the rest of the curve
+                    ax.set_ylim(*ylim)
+            elif spec.kind == IMPLICIT:
+                ax.set_xlim(*spec.x_range)
+                ax.set_ylim(*spec.y_range)
+            else:
+                # Curves can run off to infinity too (e.g. r = 1/cos(t))
+                xlim = robust_ylim(np.concatenate([curve.xs for curve in curves]))
+                ylim = robust_ylim(np.concatenate([curve.ys for curve in curves]))
+                if xlim is not None and ylim is not None:
+                    ax.set_xlim(*xlim)
+                    ax.set_ylim(*ylim)
+                ax.set_aspect("equal", adjustable="datalim")
+            ax.set_xlabel("x")
+            ax.set_ylabel("y")
+            ax.grid(True, alpha=0.3)
+            if len(curves) > 1:
+                ax.legend(loc="best", fontsize="small")
+            if spec.kind in (FUNCTION, IMPLICIT):
+                ax.callbacks.connect("xlim_changed", on_view_changed)
+                ax.callbacks.connect("ylim_changed", on_view_changed)
+            toolbar.update()
+            canvas.draw()
+
+        def resample() -> None:
+            state["view_job"] = None
+            spec = state["spec"]
+            if spec is None or state["closed"]:
+                return
+            spec = spec._replace(x_range=ax.get_xlim(), y_range=ax.get_ylim() if spec.kind == IMPLICIT else spec.y_range)
+            if spec.kind == FUNCTION and spec.x_range == state["spec"].x_range:
+                return  # only y moved: the samples still cover the view
+            state["spec"] = spec
+            submit(spec, keep_view=True)
+
+        def on_view_changed(_axes: object) -> None:
+            # Coalesce the bursts of changes a drag produces
+            if state["view_job"] is None:
+                state["view_job"] = win.after_idle(resample)
+
+        def read_spec() -> PlotSpec:
+            kind = kinds[kind_var.get()]
+            expressions = tuple(part for part in split_top_level(curves_var.get(), ";") if part)
+            if not expressions:
+                raise ValueError("Enter at least one curve")
+            bounds = {name: float(var.get()) for name, var in range_vars.items()}
+            x_range = (bounds["x min"], bounds["x max"])
+            y_range = (bounds["y min"], bounds["y max"])
+            t_range = (bounds["t min"], bounds["t max"])
+            checked = [x_range, t_range] + ([y_range] if kind == IMPLICIT else [])
+            if any(high <= low for low, high in checked):
+                raise ValueError("Each range needs max > min")
+            return PlotSpec(kind, expressions, x_range, y_range, t_range)
 
-        ttk.Button(frm, text="Plot", command=plot).grid(row=3, column=0, columnspan=2, pady=(6, 0))
+        def plot() -> None:
+            state["input_job"] = None
+            if state["closed"]:
+                return
+            try:
+                spec = read_spec()
+            except ValueError as ex:
+                status_label.configure(text=f"Error: {ex}")
+                return
+            submit(spec, keep_view=False)
+
+        def on_input_changed(*_args: object) -> None:
+            # Stop the render for the old inputs now; start the new one once typing pauses
+            cancel()
+            if state["input_job"] is not None:
+                win.after_cancel(state["input_job"])
+            state["input_job"] = win.after(400, plot)
+
+        def on_kind_changed(_event: object = None) -> None:
+            curves_var.set(examples[kinds[kind_var.get()]])
+            if kinds[kind_var.get()] == IMPLICIT:
+                for name, value in (("x min", "-3"), ("x max", "3"), ("y min", "-3"), ("y max", "3")):
+                    range_vars[name].set(value)
+
+        def close() -> None:
+            state["closed"] = True
+            cancel()
+            for job in (state["view_job"], state["input_job"]):
+                if job is not None:
+                    win.after_cancel(job)
+            executor.shutdown(wait=False, cancel_futures=True)
+            win.destroy()
+
+        kind_box.bind("<<ComboboxSelected>>", on_kind_changed)
+        for var in (curves_var, *range_vars.values()):
+            var.trace_add("write", on_input_changed)
+        ttk.Button(controls, text="Plot", command=plot).pack(side=tk.LEFT)
+        win.protocol("WM_DELETE_WINDOW", close)
         frm.columnconfigure(1, weight=1)
-        frm.rowconfigure(4, weight=1)
+        frm.rowconfigure(5, weight=1)
+        win.after_idle(plot)
 
     # ----------------------------- Misc -----------------------------------
     def _toggle_sounds(self) -> None:
         self.enable_sounds = not self.enable_sounds
 
+    def _set_numeric_mode(self) -> None:
+        mode = self._numeric_mode_var.get()
+        self.engine.set_numeric_mode(mode)
+        self._status(f"Number mode: {mode}")
+
     def _status(self, msg: str) -> None:
         self.title(f"Calculator — {msg}")
         try:
@@ -633,9 +879,9 @@ class CalculatorApp(tk.Tk):
         self.after(1500, lambda: (self.title("Calculator"), self.status_label.configure(text="Ready") if hasattr(self, "status_label") else None))
 
     def _save_session(self) -> None:
-        self.engine.save_session()
+        problem = self.engine.save_session()
         self._save_ui_prefs()
-        self._status("Session saved")
+        self._status(f"Session not fully saved: {problem}" if problem else "Session saved")
 
     def _show_about(self) -> None:
         messagebox.showinfo(
@@ -713,8 +959,11 @@ Double-click history: Reuse expression
         )
 
     def _clear_tape(self) -> None:
-        self.engine.history.clear()
-        self._refresh_tape()
+        self.engine.clear_history()
+        if self._tape_matches is not None:
+            self._tape_matches = []
+            self._tape_index_len = 0
+        self.tape_view.refresh(reset=True)
         self._status("History cleared")
 
     # ------------------------------- Tooltip ------------------------------
@@ -744,6 +993,139 @@ Double-click history: Reuse expression
         Tooltip(widget, tip)
 
 
+class VirtualList(ttk.Frame):
+    """
+    Listbox that materializes only the rows currently visible. Rows come from
+    callbacks (count, stable key, text), so the backing data can be large.
+    Re-rendering diffs row keys: scrolling or appending by a few rows only
+    inserts/deletes those rows. While scrolled to the bottom, the view
+    follows newly added rows, like a tape.
+    """
+
+    def __init__(
+        self,
+        master: tk.Widget,
+        row_count: Callable[[], int],
+        row_key: Callable[[int], Any],
+        row_text: Callable[[int], str],
+        **listbox_options: Any,
+    ) -> None:
+        super().__init__(master)
+        self._row_count = row_count
+        self._row_key = row_key
+        self._row_text = row_text
+        self.listbox = tk.Listbox(self, **listbox_options)
+        self.listbox.pack(side=tk.LEFT, fill=tk.BOTH, expand=True, padx=(6, 0))
+        self.scrollbar = ttk.Scrollbar(self, orient=tk.VERTICAL, command=self._on_scrollbar)
+        self.scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self._visible = int(listbox_options.get("height", 20))
+        self._top = 0
+        self._follow = True
+        self._keys: List[Any] = []  # keys of the rows currently in the listbox
+        self.listbox.bind("<Configure>", self._on_resize)
+        self.listbox.bind("<MouseWheel>", self._on_wheel)
+        self.listbox.bind("<Button-4>", lambda e: self._scroll(-3))
+        self.listbox.bind("<Button-5>", lambda e: self._scroll(3))
+
+    # ------------------------------ Public --------------------------------
+    def refresh(self, reset: bool = False) -> None:
+        """Re-render after the data changed; reset=True for a different data set."""
+        if reset:
+            self._keys = []
+            self.listbox.delete(0, tk.END)
+            self._follow = True
+        count = self._row_count()
+        if self._follow:
+            self._top = max(0, count - self._visible)
+        self._render(count)
+
+    def row_of(self, listbox_index: int) -> int:
+        """Data row shown at a listbox index."""
+        return self._top + listbox_index
+
+    # ----------------------------- Rendering ------------------------------
+    def _render(self, count: Optional[int] = None) -> None:
+        if count is None:
+            count = self._row_count()
+        self._top = max(0, min(self._top, count - self._visible))
+        end = min(count, self._top + self._visible)
+        keys = [self._row_key(row) for row in range(self._top, end)]
+        self._apply(keys)
+        self.listbox.yview_moveto(0)
+        if count:
+            self.scrollbar.set(self._top / count, end / count)
+        else:
+            self.scrollbar.set(0.0, 1.0)
+
+    def _apply(self, keys: List[Any]) -> None:
+        old = self._keys
+        if keys == old:
+            return
+        lb = self.listbox
+        top = self._top
+        if old and keys:
+            # Rows moved up (new rows at the bottom, old ones scrolled/evicted away)
+            shift = _index_or_none(old, keys[0])
+            if shift is not None and old[shift:] == keys[: len(old) - shift]:
+                if shift:
+                    lb.delete(0, shift - 1)
+                for row in range(len(old) - shift, len(keys)):
+                    lb.insert(tk.END, self._row_text(top + row))
+                self._keys = keys
+                return
+            # Rows moved down (scrolled towards older entries)
+            shift = _index_or_none(keys, old[0])
+            if shift and keys[shift:shift + len(old)] == old[: len(keys) - shift]:
+                for row in reversed(range(shift)):
+                    lb.insert(0, self._row_text(top + row))
+                if lb.size() > len(keys):
+                    lb.delete(len(keys), tk.END)
+                self._keys = keys
+                return
+        lb.delete(0, tk.END)
+        if keys:
+            lb.insert(tk.END, *[self._row_text(top + row) for row in range(len(keys))])
+        self._keys = keys
+
+    # ------------------------------ Events --------------------------------
+    def _scroll(self, rows: int) -> str:
+        count = self._row_count()
+        self._top = max(0, min(self._top + rows, count - self._visible))
+        self._follow = self._top >= count - self._visible
+        self._render(count)
+        return "break"
+
+    def _on_scrollbar(self, action: str, amount: str, unit: Optional[str] = None) -> None:
+        if action == "moveto":
+            count = self._row_count()
+            self._top = max(0, min(int(float(amount) * count), count - self._visible))
+            self._follow = self._top >= count - self._visible
+            self._render(count)
+        elif action == "scroll":
+            step = int(amount) * (self._visible if unit == "pages" else 1)
+            self._scroll(step)
+
+    def _on_wheel(self, event: tk.Event) -> str:  # type: ignore[valid-type]
+        return self._scroll(-3 if event.delta > 0 else 3)
+
+    def _on_resize(self, event: tk.Event) -> None:  # type: ignore[valid-type]
+        try:
+            line = tkfont.Font(font=self.listbox.cget("font")).metrics("linespace") + 1
+        except Exception:
+            line = 16
+        visible = max(1, event.height // line)
+        if visible != self._visible:
+            self._visible = visible
+            self.refresh()
+
+
+def _index_or_none(items: List[Any], value: Any) -> Optional[int]:
+    try:
+        return items.index(value)
+    except ValueError:
+        return None
+
+
 class Tooltip:
     def __init__(self, widget: tk.Widget, text: str) -> None:
         self.widget = widget
@@ -0,0 +1,245 @@
+import itertools
+import math
+from array import array
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple, Union, overload
+
+
+HistoryEntry = Tuple[str, str]  # (expression, result)
+
+
+def parse_result(text: str) -> complex:
+    """Numeric value of a formatted result string (nan when it is not a number)."""
+    try:
+        return complex(float(text), 0.0)
+    except (TypeError, ValueError):
+        pass
+    try:
+        return complex(text)
+    except (TypeError, ValueError):
+        return complex(math.nan, 0.0)
+
+
+class HistoryBuffer:
+    """
+    Fixed-capacity ring buffer of (expression, result) entries.
+
+    Appends are O(1) and overwrite the oldest entry once full; indexing
+    (including negative indices) is O(1). Alongside the strings, the numeric
+    value of each result is kept in two compact float arrays (real and
+    imaginary part) so callers never need to re-parse result text.
+    `total_appended` counts every entry ever added, which lets observers tell
+    how many entries are new since they last looked.
+    """
+
+    __slots__ = ("capacity", "_exprs", "_results", "_real", "_imag", "_start", "_size", "total_appended")
+
+    def __init__(self, capacity: int = 1000, entries: Iterable[HistoryEntry] = ()) -> None:
+        if capacity <= 0:
+            raise ValueError("History capacity must be positive")
+        self.capacity = int(capacity)
+        self._exprs: List[Optional[str]] = [None] * self.capacity
+        self._results: List[Optional[str]] = [None] * self.capacity
+        self._real = array("d", bytes(8 * self.capacity))
+        self._imag = array("d", bytes(8 * self.capacity))
+        self._start = 0
+        self._size = 0
+        self.total_appended = 0
+        self.extend(entries)
+
+    # ----------------------------- Mutation --------------------------------
+    def append(self, expr: str, result: str, value: Any = None) -> None:
+        if self._size < self.capacity:
+            slot = (self._start + self._size) % self.capacity
+            self._size += 1
+        else:
+            slot = self._start
+            self._start = (self._start + 1) % self.capacity
+        self._exprs[slot] = expr
+        self._results[slot] = result
+        number = parse_result(result) if value is None else _as_complex(value)
+        self._real[slot] = number.real
+        self._imag[slot] = number.imag
+        self.total_appended += 1
+
+    def extend(self, entries: Iterable[Union[HistoryEntry, Tuple[str, str, Any]]]) -> None:
+        for entry in entries:
+            self.append(*entry)
+
+    def clear(self) -> None:
+        for i in range(self.capacity):
+            self._exprs[i] = None
+            self._results[i] = None
+        self._start = 0
+        self._size = 0
+
+    # ------------------------------ Access ---------------------------------
+    def _slot(self, index: int) -> int:
+        if index < 0:
+            index += self._size
+        if not 0 <= index < self._size:
+            raise IndexError("history index out of range")
+        return (self._start + index) % self.capacity
+
+    @overload
+    def __getitem__(self, index: int) -> HistoryEntry: ...
+
+    @overload
+    def __getitem__(self, index: slice) -> List[HistoryEntry]: ...
+
+    def __getitem__(self, index: Union[int, slice]) -> Any:
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(self._size))]
+        slot = self._slot(index)
+        return self._exprs[slot], self._results[slot]  # type: ignore[return-value]
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __bool__(self) -> bool:
+        return self._size > 0
+
+    def __iter__(self) -> Iterator[HistoryEntry]:
+        for i in range(self._size):
+            slot = (self._start + i) % self.capacity
+            yield self._exprs[slot], self._results[slot]  # type: ignore[misc]
+
+    def value(self, index: int) -> Union[float, complex]:
+        """Numeric result of an entry: float, or complex when it has an imaginary part."""
+        slot = self._slot(index)
+        imag = self._imag[slot]
+        return complex(self._real[slot], imag) if imag else self._real[slot]
+
+    def tail(self, count: int) -> "HistoryView":
+        """The newest `count` entries as a view (no copying)."""
+        count = max(0, min(count, self._size))
+        return HistoryView(self, self._size - count, count)
+
+
+class HistoryView(Sequence[HistoryEntry]):
+    """Read-only window onto a HistoryBuffer; valid until the buffer changes."""
+
+    __slots__ = ("_buffer", "_offset", "_count")
+
+    def __init__(self, buffer: HistoryBuffer, offset: int, count: int) -> None:
+        self._buffer = buffer
+        self._offset = offset
+        self._count = count
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __getitem__(self, index: Any) -> Any:
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(self._count))]
+        if index < 0:
+            index += self._count
+        if not 0 <= index < self._count:
+            raise IndexError("history view index out of range")
+        return self._buffer[self._offset + index]
+
+    def __iter__(self) -> Iterator[HistoryEntry]:
+        for i in range(self._count):
+            yield self._buffer[self._offset + i]
+
+
+class HistoryIndex:
+    """
+    Incremental trigram index for substring search over history entries.
+
+    Every entry gets an increasing id; each distinct lowercase trigram of the
+    expression or result maps to a sorted array of ids. A query is answered
+    by walking the shortest posting list of its trigrams from newest to
+    oldest and confirming each candidate with a substring check, so cost
+    tracks the number of candidates rather than the history size. Queries
+    shorter than three characters fall back to a newest-first scan that
+    stops at `limit`. Matching is case-insensitive, like the tape filter.
+    """
+
+    __slots__ = ("_exprs", "_results", "_texts", "_postings")
+
+    def __init__(self, entries: Iterable[HistoryEntry] = ()) -> None:
+        self._exprs: List[str] = []
+        self._results: List[str] = []
+        # Lowercase "expression\nresult"; queries never contain a newline
+        self._texts: List[str] = []
+        self._postings: Dict[str, array] = {}
+        for expr, result in entries:
+            self.add(expr, result)
+
+    def add(self, expr: str, result: str) -> int:
+        entry_id = len(self._exprs)
+        expr_lower = expr.lower()
+        result_lower = result.lower()
+        self._exprs.append(expr)
+        self._results.append(result)
+        self._texts.append(f"{expr_lower}\n{result_lower}")
+        postings = self._postings
+        for gram in _trigrams(expr_lower) | _trigrams(result_lower):
+            ids = postings.get(gram)
+            if ids is None:
+                postings[gram] = array("I", (entry_id,))
+            else:
+                ids.append(entry_id)
+        return entry_id
+
+    def clear(self) -> None:
+        self._exprs.clear()
+        self._results.clear()
+        self._texts.clear()
+        self._postings.clear()
+
+    def __len__(self) -> int:
+        return len(self._exprs)
+
+    def entry(self, entry_id: int) -> HistoryEntry:
+        return self._exprs[entry_id], self._results[entry_id]
+
+    def search(self, query: str, limit: Optional[int] = None) -> List[int]:
+        """Ids of entries containing `query`, newest first, at most `limit` of them."""
+        q = (query or "").strip().lower()
+        if limit is not None and limit <= 0:
+            return []
+        if not q:
+            newest = len(self._exprs) - 1
+            stop = -1 if limit is None else max(-1, newest - limit)
+            return list(range(newest, stop, -1))
+        if len(q) < 3:
+            candidates: Iterable[int] = range(len(self._exprs) - 1, -1, -1)
+        else:
+            smallest = None
+            for gram in _trigrams(q):
+                ids = self._postings.get(gram)
+                if ids is None:
+                    return []
+                if smallest is None or len(ids) < len(smallest):
+                    smallest = ids
+            candidates = reversed(smallest)  # type: ignore[arg-type]
+        texts = self._texts
+        matches = (entry_id for entry_id in candidates if q in texts[entry_id])
+        return list(matches if limit is None else itertools.islice(matches, limit))
+
+    def refine(self, entry_ids: Iterable[int], query: str) -> List[int]:
+        """Subset of entry_ids that contain query; used to narrow earlier results."""
+        q = (query or "").strip().lower()
+        texts = self._texts
+        return [entry_id for entry_id in entry_ids if q in texts[entry_id]]
+
+
+def _trigrams(text: str) -> set:
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def _as_complex(value: Any) -> complex:
+    if getattr(value, "ndim", 0):
+        # Vectors and matrices have no single numeric value to index
+        return complex(math.nan, 0.0)
+    try:
+        return complex(value)
+    except OverflowError:
+        # Integers and exact values beyond float range
+        return complex(math.inf if value > 0 else -math.inf, 0.0)
+    except (TypeError, ValueError):
+        return complex(math.nan, 0.0)
+
+
+__all__ = ["HistoryBuffer", "HistoryEntry", "HistoryIndex", "HistoryView", "parse_result"]
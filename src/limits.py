@@ -0,0 +1,190 @@
+"""
+Resource budgets for a single evaluation.
+
+Python integers never overflow, so without limits an expression such as
+9**9**9 or factorial(10**6) keeps computing (and allocating) until the
+process gives up; OverflowError only covers floats. The checked operations
+here estimate the size of an integer result before computing it and refuse
+work over budget, and they check a wall-clock deadline as they go.
+
+The budget of the evaluation in progress is held in a context variable, so
+concurrent evaluations in threads or asyncio tasks each see their own.
+A pass over a data file (statistics on files) runs on a clock of its own,
+max_file_seconds: it is bounded by the file's size, and millions of values
+take longer than an evaluation is otherwise allowed.
+"""
+import math
+import sys
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar, Token
+from fractions import Fraction
+from typing import Any, Iterator, NamedTuple, Optional
+
+
+def _printable_bits() -> int:
+    """Bits of the largest integer Python will turn into text (sys.set_int_max_str_digits)."""
+    digits = getattr(sys, "get_int_max_str_digits", lambda: 0)()
+    # 0 means no limit
+    return int(digits * math.log2(10)) if digits else 1 << 20
+
+
+class Limits(NamedTuple):
+    """Per-evaluation budget; None disables a time limit."""
+
+    max_seconds: Optional[float] = 2.0
+    # Results have to be displayed: 4300 decimal digits under Python's default limit
+    max_int_bits: int = _printable_bits()
+    max_exponent: int = 100_000
+    # For each pass over a data file, not counted in max_seconds
+    max_file_seconds: Optional[float] = 60.0
+
+
+DEFAULT_LIMITS = Limits()
+# Used while folding constants at compile time: anything bigger is left to
+# run time, where the evaluating session's own limits apply
+FOLD_LIMITS = Limits(max_seconds=None, max_int_bits=min(1 << 16, DEFAULT_LIMITS.max_int_bits), max_exponent=1 << 16)
+
+
+class BudgetExceeded(ArithmeticError):
+    """An evaluation went over one of its limits."""
+
+
+class TimeLimitExceeded(BudgetExceeded):
+    pass
+
+
+class IntegerTooLarge(BudgetExceeded):
+    pass
+
+
+class ExponentTooLarge(BudgetExceeded):
+    pass
+
+
+class Budget:
+    """Limits plus the deadline of one running evaluation."""
+
+    __slots__ = ("limits", "deadline", "name")
+
+    def __init__(self, limits: Limits, name: str = "Time limit") -> None:
+        self.limits = limits
+        self.deadline = None if limits.max_seconds is None else time.monotonic() + limits.max_seconds
+        self.name = name
+
+    def check_deadline(self) -> None:
+        if self.deadline is not None and time.monotonic() > self.deadline:
+            raise TimeLimitExceeded(f"{self.name} exceeded ({self.limits.max_seconds:g} s)")
+
+    def check_bits(self, bits: float) -> None:
+        if bits > self.limits.max_int_bits:
+            raise IntegerTooLarge(f"Integer result too large (limit {self.limits.max_int_bits} bits)")
+        self.check_deadline()
+
+
+# Outside any evaluation (e.g. direct function calls) only size limits apply
+_active: ContextVar[Budget] = ContextVar("calculator_budget", default=Budget(Limits(max_seconds=None)))
+
+
+def activate(limits: Limits) -> Token:
+    """Start a budget for the current context; pass the token to deactivate()."""
+    return _active.set(Budget(limits))
+
+
+def deactivate(token: Token) -> None:
+    _active.reset(token)
+
+
+def current() -> Budget:
+    return _active.get()
+
+
+def check_deadline() -> None:
+    """For long-running loops (iterative solvers, user functions): raise once time is up."""
+    _active.get().check_deadline()
+
+
+@contextmanager
+def reading_file() -> Iterator[None]:
+    """
+    Run a pass over a data file on the max_file_seconds clock. The time it
+    takes is not charged to the evaluation, whose deadline moves back by as much.
+    """
+    outer = _active.get()
+    token = _active.set(Budget(outer.limits._replace(max_seconds=outer.limits.max_file_seconds), "Time limit for a file"))
+    start = time.monotonic()
+    try:
+        yield
+    finally:
+        _active.reset(token)
+        if outer.deadline is not None:
+            outer.deadline += time.monotonic() - start
+
+
+# ---------------------------- Checked operations ----------------------------
+def checked_pow(base: Any, exponent: Any) -> Any:
+    if type(base) is int and type(exponent) is int:
+        if exponent > 1 and not -1 <= base <= 1:
+            _check_power(math.log2(abs(base)), exponent)
+    elif type(base) is Fraction and _is_integral(exponent) and abs(exponent) > 1:
+        # Exact rationals grow like integers, in both directions
+        _check_power(_fraction_bits(base), abs(int(exponent)))
+    return base ** exponent
+
+
+def checked_mul(left: Any, right: Any) -> Any:
+    if type(left) is int and type(right) is int:
+        bits = left.bit_length() + right.bit_length()
+        if bits > 4096:
+            _active.get().check_bits(bits)
+    elif type(left) is Fraction or type(right) is Fraction:
+        bits = _fraction_bits(left) + _fraction_bits(right)
+        if bits > 4096:
+            _active.get().check_bits(bits)
+    return left * right
+
+
+def _check_power(base_bits: float, exponent: int) -> None:
+    budget = _active.get()
+    if exponent > budget.limits.max_exponent:
+        raise ExponentTooLarge(f"Exponent too large (limit {budget.limits.max_exponent})")
+    budget.check_bits(exponent * base_bits)
+
+
+def _is_integral(value: Any) -> bool:
+    return type(value) is int or (type(value) is Fraction and value.denominator == 1)
+
+
+def _fraction_bits(value: Any) -> int:
+    if type(value) is Fraction:
+        return max(value.numerator.bit_length(), value.denominator.bit_length())
+    if type(value) is int:
+        return value.bit_length()
+    return 0
+
+
+def check_factorial(n: int) -> None:
+    """Refuse factorials whose result would exceed the integer budget."""
+    if n > 20:
+        # log2(n!) via the log-gamma function, without computing n!
+        _active.get().check_bits(math.lgamma(n + 1) / math.log(2))
+
+
+__all__ = [
+    "DEFAULT_LIMITS",
+    "FOLD_LIMITS",
+    "Budget",
+    "BudgetExceeded",
+    "ExponentTooLarge",
+    "IntegerTooLarge",
+    "Limits",
+    "TimeLimitExceeded",
+    "activate",
+    "check_deadline",
+    "check_factorial",
+    "checked_mul",
+    "checked_pow",
+    "current",
+    "deactivate",
+    "reading_file",
+]
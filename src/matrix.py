@@ -0,0 +1,162 @@
+"""
+Matrix and vector support for expressions, backed by NumPy.
+
+Matrix literals ([[1, 2], [3, 4]] or [1, 2; 3, 4]) become float (or complex)
+NumPy arrays, so linear algebra runs in LAPACK/BLAS rather than Python loops.
+The functions below pass arrays straight through without copying where NumPy
+allows it (transpose returns a view), and solve() factorizes once instead of
+forming an inverse. Arithmetic operators act elementwise as in NumPy; use
+matmul() or the @ operator for the matrix product.
+"""
+import re
+import sys
+from typing import Any, Callable, Dict, List
+
+try:
+    import numpy as np  # type: ignore
+except Exception:
+    np = None  # type: ignore
+
+
+_ROW_BREAK = re.compile(r",\s*\n\s*")
+
+
+def _require_numpy() -> None:
+    if np is None:
+        raise ValueError("Matrices need NumPy (pip install numpy)")
+
+
+def is_matrix(value: Any) -> bool:
+    """True for array results (vectors and matrices), False for scalars."""
+    return np is not None and isinstance(value, np.ndarray)
+
+
+def make_array(data: List[Any]) -> Any:
+    """Array from a (nested) list of numbers, as float64 or complex128."""
+    _require_numpy()
+    try:
+        array = np.array(data)
+    except ValueError:
+        raise ValueError("Matrix rows must all have the same length") from None
+    if array.dtype.kind not in "fc":
+        # Integers would overflow in products; Decimal/Fraction (object) become floats
+        try:
+            array = array.astype(float)
+        except TypeError:
+            array = array.astype(complex)
+    return array
+
+
+def constant_array(data: List[Any]) -> Any:
+    """make_array() for literals shared between evaluations; read-only."""
+    array = make_array(data)
+    array.setflags(write=False)
+    return array
+
+
+def _as_array(value: Any, name: str, ndim: int = 0) -> Any:
+    _require_numpy()
+    if not is_matrix(value):
+        raise ValueError(f"{name} expects a matrix")
+    if ndim and value.ndim != ndim:
+        raise ValueError(f"{name} expects a {'vector' if ndim == 1 else 'matrix'}")
+    return value
+
+
+def _square(value: Any, name: str) -> Any:
+    array = _as_array(value, name, 2)
+    if array.shape[0] != array.shape[1]:
+        raise ValueError(f"{name} needs a square matrix (got {array.shape[0]}x{array.shape[1]})")
+    return array
+
+
+def det(a: Any) -> Any:
+    result = np.linalg.det(_square(a, "det"))
+    return complex(result) if np.iscomplexobj(result) else float(result)
+
+
+def inv(a: Any) -> Any:
+    try:
+        return np.linalg.inv(_square(a, "inv"))
+    except np.linalg.LinAlgError:
+        raise ValueError("Matrix is singular") from None
+
+
+def transpose(a: Any) -> Any:
+    # A view: no data is copied until something writes to it
+    return _as_array(a, "transpose").T
+
+
+def matmul(a: Any, b: Any) -> Any:
+    try:
+        result = np.matmul(_as_array(a, "matmul"), _as_array(b, "matmul"))
+    except ValueError:
+        raise ValueError(f"Matrix shapes do not match: {_shape(a)} and {_shape(b)}") from None
+    # Vector·vector gives a NumPy scalar; report it as a plain number
+    return result.item() if result.ndim == 0 else result
+
+
+def solve(a: Any, b: Any) -> Any:
+    """x with a @ x = b, via LU factorization (LAPACK gesv)."""
+    a = _square(a, "solve")
+    b = _as_array(b, "solve")
+    if b.shape[0] != a.shape[0]:
+        raise ValueError(f"Matrix shapes do not match: {_shape(a)} and {_shape(b)}")
+    try:
+        return np.linalg.solve(a, b)
+    except np.linalg.LinAlgError:
+        raise ValueError("Matrix is singular") from None
+
+
+def where(condition: Any, then: Any, otherwise: Any) -> Any:
+    """Elementwise choice, for if(...) over arrays."""
+    return np.where(condition, then, otherwise)
+
+
+def format_matrix(value: Any, format_scalar: Callable[[Any], str]) -> str:
+    """
+    One-line text in literal syntax, e.g. "[[1, 2], [3, 4]]", so results can
+    be pasted back into expressions. Large arrays are summarized with "...".
+    """
+    text = np.array2string(
+        value,
+        separator=", ",
+        max_line_width=sys.maxsize,
+        threshold=100,
+        edgeitems=3,
+        formatter={
+            "float_kind": lambda v: format_scalar(float(v)),
+            "complex_kind": lambda v: format_scalar(complex(v)),
+        },
+    )
+    # NumPy breaks lines between rows whatever the width
+    return _ROW_BREAK.sub(", ", text)
+
+
+def _shape(value: Any) -> str:
+    return "x".join(str(n) for n in getattr(value, "shape", ())) or "scalar"
+
+
+# Names added to the calculator's base namespace
+MATRIX_FUNCTIONS: Dict[str, Any] = {
+    "det": det,
+    "inv": inv,
+    "transpose": transpose,
+    "matmul": matmul,
+    "solve": solve,
+}
+
+
+__all__ = [
+    "MATRIX_FUNCTIONS",
+    "constant_array",
+    "det",
+    "format_matrix",
+    "inv",
+    "is_matrix",
+    "make_array",
+    "matmul",
+    "solve",
+    "transpose",
+    "where",
+]
@@ -0,0 +1,466 @@
+"""
+Numeric backends: how literals are read, which functions and constants an
+expression sees, and how results are normalized, formatted and stored.
+
+- FloatBackend (default): int/float/complex, the fast path.
+- DecimalBackend: decimal.Decimal at a configurable precision, so
+  0.1 + 0.2 is exactly 0.3 and rounding is decimal (round(2.675, 2) = 2.68).
+- FractionBackend: exact rationals; 1/3 stays 1/3 and 1/3*3 is exactly 1.
+
+Functions without an exact counterpart in a mode fall back to float: inverse
+trig and logs in fraction mode, square roots that are not perfect squares,
+and inverse trig in decimal mode (converted back to Decimal). Complex
+numbers are only available in float mode.
+"""
+import math
+import numbers
+from contextlib import nullcontext
+from decimal import Context, Decimal, InvalidOperation, localcontext
+from fractions import Fraction
+from typing import Any, Callable, ContextManager, Dict, Hashable, Mapping, Optional, Union
+
+from limits import check_factorial
+from matrix import format_matrix, is_matrix, make_array
+
+
+MODES = ("float", "decimal", "fraction")
+DEFAULT_PRECISION = 28
+
+# Exact conversion factor: (from, to[, date]) -> ratio (EngineCore.exact_unit_factor)
+UnitFactor = Callable[..., Fraction]
+
+
+class NumericBackend:
+    """Base class; subclasses describe one number representation."""
+
+    name = "float"
+
+    @property
+    def key(self) -> Hashable:
+        """Identifies compiled programs and namespaces built for this backend."""
+        return self.name
+
+    def literal(self, text: str) -> Any:
+        """Value of a numeric literal token (e.g. "0.1", "2e3", "3j")."""
+        raise NotImplementedError
+
+    def functions(self, unit_factor: UnitFactor) -> Dict[str, Any]:
+        """Overrides for the base namespace (functions and constants)."""
+        return {}
+
+    def constants(self) -> Dict[str, Any]:
+        """Names the optimizer may fold at compile time."""
+        return {"pi": math.pi, "e": math.e}
+
+    def coerce(self, value: Any) -> Any:
+        """Normalize a result to this backend's types; raises for non-numbers."""
+        raise NotImplementedError
+
+    def from_ratio(self, value: Fraction) -> Any:
+        """An exact ratio such as a unit factor, as a number of this mode."""
+        return float(value)
+
+    def format(self, value: Any) -> str:
+        return format_float(value)
+
+    def context(self) -> ContextManager[Any]:
+        """Arithmetic context for compiling and evaluating in this mode."""
+        return nullcontext()
+
+    def evaluate(self, program: Any, local_names: Mapping[str, Any], global_names: Mapping[str, Any], budget: Any) -> Any:
+        with self.context():
+            return program.evaluate(local_names, global_names, budget)
+
+    def describe(self) -> Dict[str, Any]:
+        """JSON-friendly settings, the inverse of backend_from_settings()."""
+        return {"mode": self.name}
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}()"
+
+
+# ------------------------------- Float -------------------------------------
+def format_float(value: Any) -> str:
+    """Result text in float mode (also used for float fallbacks in other modes)."""
+    if isinstance(value, complex):
+        # Normalize very small parts to zero for readability
+        real = 0.0 if abs(value.real) < 1e-12 else value.real
+        imag = 0.0 if abs(value.imag) < 1e-12 else value.imag
+        return str(complex(real, imag))
+    if is_matrix(value):
+        return format_matrix(value, format_float)
+    if isinstance(value, float):
+        # %g already drops trailing zeros (stripping "0" by hand broke exponents like 1e+20)
+        return "%.15g" % value if value != int(value) else str(int(value))
+    return str(value)
+
+
+class FloatBackend(NumericBackend):
+    name = "float"
+
+    def literal(self, text: str) -> Any:
+        if text[-1] in "jJ":
+            return complex(0, float(text[:-1]))
+        if "." in text or "e" in text or "E" in text:
+            return float(text)
+        return int(text)
+
+    def coerce(self, value: Any) -> Any:
+        if isinstance(value, (int, float, complex)):
+            return value
+        if isinstance(value, (Decimal, Fraction)):
+            return float(value)
+        return _coerce_other(value)
+
+    def evaluate(self, program: Any, local_names: Mapping[str, Any], global_names: Mapping[str, Any], budget: Any) -> Any:
+        # No arithmetic context to enter
+        return program.evaluate(local_names, global_names, budget)
+
+
+FLOAT = FloatBackend()
+
+
+_NO_COMPLEX = "math domain error (complex numbers are only available in float mode)"
+
+
+def _reject(value: Any) -> None:
+    # Exact modes have no complex numbers (3i is refused as a literal too)
+    if isinstance(value, complex):
+        raise ValueError(_NO_COMPLEX)
+    raise ValueError("Unsupported result type")
+
+
+def _coerce_other(value: Any) -> Any:
+    # Vectors and matrices (matrix.py) are float/complex arrays in every mode
+    if is_matrix(value):
+        return value
+    raise ValueError("Unsupported result type")
+
+
+# ------------------------------ Decimal ------------------------------------
+class DecimalBackend(NumericBackend):
+    name = "decimal"
+
+    def __init__(self, precision: int = DEFAULT_PRECISION) -> None:
+        precision = int(precision)
+        if precision < 1:
+            raise ValueError("Decimal precision must be at least 1")
+        self.precision = precision
+        self.decimal_context = Context(prec=precision)
+        # Guard digits for the series below, rounded off at the end
+        self._work = Context(prec=precision + 10)
+        with localcontext(self._work):
+            self._pi = _decimal_pi()
+            self._e = Decimal(1).exp()
+        self._pi_over_180 = self._work.divide(self._pi, 180)
+
+    @property
+    def key(self) -> Hashable:
+        return (self.name, self.precision)
+
+    def literal(self, text: str) -> Any:
+        if text[-1] in "jJ":
+            raise ValueError("Complex numbers are only available in float mode")
+        # Exact: the literal's digits, not the nearest binary float
+        return Decimal(text)
+
+    def constants(self) -> Dict[str, Any]:
+        round_to_precision = self.decimal_context.plus
+        return {"pi": round_to_precision(self._pi), "e": round_to_precision(self._e)}
+
+    def functions(self, unit_factor: UnitFactor) -> Dict[str, Any]:
+        def convert(value: Any, from_unit: str, to_unit: str, when: Any = None) -> Decimal:
+            return self.coerce(value) * self.from_ratio(unit_factor(from_unit, to_unit, when))
+
+        names: Dict[str, Any] = self.constants()
+        names.update(
+            {
+                "sin": self._sin_deg,
+                "cos": self._cos_deg,
+                "tan": self._tan_deg,
+                "asin": self._via_float(math.asin, degrees=True),
+                "acos": self._via_float(math.acos, degrees=True),
+                "atan": self._via_float(math.atan, degrees=True),
+                "ln": self._ln,
+                "log": self._log10,
+                "sqrt": self._sqrt,
+                "factorial": _exact_factorial,
+                "rad": lambda x: self.coerce(x) * self._pi_over_180,
+                "deg": lambda x: self.coerce(x) / self._pi_over_180,
+                "round": _round_places,
+                "convert": convert,
+            }
+        )
+        return names
+
+    def coerce(self, value: Any) -> Any:
+        if isinstance(value, Decimal):
+            if not value.is_finite():
+                # Overflow is trapped by the context; an infinity is 0 to a negative power
+                if value.is_infinite():
+                    raise ZeroDivisionError("Division by zero")
+                raise InvalidOperation("Invalid operation")
+            return value
+        if isinstance(value, (bool, complex)):
+            _reject(value)
+        if isinstance(value, int):
+            return Decimal(value)
+        if isinstance(value, float):
+            return _decimal_from_float(value)
+        if isinstance(value, Fraction):
+            return Decimal(value.numerator) / Decimal(value.denominator)
+        return _coerce_other(value)
+
+    def from_ratio(self, value: Fraction) -> Any:
+        return Decimal(value.numerator) / Decimal(value.denominator)
+
+    def format(self, value: Any) -> str:
+        if not isinstance(value, Decimal):
+            return format_float(value)
+        if not value.is_finite():
+            return str(value)
+        value = value.normalize(self.decimal_context)
+        if -self.precision < value.adjusted() < self.precision:
+            return format(value, "f")
+        return str(value)
+
+    def context(self) -> ContextManager[Any]:
+        return localcontext(self.decimal_context)
+
+    def describe(self) -> Dict[str, Any]:
+        return {"mode": self.name, "precision": self.precision}
+
+    def __repr__(self) -> str:
+        return f"DecimalBackend(precision={self.precision})"
+
+    # Scientific functions; degrees in and out like float mode
+    def _sine_argument(self, degrees: Decimal) -> Decimal:
+        # Reduce to [-90, 90] degrees (exactly, in decimal) so the series
+        # converges in a few terms even at high precision
+        d = degrees % 360
+        if d > 180:
+            d -= 360
+        elif d < -180:
+            d += 360
+        if d > 90:
+            d = 180 - d
+        elif d < -90:
+            d = -180 - d
+        return d * self._pi_over_180
+
+    def _sin_deg(self, x: Any) -> Decimal:
+        with localcontext(self._work):
+            result = _decimal_sin(self._sine_argument(self.coerce(x)))
+        return +result
+
+    def _cos_deg(self, x: Any) -> Decimal:
+        with localcontext(self._work):
+            result = _decimal_sin(self._sine_argument(self.coerce(x) + 90))
+        return +result
+
+    def _tan_deg(self, x: Any) -> Decimal:
+        with localcontext(self._work):
+            x = self.coerce(x)
+            result = _decimal_sin(self._sine_argument(x)) / _decimal_sin(self._sine_argument(x + 90))
+        return +result
+
+    def _ln(self, x: Any) -> Decimal:
+        x = self.coerce(x)
+        if x <= 0:
+            raise ValueError("math domain error")
+        return x.ln()
+
+    def _log10(self, x: Any) -> Decimal:
+        x = self.coerce(x)
+        if x <= 0:
+            raise ValueError("math domain error")
+        return x.log10()
+
+    def _sqrt(self, x: Any) -> Any:
+        x = self.coerce(x)
+        if x < 0:
+            raise ValueError(_NO_COMPLEX)
+        return x.sqrt()
+
+    def _via_float(self, func: Callable[[float], float], degrees: bool = False) -> Callable[[Any], Decimal]:
+        def call(x: Any) -> Decimal:
+            result = func(float(x))
+            # Only ~15 digits are meaningful; don't pass binary noise off as decimal digits
+            return Decimal("%.15g" % (math.degrees(result) if degrees else result))
+
+        return call
+
+
+def _decimal_from_float(value: float) -> Decimal:
+    # repr() is the shortest text that round-trips, e.g. 0.1 -> Decimal("0.1")
+    return Decimal(repr(value))
+
+
+def _decimal_pi() -> Decimal:
+    """pi to the current precision (series from the decimal module documentation)."""
+    three = Decimal(3)
+    lasts, t, s, n, na, d, da = 0, three, 3, 1, 0, 0, 24
+    while s != lasts:
+        lasts = s
+        n, na = n + na, na + 8
+        d, da = d + da, da + 32
+        t = (t * n) / d
+        s += t
+    return +s
+
+
+def _decimal_sin(x: Decimal) -> Decimal:
+    """Taylor series; each term is derived from the previous one, so no factorials."""
+    x2 = -x * x
+    i, lasts, s, term = 1, 0, x, x
+    while s != lasts:
+        lasts = s
+        i += 2
+        term = term * x2 / (i * (i - 1))
+        s += term
+    return s
+
+
+# ------------------------------ Fraction -----------------------------------
+class FractionBackend(NumericBackend):
+    name = "fraction"
+
+    def literal(self, text: str) -> Any:
+        if text[-1] in "jJ":
+            raise ValueError("Complex numbers are only available in float mode")
+        return Fraction(text)
+
+    def functions(self, unit_factor: UnitFactor) -> Dict[str, Any]:
+        def convert(value: Any, from_unit: str, to_unit: str, when: Any = None) -> Any:
+            return value * unit_factor(from_unit, to_unit, when)
+
+        return {
+            "sqrt": _fraction_sqrt,
+            "factorial": _exact_factorial,
+            "round": _round_places,
+            "convert": convert,
+        }
+
+    def coerce(self, value: Any) -> Any:
+        if isinstance(value, (Fraction, float)):
+            # Floats come from inexact functions (trig, logs); keep them visibly approximate
+            return value
+        if isinstance(value, (bool, complex)):
+            _reject(value)
+        if isinstance(value, int):
+            return Fraction(value)
+        if isinstance(value, Decimal):
+            return Fraction(value)
+        return _coerce_other(value)
+
+    def from_ratio(self, value: Fraction) -> Any:
+        return value
+
+    def format(self, value: Any) -> str:
+        if isinstance(value, Fraction):
+            return str(value)
+        return format_float(value)
+
+
+def _fraction_sqrt(x: Any) -> Any:
+    if isinstance(x, (int, Fraction)) and x >= 0:
+        x = Fraction(x)
+        num, den = math.isqrt(x.numerator), math.isqrt(x.denominator)
+        if num * num == x.numerator and den * den == x.denominator:
+            return Fraction(num, den)
+    if x < 0:
+        raise ValueError(_NO_COMPLEX)
+    return math.sqrt(float(x))
+
+
+# ------------------------------- Shared ------------------------------------
+def _exact_factorial(n: Any) -> int:
+    if n != int(n) or n < 0:
+        raise ValueError("factorial() only defined for non-negative integers")
+    check_factorial(int(n))
+    return math.factorial(int(n))
+
+
+def _round_places(x: Any, ndigits: Any = 0) -> Any:
+    # round() wants an int for the number of places, literals are Decimal/Fraction here
+    return round(x, int(ndigits))
+
+
+def backend_for(mode: str, precision: Optional[int] = None) -> NumericBackend:
+    """Backend by name: "float", "decimal" (with precision) or "fraction"."""
+    mode = str(mode).lower()
+    if mode == "float":
+        return FLOAT
+    if mode == "decimal":
+        return DecimalBackend(DEFAULT_PRECISION if precision is None else precision)
+    if mode == "fraction":
+        return FractionBackend()
+    raise ValueError(f"Unknown numeric mode '{mode}' (choose from {', '.join(MODES)})")
+
+
+def backend_from_settings(settings: Any) -> NumericBackend:
+    if not isinstance(settings, dict):
+        return FLOAT
+    return backend_for(settings.get("mode", "float"), settings.get("precision"))
+
+
+# ---------------------------- Serialization --------------------------------
+def serialize_number(value: Any) -> Union[int, float, Dict[str, Any]]:
+    if is_matrix(value):
+        if value.dtype.kind == "c":
+            return {"matrix": value.real.tolist(), "imag": value.imag.tolist()}
+        return {"matrix": value.tolist()}
+    if isinstance(value, complex):
+        return {"real": value.real, "imag": value.imag}
+    if isinstance(value, Decimal):
+        return {"decimal": str(value)}
+    if isinstance(value, Fraction):
+        return {"fraction": str(value)}
+    if isinstance(value, numbers.Integral) and not isinstance(value, bool):
+        # Exact: a float would round past 2^53 and overflow past 2^1024
+        value = int(value)
+        return value if abs(value) <= 2**53 else {"int": str(value)}
+    return float(value)
+
+
+def deserialize_number(value: Any) -> Any:
+    if isinstance(value, dict):
+        if "real" in value and "imag" in value:
+            return complex(value["real"], value["imag"])
+        if "decimal" in value:
+            return Decimal(str(value["decimal"]))
+        if "fraction" in value:
+            return Fraction(str(value["fraction"]))
+        if "int" in value:
+            return int(str(value["int"]))
+        if "matrix" in value:
+            try:
+                array = make_array(value["matrix"])
+                if "imag" in value:
+                    array = array + 1j * make_array(value["imag"])
+                return array
+            except ValueError:
+                # Saved with NumPy, loaded without it
+                return 0.0
+    if isinstance(value, int) and not isinstance(value, bool):
+        return value
+    try:
+        return float(value) if value is not None else 0.0
+    except Exception:
+        return 0.0
+
+
+__all__ = [
+    "DEFAULT_PRECISION",
+    "FLOAT",
+    "MODES",
+    "DecimalBackend",
+    "FloatBackend",
+    "FractionBackend",
+    "NumericBackend",
+    "backend_for",
+    "backend_from_settings",
+    "deserialize_number",
+    "format_float",
+    "serialize_number",
+]
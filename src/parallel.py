@@ -0,0 +1,270 @@
+"""
+Multi-process batch evaluation.
+
+ParallelEvaluator shards a stream of expressions into chunks and evaluates
+them on a pool of worker processes. Each worker builds one CalculatorEngine
+when it starts (same user functions, memory and ANS as the parent) and
+reuses it, compile cache included, for every chunk it receives. Results are
+yielded in input order, and at most `max_pending` chunks are in flight at a
+time, so memory stays bounded however long the input is.
+
+Chunks are evaluated independently: ANS is fixed for the whole run, just like
+evaluate_many() without record_history. Inputs where each line depends on the
+previous answer must use the serial path. Definitions ("g(x) = x*10") in the
+input do carry over: the pool appends them to a temporary file as the input
+is read, each chunk is sent with how many came before it, and a worker reads
+and applies those it has not seen before evaluating. Neither the parent nor
+the chunks hold on to the definitions, however many there are.
+"""
+import itertools
+import json
+import os
+import pickle
+import tempfile
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import IO, Any, Deque, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from calculator import ERR_OK, BatchResult, CalculatorEngine, EngineCore, UserFunction
+from expression import ParseError, parse_definition
+from numeric import backend_from_settings
+
+
+# Engine owned by the current worker process (set by _init_worker)
+_worker_engine: Optional[CalculatorEngine] = None
+# Definitions file of the pool that engine has read: (path, definitions applied, offset)
+_worker_log: Tuple[Optional[str], int, int] = (None, 0, 0)
+
+
+def chunked(items: Iterable[Any], size: int) -> Iterator[List[Any]]:
+    """Split an iterable into lists of at most `size` items."""
+    it = iter(items)
+    while True:
+        chunk = list(itertools.islice(it, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def engine_state(engine: CalculatorEngine) -> Dict[str, Any]:
+    """The parts of an engine's state that workers need to reproduce its results."""
+    return {
+        # Definitions travel as source (compiled code does not pickle); Python callables as themselves
+        "user_functions": {name: f for name, f in engine.user_functions.items() if not isinstance(f, UserFunction)},
+        "definitions": engine.function_definitions(),
+        "memory_value": engine.memory_value,
+        "last_answer": engine.last_answer,
+        "limits": engine.limits,
+        "numeric": engine.numeric_backend.describe(),
+        "rates_path": engine.core.rates_path,
+    }
+
+
+def _init_worker(state: Dict[str, Any]) -> None:
+    global _worker_engine
+    engine = CalculatorEngine(load_session=False, core=EngineCore(rates_path=state.get("rates_path")))
+    if state.get("numeric"):
+        # Before memory and ANS, which the mode switch would otherwise convert
+        engine.numeric_backend = backend_from_settings(state["numeric"])
+    engine.user_functions = state.get("user_functions") or {}
+    for source in state.get("definitions", ()):
+        engine.define_function(source)
+    engine.memory_value = state.get("memory_value", 0.0)
+    engine.last_answer = state.get("last_answer", 0)
+    if state.get("limits") is not None:
+        engine.limits = state["limits"]
+    _worker_engine = engine
+
+
+def _evaluate_chunk(
+    expressions: List[str], as_strings: bool, definitions: Optional[Tuple[str, int]] = None
+) -> BatchResult:
+    assert _worker_engine is not None, "worker was not initialized"
+    if definitions is not None:
+        _apply_definitions(*definitions)
+    return _worker_engine.evaluate_many(expressions, as_strings=as_strings)
+
+
+def _apply_definitions(path: str, count: int) -> None:
+    """
+    Replay, in input order, the first `count` definitions of the file at
+    `path`, skipping those this worker has applied already. Ones it met in
+    its own chunks are replayed too, which leaves the same state.
+    """
+    global _worker_log
+    assert _worker_engine is not None, "worker was not initialized"
+    seen_path, seen, offset = _worker_log
+    if seen_path != path:
+        # A worker serves one pool, so this is its first file
+        seen, offset = 0, 0
+    if seen >= count:
+        return
+    with open(path, "r", encoding="utf-8") as log:
+        log.seek(offset)
+        while seen < count:
+            source = json.loads(log.readline())
+            seen += 1
+            try:
+                _worker_engine.define_function(source)
+            except Exception:
+                pass  # Already reported where the definition appeared
+        offset = log.tell()
+    _worker_log = (path, seen, offset)
+
+
+def _is_definition(text: str) -> bool:
+    if "=" not in text:
+        return False
+    try:
+        return parse_definition(text) is not None
+    except ParseError:
+        return False  # A broken definition defines nothing
+
+
+def create_worker_pool(jobs: Optional[int] = None, engine: Optional[CalculatorEngine] = None) -> ProcessPoolExecutor:
+    """Process pool whose workers each hold a warm engine (copying `engine`'s state if given)."""
+    state = engine_state(engine) if engine is not None else {}
+    try:
+        pickle.dumps(state)
+    except Exception as ex:
+        raise ValueError(f"Engine state cannot be sent to worker processes: {ex}") from ex
+    return ProcessPoolExecutor(max_workers=jobs, initializer=_init_worker, initargs=(state,))
+
+
+# Session evaluate_isolated last built for a caller's functions, mode and limits
+_isolated: Optional[Tuple[Tuple[Any, ...], CalculatorEngine]] = None
+
+
+def _isolated_engine(definitions: Iterable[str], numeric: Optional[Dict[str, Any]], limits: Any) -> CalculatorEngine:
+    global _isolated
+    assert _worker_engine is not None, "worker was not initialized"
+    key = (tuple(definitions), tuple(sorted(numeric.items())) if numeric else None, limits)
+    if key == ((), None, None):
+        # Nothing from the caller: the engine the pool was created with
+        return _worker_engine
+    if _isolated is None or _isolated[0] != key:
+        # Rebuilt only when the caller's state changes, on the worker's warm core
+        engine = _worker_engine.core.session()
+        if numeric:
+            engine.numeric_backend = backend_from_settings(numeric)
+        for source in key[0]:
+            engine.define_function(source)
+        if limits is not None:
+            engine.limits = limits
+        _isolated = (key, engine)
+    return _isolated[1]
+
+
+def evaluate_isolated(
+    expression: str,
+    last_answer: Any = 0,
+    memory_value: Any = 0,
+    definitions: Iterable[str] = (),
+    numeric: Optional[Dict[str, Any]] = None,
+    limits: Any = None,
+) -> Tuple[Any, int, str]:
+    """
+    Evaluate one expression in a pool worker with the caller's ANS and memory,
+    and, when given, its function definitions (function_definitions()),
+    number mode (numeric_backend.describe()) and limits. Returns (value,
+    error code, text), where text is the formatted result or the error
+    message and value is None on error.
+    """
+    engine = _isolated_engine(definitions, numeric, limits)
+    engine.last_answer = last_answer
+    engine.memory_value = memory_value
+    try:
+        value = engine.compute(expression)
+    except Exception as ex:
+        # Report this failure; evaluating again could cost a whole time limit more
+        error, message = engine.describe_error(ex)
+        return None, error, message
+    return value, ERR_OK, engine.record_result(expression, value)
+
+
+class ParallelEvaluator:
+    """
+    Ordered, bounded parallel evaluation over a process pool.
+
+    Use as a context manager:
+
+        with ParallelEvaluator(jobs=4, engine=engine) as pool:
+            for chunk, batch in pool.map_chunks(chunked(lines, 1024)):
+                ...
+
+    User functions must be picklable (module-level functions, not lambdas),
+    since they are sent to every worker.
+    """
+
+    def __init__(
+        self,
+        jobs: Optional[int] = None,
+        *,
+        engine: Optional[CalculatorEngine] = None,
+        max_pending: Optional[int] = None,
+    ) -> None:
+        self.jobs = max(1, jobs or os.cpu_count() or 1)
+        # Enough queued work to keep every worker busy while results drain
+        self.max_pending = max(1, max_pending or 2 * self.jobs)
+        self._pool = create_worker_pool(self.jobs, engine)
+        # Definitions met in the input so far (over every run), one JSON string per line
+        self._log: Optional[IO[str]] = None
+        self._log_path = ""
+        self._definitions = 0
+
+    def __enter__(self) -> "ParallelEvaluator":
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self._pool.shutdown(wait=True, cancel_futures=True)
+        if self._log is not None:
+            self._log.close()
+            self._log = None
+            os.remove(self._log_path)
+
+    def map_chunks(
+        self, chunks: Iterable[List[str]], *, as_strings: bool = False
+    ) -> Iterator[Tuple[List[str], BatchResult]]:
+        """Yield (chunk, BatchResult) pairs in input order."""
+        pending: Deque[Tuple[List[str], Future]] = deque()
+        try:
+            for chunk in chunks:
+                if len(pending) >= self.max_pending:
+                    done_chunk, future = pending.popleft()
+                    yield done_chunk, future.result()
+                definitions = (self._log_path, self._definitions) if self._log is not None else None
+                pending.append((chunk, self._pool.submit(_evaluate_chunk, chunk, as_strings, definitions)))
+                found = [text for text in chunk if _is_definition(text)]
+                if found:
+                    self._log_definitions(found)
+            while pending:
+                done_chunk, future = pending.popleft()
+                yield done_chunk, future.result()
+        finally:
+            # Consumer stopped early: drop work that has not started yet
+            for _, future in pending:
+                future.cancel()
+
+    def _log_definitions(self, found: List[str]) -> None:
+        if self._log is None:
+            handle, self._log_path = tempfile.mkstemp(prefix="calculator-", suffix=".jsonl")
+            self._log = open(handle, "w", encoding="utf-8")
+        self._log.writelines(json.dumps(text) + "\n" for text in found)
+        # Written out before any later chunk is submitted
+        self._log.flush()
+        self._definitions += len(found)
+
+    def evaluate_many(self, expressions: Iterable[str], *, as_strings: bool = False, chunk_size: int = 1024) -> BatchResult:
+        """Parallel counterpart of CalculatorEngine.evaluate_many (without history recording)."""
+        values: List[Any] = []
+        errors: List[int] = []
+        for _, batch in self.map_chunks(chunked(expressions, chunk_size), as_strings=as_strings):
+            values.extend(batch.values)
+            errors.extend(batch.errors)
+        return BatchResult(values, errors)
+
+
+__all__ = ["ParallelEvaluator", "chunked", "create_worker_pool", "engine_state", "evaluate_isolated"]
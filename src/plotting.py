@@ -0,0 +1,622 @@
+"""
+Adaptive, cached sampling of functions for the graph window.
+
+Instead of a fixed grid, each interval is sampled coarsely and then refined
+where the curve bends or breaks: a segment is split while its midpoint is
+off the chord by more than a small fraction of the local value range, or
+while it straddles the edge of the function's domain. Jumps that stay
+unresolved at the finest level (poles, steps) become gaps instead of
+vertical lines.
+
+Sampling works on tiles: the x axis is cut into power-of-two widths chosen
+from the visible range, and each (expression, tile) is sampled once and kept
+in an LRU cache. Panning only samples the tiles that come into view, and
+zooming back to a previous scale is free. Before drawing, points are
+decimated to the pixel width of the plot, keeping each pixel column's first,
+last, lowest and highest point, so the picture is unchanged but matplotlib
+draws a few thousand points rather than every sample.
+
+Besides y = f(x), render() draws parametric curves (x(t), y(t)), polar
+curves r(t) and implicit curves F(x, y) = 0. Parametric and polar curves are
+refined the same way in t; implicit curves are traced by marching squares on
+a coarse grid, with only the cells the curve passes through evaluated again
+at a finer resolution. Every sampler takes a `check` callable, run between
+rounds, that raises Cancelled when a newer render has superseded it.
+"""
+import math
+import sys
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, List, NamedTuple, Optional, Set, Tuple
+
+try:
+    import numpy as np  # type: ignore
+except Exception:
+    np = None  # type: ignore
+
+from expression import ParseError, names_in, parse, tokenize
+from userfunc import UserFunction
+
+# Samples per tile before refinement (2^n + 1, so refinement keeps the grid nested)
+TILE_SAMPLES = 65
+# The visible range spans between this many and twice this many tiles
+TILES_PER_VIEW = 8
+# Largest |x| for y = f(x): tile edges and midpoints stay within the float range
+X_LIMIT = sys.float_info.max / 4
+# Refinement rounds and sample budget per tile
+MAX_DEPTH = 8
+MAX_TILE_POINTS = 2048
+# Split while the midpoint is this far off the chord (fraction of the tile's value range)
+TOLERANCE = 1e-3
+# Unresolved steps larger than this fraction of the value range are drawn as gaps
+JUMP = 0.05
+# Sampled tiles kept per sampler
+CACHE_TILES = 512
+# Parametric and polar curves: initial samples and sample budget
+CURVE_SAMPLES = 257
+MAX_CURVE_POINTS = 16384
+# Implicit curves: each coarse cell the curve crosses is split this many times per side
+IMPLICIT_REFINE = 8
+
+# Kinds of plot
+FUNCTION = "function"
+PARAMETRIC = "parametric"
+POLAR = "polar"
+IMPLICIT = "implicit"
+
+Arrays = Tuple[Any, Any]
+Check = Optional[Callable[[], None]]
+
+
+class Cancelled(Exception):
+    """Raised by a render's check when a newer render has replaced it."""
+
+
+class PlotSpec(NamedTuple):
+    """What to draw: the kind of plot, one expression per curve, and the ranges."""
+
+    kind: str
+    expressions: Tuple[str, ...]
+    x_range: Tuple[float, float]
+    # Implicit plots only; None uses the x range
+    y_range: Optional[Tuple[float, float]] = None
+    # Parametric and polar plots (degrees, like the calculator's trig functions)
+    t_range: Tuple[float, float] = (0.0, 360.0)
+
+
+class Curve(NamedTuple):
+    label: str
+    xs: Any
+    ys: Any
+
+
+def real_values(values: Any, shape: Tuple[int, ...]) -> Any:
+    """Float array of plottable values: complex results and non-finite values become NaN."""
+    values = np.asarray(values)
+    if np.iscomplexobj(values):
+        real = values.real.astype(float)
+        with np.errstate(invalid="ignore"):
+            real[np.abs(values.imag) > 1e-9 * np.maximum(1.0, np.abs(real))] = np.nan
+    else:
+        try:
+            real = values.astype(float)
+        except (TypeError, ValueError, OverflowError):
+            # Object arrays (exact numbers, huge integers): convert one by one
+            real = np.array([_as_float(v) for v in values.ravel()], dtype=float).reshape(values.shape)
+    real = np.array(np.broadcast_to(real, shape), dtype=float)
+    real[~np.isfinite(real)] = np.nan
+    return real
+
+
+def _as_float(value: Any) -> float:
+    try:
+        return float(value)
+    except (TypeError, ValueError, OverflowError):
+        return math.nan
+
+
+def adaptive_sample(
+    func: Callable[[Any], Any],
+    start: float,
+    stop: float,
+    samples: int = TILE_SAMPLES,
+    max_depth: int = MAX_DEPTH,
+    max_points: int = MAX_TILE_POINTS,
+    tolerance: float = TOLERANCE,
+    check: Check = None,
+) -> Arrays:
+    """
+    Sample func (array -> float array, NaN where undefined) over [start, stop],
+    refining level by level where the curve bends or leaves its domain.
+    Returns sorted xs and their ys; NaN entries mark gaps.
+    """
+    return sample_intervals(func, [start], stop - start, samples, max_depth, max_points, tolerance, check)[0]
+
+
+def sample_intervals(
+    func: Callable[[Any], Any],
+    starts: Any,
+    width: float,
+    samples: int = TILE_SAMPLES,
+    max_depth: int = MAX_DEPTH,
+    max_points: int = MAX_TILE_POINTS,
+    tolerance: float = TOLERANCE,
+    check: Check = None,
+) -> List[Arrays]:
+    """
+    adaptive_sample() for the intervals [start, start + width] of each start,
+    all refined together so func runs once per round rather than per interval.
+    Each interval keeps its own tolerance; max_points is per interval.
+    """
+    starts = np.asarray(starts, dtype=float)
+    count = starts.size
+    xs = (starts[:, None] + width * np.linspace(0.0, 1.0, samples)).ravel()
+    ys = func(xs)
+    owner = np.repeat(np.arange(count), samples)
+    scale = _value_scales(ys.reshape(count, samples))
+    # Segments joining two intervals are never refined
+    active = owner[:-1] == owner[1:]
+    tol = tolerance * scale[owner[:-1]]
+    depth = 0
+    while depth < max_depth:
+        if check is not None:
+            check()
+        idx = np.flatnonzero(active)
+        if idx.size == 0 or xs.size + idx.size > max_points * count:
+            break
+        y0, y1 = ys[idx], ys[idx + 1]
+        xm = (xs[idx] + xs[idx + 1]) * 0.5
+        ym = func(xm)
+        with np.errstate(invalid="ignore"):
+            undefined = np.isnan(y0).astype(int) + np.isnan(y1) + np.isnan(ym)
+            refine = (np.abs(ym - (y0 + y1) * 0.5) > tol[idx]) | ((undefined > 0) & (undefined < 3))
+        active[idx] = refine
+        # Each split segment becomes two, both still active if the parent was
+        xs = np.insert(xs, idx + 1, xm)
+        ys = np.insert(ys, idx + 1, ym)
+        owner = np.insert(owner, idx + 1, owner[idx])
+        active = np.insert(active, idx + 1, refine)
+        tol = np.insert(tol, idx + 1, tol[idx])
+        depth += 1
+    if depth == max_depth:
+        idx, xm = _jumps(func, xs, ys, np.flatnonzero(active), JUMP * scale[owner[:-1]])
+        xs = np.insert(xs, idx + 1, xm)
+        ys = np.insert(ys, idx + 1, np.nan)
+        owner = np.insert(owner, idx + 1, owner[idx])
+    bounds = np.searchsorted(owner, np.arange(1, count))
+    return list(zip(np.split(xs, bounds), np.split(ys, bounds)))
+
+
+def _value_scales(rows: Any) -> Any:
+    # Per row: spread between the 5th and 95th percentile (so a pole's huge
+    # values do not make the rest look flat), never zero
+    rows = np.sort(rows, axis=1)  # NaNs sort last
+    count = np.count_nonzero(~np.isnan(rows), axis=1)
+    last = np.maximum(count - 1, 0)
+    r = np.arange(rows.shape[0])
+    low, high = rows[r, (last * 0.05).astype(int)], rows[r, np.ceil(last * 0.95).astype(int)]
+    magnitude = np.maximum(np.abs(rows[:, 0]), np.abs(rows[r, last]))
+    with np.errstate(invalid="ignore"):
+        scale = np.maximum(np.maximum(high - low, 1e-9 * magnitude), 1e-300)
+    return np.where(count > 0, scale, 1.0)
+
+
+def _jumps(func: Callable[[Any], Any], xs: Any, ys: Any, idx: Any, jump: Any) -> Arrays:
+    # Still unresolved at the finest width: a steep but continuous curve spreads
+    # its change over both halves, a step or pole puts (nearly) all of it in one.
+    # Returns the segments to break and where.
+    with np.errstate(invalid="ignore"):
+        idx = idx[np.abs(ys[idx + 1] - ys[idx]) > jump[idx]]
+        if idx.size == 0:
+            return idx, xs[idx]
+        y0, y1 = ys[idx], ys[idx + 1]
+        xm = (xs[idx] + xs[idx + 1]) * 0.5
+        ym = func(xm)
+        broken = np.maximum(np.abs(ym - y0), np.abs(y1 - ym)) > 0.9 * np.abs(y1 - y0)
+    return idx[broken], xm[broken]
+
+
+def curve_sample(
+    func: Callable[[Any], Arrays],
+    start: float,
+    stop: float,
+    samples: int = CURVE_SAMPLES,
+    max_depth: int = MAX_DEPTH,
+    max_points: int = MAX_CURVE_POINTS,
+    tolerance: float = TOLERANCE,
+    check: Check = None,
+) -> Arrays:
+    """
+    Adaptive sampling of a parametric curve: func maps t values to (xs, ys).
+    A segment is split while its midpoint is off the chord by more than
+    `tolerance` of the curve's extent, or while it crosses a domain edge.
+    """
+    ts = np.linspace(start, stop, samples)
+    xs, ys = func(ts)
+    extent = math.hypot(float(_value_scales(xs[None, :])[0]), float(_value_scales(ys[None, :])[0]))
+    tol = tolerance * extent
+    active = np.ones(samples - 1, dtype=bool)
+    depth = 0
+    while depth < max_depth:
+        if check is not None:
+            check()
+        idx = np.flatnonzero(active)
+        if idx.size == 0 or ts.size + idx.size > max_points:
+            break
+        tm = (ts[idx] + ts[idx + 1]) * 0.5
+        xm, ym = func(tm)
+        with np.errstate(invalid="ignore"):
+            off = np.hypot(xm - (xs[idx] + xs[idx + 1]) * 0.5, ym - (ys[idx] + ys[idx + 1]) * 0.5)
+            undefined = np.isnan(xs[idx] + ys[idx]).astype(int) + np.isnan(xs[idx + 1] + ys[idx + 1]) + np.isnan(xm + ym)
+            refine = (off > tol) | ((undefined > 0) & (undefined < 3))
+        active[idx] = refine
+        ts = np.insert(ts, idx + 1, tm)
+        xs = np.insert(xs, idx + 1, xm)
+        ys = np.insert(ys, idx + 1, ym)
+        active = np.insert(active, idx + 1, refine)
+        depth += 1
+    if depth == max_depth:
+        # As in sample_intervals: a jump puts (nearly) all of a segment's length in one half
+        idx = np.flatnonzero(active)
+        with np.errstate(invalid="ignore"):
+            idx = idx[np.hypot(xs[idx + 1] - xs[idx], ys[idx + 1] - ys[idx]) > JUMP * extent]
+        if idx.size:
+            tm = (ts[idx] + ts[idx + 1]) * 0.5
+            xm, ym = func(tm)
+            with np.errstate(invalid="ignore"):
+                whole = np.hypot(xs[idx + 1] - xs[idx], ys[idx + 1] - ys[idx])
+                half = np.maximum(np.hypot(xm - xs[idx], ym - ys[idx]), np.hypot(xs[idx + 1] - xm, ys[idx + 1] - ym))
+                idx = idx[half > 0.9 * whole]
+            xs = np.insert(xs, idx + 1, np.nan)
+            ys = np.insert(ys, idx + 1, np.nan)
+    return _collapse_gaps(xs, ys)
+
+
+def implicit_sample(
+    func: Callable[[Any, Any], Any],
+    x_range: Tuple[float, float],
+    y_range: Tuple[float, float],
+    cells: int = 100,
+    refine: int = IMPLICIT_REFINE,
+    check: Check = None,
+) -> Arrays:
+    """
+    Trace F(x, y) = 0, where func evaluates F on broadcast x and y arrays.
+    The range is cut into cells x cells; cells with a sign change at their
+    corners are split refine x refine times and traced by marching squares.
+    Returns line segments separated by NaN.
+    """
+    (xmin, xmax), (ymin, ymax) = x_range, y_range
+    gx = np.linspace(xmin, xmax, cells + 1)
+    gy = np.linspace(ymin, ymax, cells + 1)
+    values = func(gx[None, :], gy[:, None])
+    if check is not None:
+        check()
+    corners = np.stack((values[:-1, :-1], values[:-1, 1:], values[1:, :-1], values[1:, 1:]))
+    with np.errstate(invalid="ignore"):
+        crossed = (np.fmin.reduce(corners) > 0) != (np.fmax.reduce(corners) > 0)
+    rows, cols = np.nonzero(crossed)
+    if rows.size == 0:
+        return np.empty(0), np.empty(0)
+    # Sub-grids of the crossed cells, evaluated in one call: shape (cells, refine + 1, refine + 1)
+    steps = np.linspace(0.0, 1.0, refine + 1)
+    dx, dy = (xmax - xmin) / cells, (ymax - ymin) / cells
+    sub_x = gx[cols][:, None, None] + dx * steps[None, None, :]
+    sub_y = gy[rows][:, None, None] + dy * steps[None, :, None]
+    fine = func(sub_x, sub_y)
+    if check is not None:
+        check()
+    x0 = np.broadcast_to(sub_x[:, :, :-1], (rows.size, refine, refine)).ravel()
+    y0 = np.broadcast_to(sub_y[:, :-1, :], (rows.size, refine, refine)).ravel()
+    return _march(
+        x0, y0, dx / refine, dy / refine,
+        fine[:, :-1, :-1].ravel(), fine[:, :-1, 1:].ravel(), fine[:, 1:, :-1].ravel(), fine[:, 1:, 1:].ravel(),
+    )
+
+
+def _march(x0: Any, y0: Any, dx: float, dy: float, v00: Any, v10: Any, v01: Any, v11: Any) -> Arrays:
+    # Marching squares over independent cells; v01 is the corner at (x0, y0 + dy).
+    # Edges: 0 bottom (v00-v10), 1 right (v10-v11), 2 top (v01-v11), 3 left (v00-v01)
+    ends = ((v00, v10), (v10, v11), (v01, v11), (v00, v01))
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mask = np.array([(a > 0) != (b > 0) for a, b in ends]) & np.isfinite(np.array([a - b for a, b in ends]))
+        t = [a / (a - b) for a, b in ends]
+    px = np.array([x0 + t[0] * dx, x0 + dx, x0 + t[2] * dx, x0])
+    py = np.array([y0, y0 + t[1] * dy, y0 + dy, y0 + t[3] * dy])
+    count = mask.sum(axis=0)
+    cell = np.arange(x0.size)
+    pairs: List[Tuple[Any, Any, Any]] = []
+    two = count == 2
+    first = np.argmax(mask, axis=0)
+    last = 3 - np.argmax(mask[::-1], axis=0)
+    pairs.append((cell[two], first[two], last[two]))
+    # Saddles: the centre's sign decides which corners are cut off
+    four = np.flatnonzero(count == 4)
+    if four.size:
+        with np.errstate(invalid="ignore"):
+            joined = ((v00 + v10 + v01 + v11)[four] > 0) == (v00[four] > 0)
+        edges = np.where(joined[:, None], [[0, 1, 3, 2]], [[0, 3, 2, 1]])
+        pairs.append((four, edges[:, 0], edges[:, 1]))
+        pairs.append((four, edges[:, 2], edges[:, 3]))
+    cells_, a, b = (np.concatenate(parts) for parts in zip(*pairs))
+    gap = np.full(cells_.size, np.nan)
+    xs = np.column_stack((px[a, cells_], px[b, cells_], gap)).ravel()
+    ys = np.column_stack((py[a, cells_], py[b, cells_], gap)).ravel()
+    return xs, ys
+
+
+def _collapse_gaps(xs: Any, ys: Any) -> Arrays:
+    # One NaN is enough to break the line
+    nan = np.isnan(ys)
+    keep = ~(nan & np.concatenate(([False], nan[:-1])))
+    return xs[keep], ys[keep]
+
+
+def decimate(xs: Any, ys: Any, xmin: float, xmax: float, pixels: int) -> Arrays:
+    """
+    Reduce points to what a plot `pixels` wide can show: per pixel column the
+    first, last, lowest and highest point (in x order), plus one NaN per gap.
+    """
+    if xs.size <= 4 * pixels or xmax <= xmin:
+        return xs, ys
+    column = np.floor((xs - xmin) * (pixels / (xmax - xmin))).astype(np.int64)
+    starts = np.flatnonzero(column[1:] != column[:-1]) + 1
+    firsts = np.concatenate(([0], starts))
+    lasts = np.concatenate((starts - 1, [xs.size - 1]))
+    finite = np.isfinite(ys)
+    defined = np.flatnonzero(finite)
+    # Sorting by (column, y) puts each column's lowest point first and highest last
+    order = defined[np.lexsort((ys[defined], column[defined]))]
+    col = column[order]
+    boundary = col[1:] != col[:-1]
+    lows = order[np.concatenate(([True], boundary))]
+    highs = order[np.concatenate((boundary, [True]))]
+    gaps = np.flatnonzero(~finite & np.concatenate(([True], finite[:-1])))
+    keep = np.unique(np.concatenate((firsts, lasts, lows, highs, gaps)))
+    return xs[keep], ys[keep]
+
+
+def robust_ylim(ys: Any) -> Optional[Tuple[float, float]]:
+    """
+    y limits that ignore spikes (e.g. near poles), or None when the full
+    range is fine for autoscaling.
+    """
+    finite = ys[np.isfinite(ys)]
+    if finite.size < 2:
+        return None
+    low, high = (float(v) for v in np.percentile(finite, [1, 99]))
+    if high <= low or float(finite.max() - finite.min()) <= 20 * (high - low):
+        return None
+    pad = 0.25 * (high - low)
+    return low - pad, high + pad
+
+
+class FunctionSampler:
+    """
+    Samples expressions through an engine's vectorized evaluation, caching
+    y = f(x) tiles per (expression, engine state) so views can be redrawn
+    cheaply. Expressions that cannot run on arrays (e.g. scalar-only user
+    functions) fall back to one evaluation per point, and points that fail
+    are left as gaps. Syntax errors and unknown names raise.
+
+    A sampler is not thread-safe; a background renderer should own one and
+    may swap in a fresh engine (see CalculatorEngine.fork) for each render.
+    """
+
+    def __init__(self, engine: Any, cache_tiles: int = CACHE_TILES) -> None:
+        if np is None:
+            raise RuntimeError("NumPy is required for plotting (pip install numpy)")
+        self.engine = engine
+        self.cache_tiles = cache_tiles
+        self._tiles: "OrderedDict[Hashable, Arrays]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def evaluate(self, expression: str, xs: Any, check: Check = None) -> Any:
+        """Plottable values of expression at xs (NaN where undefined)."""
+        return self.values(expression, check, x=xs)
+
+    def values(self, expression: str, check: Check = None, **arrays: Any) -> Any:
+        """Plottable values of expression with arrays bound to variable names (broadcast)."""
+        shape = np.broadcast_shapes(*(np.shape(a) for a in arrays.values()))
+        try:
+            values = self.engine.evaluate_vectorized(expression, **arrays)
+        except (ParseError, NameError):
+            raise
+        except Exception:
+            values = self._pointwise(expression, arrays, shape, check)
+        return real_values(values, shape)
+
+    def _pointwise(self, expression: str, arrays: Dict[str, Any], shape: Tuple[int, ...], check: Check) -> Any:
+        flat = {name: np.broadcast_to(a, shape).ravel() for name, a in arrays.items()}
+        results = []
+        for i in range(math.prod(shape)):
+            if check is not None and i % 256 == 0:
+                check()
+            try:
+                results.append(self.engine.evaluate_vectorized(expression, **{n: float(v[i]) for n, v in flat.items()}))
+            except Exception:
+                results.append(math.nan)
+        return np.array(results).reshape(shape)
+
+    def _state_key(self, expression: str) -> Hashable:
+        # Results also depend on user functions, and on ANS and memory where used:
+        # a new answer must not throw away the tiles of every other curve
+        engine = self.engine
+        names = self._names(expression)
+        answer = repr(engine.last_answer) if names is None or "ANS" in names else None
+        memory = repr(engine.memory_value) if names is None or "MR" in names else None
+        return (expression, tuple(engine.function_definitions()), answer, memory)
+
+    def _names(self, expression: str) -> Optional[Set[str]]:
+        """Names expression refers to, through the user functions it calls; None if unknown."""
+        try:
+            pending = list(names_in(parse(expression)))
+        except ParseError:
+            return None
+        functions = self.engine.user_functions
+        found: Set[str] = set()
+        while pending:
+            name = pending.pop()
+            if name in found:
+                continue
+            found.add(name)
+            func = functions.get(name)
+            if isinstance(func, UserFunction):
+                pending.extend(func.program.names)
+            elif func is not None:
+                # A Python callable: no telling what it reads
+                return None
+        return found
+
+    def tiles(
+        self, expression: str, level: int, indices: List[int], key: Optional[Hashable] = None, check: Check = None
+    ) -> List[Arrays]:
+        """
+        Samples of the tiles at width 2**level with the given indices (tile i
+        covers [i * 2**level, (i + 1) * 2**level]); missing ones are sampled together.
+        """
+        key = key if key is not None else self._state_key(expression)
+        found = {}
+        for index in indices:
+            cached = self._tiles.get((key, level, index))
+            if cached is not None:
+                self._tiles.move_to_end((key, level, index))
+                found[index] = cached
+        missing = [index for index in indices if index not in found]
+        self.hits += len(found)
+        self.misses += len(missing)
+        if missing:
+            width = math.ldexp(1.0, level)
+            sampled = sample_intervals(
+                lambda xs: self.evaluate(expression, xs, check), [i * width for i in missing], width, check=check
+            )
+            for index, result in zip(missing, sampled):
+                found[index] = self._tiles[(key, level, index)] = result
+            while len(self._tiles) > self.cache_tiles:
+                self._tiles.popitem(last=False)
+        return [found[index] for index in indices]
+
+    def sample(self, expression: str, xmin: float, xmax: float, pixels: int = 800, check: Check = None) -> Arrays:
+        """Points for drawing expression over [xmin, xmax] on a plot `pixels` wide."""
+        if not (abs(xmin) <= X_LIMIT and abs(xmax) <= X_LIMIT):
+            raise ValueError(f"x min and x max must be finite numbers within ±{X_LIMIT:.3g}")
+        if not xmax > xmin:
+            raise ValueError("x max must be greater than x min")
+        span = (xmax - xmin) / TILES_PER_VIEW
+        if span == 0:
+            # Below the smallest float: no tile is that narrow
+            raise ValueError("x range is too narrow to plot")
+        level = math.floor(math.log2(span))
+        width = math.ldexp(1.0, level)
+        indices = list(range(math.floor(xmin / width), math.floor(xmax / width) + 1))
+        tiles = self.tiles(expression, level, indices, check=check)
+        # Neighbouring tiles share their boundary point
+        xs = np.concatenate([tiles[0][0]] + [x[1:] for x, _ in tiles[1:]])
+        ys = np.concatenate([tiles[0][1]] + [y[1:] for _, y in tiles[1:]])
+        # Keep one point beyond each edge so the line reaches the border
+        lo = max(int(np.searchsorted(xs, xmin)) - 1, 0)
+        hi = int(np.searchsorted(xs, xmax, side="right")) + 1
+        xs, ys = _collapse_gaps(xs[lo:hi], ys[lo:hi])
+        return decimate(xs, ys, xmin, xmax, max(int(pixels), 1))
+
+    def clear(self) -> None:
+        self._tiles.clear()
+
+    # ------------------------------ Other kinds -----------------------------
+    def parametric(self, x_expression: str, y_expression: str, t_range: Tuple[float, float], check: Check = None) -> Arrays:
+        def points(ts: Any) -> Arrays:
+            return self.values(x_expression, check, t=ts), self.values(y_expression, check, t=ts)
+
+        return curve_sample(points, *t_range, check=check)
+
+    def polar(self, expression: str, t_range: Tuple[float, float], check: Check = None) -> Arrays:
+        def points(ts: Any) -> Arrays:
+            r = self.values(expression, check, t=ts)
+            angle = np.radians(ts)
+            return r * np.cos(angle), r * np.sin(angle)
+
+        return curve_sample(points, *t_range, check=check)
+
+    def implicit(
+        self, expression: str, x_range: Tuple[float, float], y_range: Tuple[float, float], pixels: int = 800, check: Check = None
+    ) -> Arrays:
+        # Coarse cells of about IMPLICIT_REFINE pixels, refined to about one pixel
+        cells = max(int(pixels) // IMPLICIT_REFINE, 16)
+        return implicit_sample(lambda xs, ys: self.values(expression, check, x=xs, y=ys), x_range, y_range, cells, check=check)
+
+
+# ------------------------------- Rendering ----------------------------------
+def split_top_level(text: str, separator: str) -> List[str]:
+    """Split at separators outside parentheses and brackets ("f(a, b), c" -> ["f(a, b)", "c"])."""
+    parts: List[str] = []
+    depth = 0
+    current: List[str] = []
+    for char in text:
+        if char in "([":
+            depth += 1
+        elif char in ")]":
+            depth -= 1
+        if char == separator and depth == 0:
+            parts.append("".join(current).strip())
+            current = []
+        else:
+            current.append(char)
+    parts.append("".join(current).strip())
+    return parts
+
+
+def implicit_expression(equation: str) -> str:
+    """F for F = 0 from "lhs = rhs" (as "(lhs) - (rhs)"); text without "=" is F itself."""
+    splits = [pos for kind, value, pos in tokenize(equation) if kind == "op" and value == "="]
+    if not splits:
+        return equation
+    if len(splits) > 1:
+        raise ValueError(f"An implicit curve has one '=': {equation}")
+    return f"({equation[:splits[0]].strip()}) - ({equation[splits[0] + 1:].strip()})"
+
+
+def render(sampler: FunctionSampler, spec: PlotSpec, pixels: int = 800, check: Check = None) -> List[Curve]:
+    """Sample every curve of a plot; raises Cancelled (from check) or evaluation errors."""
+    curves: List[Curve] = []
+    for expression in spec.expressions:
+        if spec.kind == FUNCTION:
+            xs, ys = sampler.sample(expression, *spec.x_range, pixels, check)
+            curves.append(Curve(f"y = {expression}", xs, ys))
+        elif spec.kind == PARAMETRIC:
+            parts = split_top_level(expression, ",")
+            if len(parts) != 2 or not all(parts):
+                raise ValueError(f"Expected 'x(t), y(t)' but got '{expression}'")
+            xs, ys = sampler.parametric(parts[0], parts[1], spec.t_range, check)
+            curves.append(Curve(f"({parts[0]}, {parts[1]})", xs, ys))
+        elif spec.kind == POLAR:
+            xs, ys = sampler.polar(expression, spec.t_range, check)
+            curves.append(Curve(f"r = {expression}", xs, ys))
+        elif spec.kind == IMPLICIT:
+            y_range = spec.y_range or spec.x_range
+            xs, ys = sampler.implicit(implicit_expression(expression), spec.x_range, y_range, pixels, check)
+            curves.append(Curve(expression if "=" in expression else f"{expression} = 0", xs, ys))
+        else:
+            raise ValueError(f"Unknown plot kind '{spec.kind}'")
+    return curves
+
+
+__all__ = [
+    "FUNCTION",
+    "IMPLICIT",
+    "PARAMETRIC",
+    "POLAR",
+    "Cancelled",
+    "Curve",
+    "FunctionSampler",
+    "PlotSpec",
+    "adaptive_sample",
+    "curve_sample",
+    "decimate",
+    "implicit_expression",
+    "implicit_sample",
+    "real_values",
+    "render",
+    "robust_ylim",
+    "sample_intervals",
+    "split_top_level",
+]
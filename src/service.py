@@ -0,0 +1,269 @@
+"""
+Asyncio evaluation service.
+
+Speaks JSON Lines over a Unix domain socket or localhost TCP: every request
+is one JSON object on one line and gets exactly one response line, in
+request order. Clients may pipeline (send many requests without waiting for
+answers). Each connection is its own session (ANS, memory, history); all
+sessions share one EngineCore, so the compile cache is shared too.
+
+Requests ("id" is optional and echoed back; "op" defaults to "evaluate"):
+    {"id": 1, "op": "evaluate", "expr": "2+2"}
+    {"op": "batch", "exprs": ["1+1", "ANS*2"], "record": true}
+    {"op": "memory", "action": "add", "value": 5}   # add, subtract, clear, recall
+    {"op": "history", "limit": 20}
+    {"op": "ping"}
+
+Responses carry "result" (text, as the GUI would show it) and "error" (an
+ERR_* code, 0 on success; ERR_REQUEST for malformed requests).
+
+Expressions that may run long are evaluated in a worker process so the
+event loop keeps serving other clients: a big factorial or power (see
+expression.is_expensive), and any call to a session's own functions, to a
+calculus form or to a statistic that reads a file. The result is then
+recorded in the caller's session.
+
+Run: python src/service.py --unix /tmp/calculator.sock
+     python src/service.py --port 8765
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+from concurrent.futures import Executor
+from typing import Any, Dict, List, Optional, Union
+
+from calculator import ERR_OK, CalculatorEngine, EngineCore
+from expression import CALCULUS_FORMS, ParseError, is_expensive, names_in, parse
+from parallel import create_worker_pool, evaluate_isolated
+from stats import READS_FILES
+
+
+# Error code for requests the service cannot interpret (bad JSON, unknown op)
+ERR_REQUEST = -1
+
+# Largest accepted request line
+MAX_REQUEST_BYTES = 1 << 20
+
+# Calls that may run until the time budget whatever their arguments look like
+SLOW_CALLS = frozenset(CALCULUS_FORMS) | READS_FILES
+
+
+class CalculatorService:
+    """Serves per-connection calculator sessions over a stream socket."""
+
+    def __init__(
+        self,
+        core: Optional[EngineCore] = None,
+        *,
+        executor: Optional[Executor] = None,
+        workers: Optional[int] = None,
+        max_pipeline: int = 256,
+        history_size: int = 200,
+    ) -> None:
+        self.core = core if core is not None else EngineCore()
+        # Workers are spawned on the first expensive request, not up front
+        self._executor = executor if executor is not None else create_worker_pool(workers)
+        self._owns_executor = executor is None
+        self.max_pipeline = max(1, int(max_pipeline))
+        self.history_size = history_size
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    # ------------------------------ Lifecycle ------------------------------
+    async def start_unix(self, path: str) -> asyncio.AbstractServer:
+        if os.path.exists(path):
+            os.unlink(path)  # stale socket from an earlier run
+        self._server = await asyncio.start_unix_server(self._handle_client, path, limit=MAX_REQUEST_BYTES)
+        return self._server
+
+    async def start_tcp(self, host: str = "127.0.0.1", port: int = 0) -> asyncio.AbstractServer:
+        self._server = await asyncio.start_server(self._handle_client, host, port, limit=MAX_REQUEST_BYTES)
+        return self._server
+
+    async def close(self) -> None:
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+        if self._owns_executor:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+
+    # ----------------------------- Connections -----------------------------
+    async def _handle_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        session = self.core.session(history_size=self.history_size)
+        # Bounded so a client pipelining faster than we answer gets backpressure
+        queue: "asyncio.Queue[Optional[bytes]]" = asyncio.Queue(self.max_pipeline)
+        reading = asyncio.ensure_future(self._read_requests(reader, queue))
+        try:
+            while True:
+                line = await queue.get()
+                if line is None:
+                    break
+                writer.write(await self._respond(session, line))
+                if queue.empty():
+                    # Flush once per burst of pipelined requests, not per response
+                    await writer.drain()
+        except (ConnectionError, asyncio.CancelledError):
+            pass
+        finally:
+            reading.cancel()
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except Exception:
+                pass
+
+    @staticmethod
+    async def _read_requests(reader: asyncio.StreamReader, queue: "asyncio.Queue[Optional[bytes]]") -> None:
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                if line.strip():
+                    await queue.put(line)
+        except (ConnectionError, ValueError):
+            # Reset connection, or a request line over MAX_REQUEST_BYTES
+            pass
+        finally:
+            await queue.put(None)
+
+    async def _respond(self, session: CalculatorEngine, line: bytes) -> bytes:
+        try:
+            request = json.loads(line)
+            if not isinstance(request, dict):
+                raise ValueError
+        except ValueError:
+            return _encode({"result": "Error: Invalid JSON request", "error": ERR_REQUEST})
+        try:
+            body = await self.handle_request(session, request)
+        except (TypeError, ValueError) as ex:
+            body = {"result": f"Error: {ex}", "error": ERR_REQUEST}
+        if "id" in request:
+            body["id"] = request["id"]
+        return _encode(body)
+
+    # ------------------------------ Requests -------------------------------
+    async def handle_request(self, session: CalculatorEngine, request: Dict[str, Any]) -> Dict[str, Any]:
+        """Run one decoded request against a session and return the response body."""
+        op = request.get("op", "evaluate")
+        if op == "evaluate":
+            return await self._evaluate(session, str(request.get("expr", "")), record=True)
+        if op == "batch":
+            exprs = request.get("exprs")
+            if not isinstance(exprs, list):
+                raise ValueError("'exprs' must be a list")
+            return await self._batch(session, [str(e) for e in exprs], bool(request.get("record", False)))
+        if op == "memory":
+            return _memory(session, str(request.get("action", "recall")), request.get("value", 0))
+        if op == "history":
+            limit = int(request.get("limit", session.history.capacity))
+            return {"result": [list(entry) for entry in session.history.tail(limit)], "error": ERR_OK}
+        if op == "ping":
+            return {"result": "pong", "error": ERR_OK}
+        raise ValueError(f"Unknown op '{op}'")
+
+    async def _evaluate(self, session: CalculatorEngine, expr: str, record: bool) -> Dict[str, Any]:
+        if self._is_expensive(session, expr):
+            loop = asyncio.get_running_loop()
+            # The worker rebuilds the session's functions, mode and limits from these
+            value, error, text = await loop.run_in_executor(
+                self._executor,
+                evaluate_isolated,
+                expr,
+                session.last_answer,
+                session.memory_value,
+                session.function_definitions(),
+                session.numeric_backend.describe(),
+                session.limits,
+            )
+            if error == ERR_OK and record:
+                text = session.record_result(expr, value)
+            return {"result": text, "error": error}
+        batch = session.evaluate_many([expr], record_history=record, as_strings=True)
+        return {"result": batch.values[0], "error": batch.errors[0]}
+
+    async def _batch(self, session: CalculatorEngine, exprs: List[str], record: bool) -> Dict[str, Any]:
+        if not any(self._is_expensive(session, e) for e in exprs):
+            batch = session.evaluate_many(exprs, record_history=record, as_strings=True)
+            return {"result": batch.values, "error": batch.errors}
+        results: List[str] = []
+        errors: List[int] = []
+        for expr in exprs:
+            body = await self._evaluate(session, expr, record)
+            results.append(body["result"])
+            errors.append(body["error"])
+        return {"result": results, "error": errors}
+
+    def _is_expensive(self, session: CalculatorEngine, expr: str) -> bool:
+        # A user function may recurse; its body is not in the expression's tree
+        slow = SLOW_CALLS.union(session.user_functions)
+        program = self.core.expression_cache.peek(expr)
+        if program is not None:
+            return program.expensive or not slow.isdisjoint(program.names)
+        try:
+            # Parsing is cheap; compiling may fold (i.e. run) a huge factorial
+            tree = parse(expr)
+        except ParseError:
+            return False
+        return is_expensive(tree) or not slow.isdisjoint(names_in(tree))
+
+
+def _memory(session: CalculatorEngine, action: str, value: Any) -> Dict[str, Any]:
+    if action in ("add", "subtract"):
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            raise ValueError("'value' must be a number")
+        if action == "add":
+            session.memory_add(value)
+        else:
+            session.memory_subtract(value)
+    elif action == "clear":
+        session.memory_clear()
+    elif action != "recall":
+        raise ValueError(f"Unknown memory action '{action}'")
+    return {"result": _json_number(session.memory_value), "error": ERR_OK}
+
+
+def _json_number(value: Any) -> Union[float, int, Dict[str, float]]:
+    if isinstance(value, complex):
+        return {"real": value.real, "imag": value.imag}
+    return value
+
+
+def _encode(body: Dict[str, Any]) -> bytes:
+    return (json.dumps(body, ensure_ascii=False) + "\n").encode("utf-8")
+
+
+async def serve(service: CalculatorService, unix_path: Optional[str], host: str, port: int) -> None:
+    if unix_path:
+        server = await service.start_unix(unix_path)
+        where = unix_path
+    else:
+        server = await service.start_tcp(host, port)
+        where = "%s:%d" % server.sockets[0].getsockname()[:2]
+    print(f"Calculator service listening on {where}", file=sys.stderr, flush=True)
+    try:
+        await server.serve_forever()
+    finally:
+        await service.close()
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Serve calculator sessions over JSON Lines.")
+    where = parser.add_mutually_exclusive_group()
+    where.add_argument("--unix", metavar="PATH", help="listen on a Unix domain socket")
+    where.add_argument("--port", type=int, default=8765, help="listen on localhost TCP (default: 8765)")
+    parser.add_argument("--host", default="127.0.0.1", help="TCP bind address (default: 127.0.0.1)")
+    parser.add_argument("--workers", type=int, default=None, help="processes for expensive expressions")
+    args = parser.parse_args(argv)
+    service = CalculatorService(workers=args.workers)
+    try:
+        asyncio.run(serve(service, args.unix, args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,117 @@
+import json
+import os
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+
+HistoryEntry = Tuple[str, str]  # (expression, result)
+
+
+class SessionStore:
+    """
+    Journaled session persistence.
+
+    - Snapshot (JSON): memory, last answer and bookkeeping. Small, and always
+      replaced atomically via a temporary file and os.replace.
+    - Journal (JSON Lines): one [expression, result] entry per line, only ever
+      appended to. It is compacted to the newest `journal_limit` entries once
+      it grows past twice that size.
+
+    Loading reads the snapshot plus a bounded tail of the journal, so startup
+    cost does not grow with the size of the stored history.
+    """
+
+    def __init__(self, snapshot_path: str, journal_path: Optional[str] = None, journal_limit: int = 10000) -> None:
+        self.snapshot_path = snapshot_path
+        self.journal_path = journal_path or os.path.splitext(snapshot_path)[0] + ".jsonl"
+        self.journal_limit = max(1, int(journal_limit))
+        # Entries currently in the journal (as recorded in the snapshot)
+        self.journal_entries = 0
+
+    # ----------------------------- Snapshot --------------------------------
+    def read_snapshot(self) -> Dict[str, Any]:
+        if not os.path.exists(self.snapshot_path):
+            return {}
+        with open(self.snapshot_path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        if not isinstance(data, dict):
+            return {}
+        self.journal_entries = int(data.get("journal_entries", 0) or 0)
+        return data
+
+    def write_snapshot(self, state: Dict[str, Any]) -> None:
+        data = dict(state)
+        data["journal_entries"] = self.journal_entries
+        self._atomic_write(self.snapshot_path, json.dumps(data, ensure_ascii=False, indent=2))
+
+    # ------------------------------ Journal --------------------------------
+    def append(self, entries: Iterable[HistoryEntry]) -> None:
+        lines = [json.dumps([expr, res], ensure_ascii=False) + "\n" for expr, res in entries]
+        if not lines:
+            return
+        with open(self.journal_path, "a", encoding="utf-8") as f:
+            f.writelines(lines)
+        self.journal_entries += len(lines)
+        if self.journal_entries > 2 * self.journal_limit:
+            self.compact()
+
+    def reset(self, entries: Iterable[HistoryEntry] = ()) -> None:
+        """Replace the whole journal (used after clearing history and by compaction)."""
+        lines = [json.dumps([expr, res], ensure_ascii=False) + "\n" for expr, res in entries]
+        self._atomic_write(self.journal_path, "".join(lines))
+        self.journal_entries = len(lines)
+
+    def compact(self) -> None:
+        self.reset(self.read_tail(self.journal_limit))
+
+    def read_tail(self, count: int) -> List[HistoryEntry]:
+        """Return the newest `count` entries, reading the file backwards in blocks."""
+        if count <= 0 or not os.path.exists(self.journal_path):
+            return []
+        block = 64 * 1024
+        with open(self.journal_path, "rb") as f:
+            f.seek(0, os.SEEK_END)
+            pos = f.tell()
+            data = b""
+            # One extra line so a partially read first line can be discarded
+            while pos > 0 and data.count(b"\n") <= count:
+                step = min(block, pos)
+                pos -= step
+                f.seek(pos)
+                data = f.read(step) + data
+        lines = data.splitlines()
+        if pos > 0:
+            lines = lines[1:]
+        entries = [entry for entry in map(_decode_line, lines[-count:]) if entry is not None]
+        return entries[-count:]
+
+    def iter_entries(self) -> Iterator[HistoryEntry]:
+        """Stream every journaled entry, oldest first."""
+        if not os.path.exists(self.journal_path):
+            return
+        with open(self.journal_path, "rb") as f:
+            for line in f:
+                entry = _decode_line(line)
+                if entry is not None:
+                    yield entry
+
+    # ------------------------------ Helpers --------------------------------
+    @staticmethod
+    def _atomic_write(path: str, text: str) -> None:
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(text)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+
+
+def _decode_line(line: bytes) -> Optional[HistoryEntry]:
+    # Skips blank lines and a torn final line left by an interrupted write
+    try:
+        expr, res = json.loads(line)
+        return str(expr), str(res)
+    except Exception:
+        return None
+
+
+__all__ = ["HistoryEntry", "SessionStore"]
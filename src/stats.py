@@ -0,0 +1,603 @@
+"""
+Statistics in expressions: sum, mean, median, var, stdev, percentile and linreg.
+
+Each takes its data as several numbers (mean(1, 2, 3)), an array
+(mean([1, 2, 3]), or the x array of evaluate_vectorized) or the path of a
+data file: mean('prices.csv'), or mean('prices.csv', 'close') for one column
+of a table (by header name, or by number from 1). Everything is worked out in
+a single pass over the data:
+
+- count, mean and the sum of squared deviations are merged chunk by chunk
+  (Welford's update; Chan et al.'s pairwise form for NumPy chunks), so a
+  variance does not lose its digits to cancellation as sum(x^2) - n*mean^2
+  does when the values sit far from zero;
+- sums are correctly rounded within a chunk (math.fsum) and compensated
+  across chunks (Neumaier);
+- quantiles of a file come from a merging t-digest: at most a few hundred
+  weighted centroids, finer towards the tails. Up to EXACT_LIMIT values it
+  keeps them all and percentiles are exact.
+
+Files are read in blocks of BLOCK_BYTES, so memory stays bounded whatever
+their size, and a pass over one runs on its own clock (max_file_seconds of
+the limits) rather than the evaluation's. The summary of a file (or column) is cached until the file
+changes, so mean('big.csv') followed by stdev('big.csv') reads it once.
+Lists and arrays are in memory already: their percentiles are exact, as
+NumPy's default (linear) method. Exact numbers (decimal/fraction modes)
+stay exact for numbers passed directly.
+
+var and stdev are sample statistics (divided by n - 1). linreg gives the
+least-squares line as [slope, intercept]: linreg(xs, ys), linreg of a
+two-column matrix or file, or linreg(ys) with x = 1, 2, 3, ...
+"""
+import io
+import math
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterator, List, NamedTuple, Optional, Sequence, Tuple
+
+import limits
+from matrix import is_matrix, make_array
+
+try:
+    import numpy as np  # type: ignore
+except Exception:
+    np = None  # type: ignore
+
+
+# Characters read from a data file at a time (cut back to a whole line)
+BLOCK_BYTES = 1 << 20
+# A t-digest keeps every value until it has this many, so small files get exact quantiles
+EXACT_LIMIT = 1 << 16
+# Centroids kept by the t-digest are about COMPRESSION / 2
+COMPRESSION = 1000
+# File summaries kept, most recently used first out
+CACHE_SIZE = 32
+
+
+def _require_numpy() -> None:
+    if np is None:
+        raise ValueError("Statistics on arrays and files need NumPy (pip install numpy)")
+
+
+# ---- Streaming accumulators ----
+class TDigest:
+    """
+    Merging t-digest (Dunning): a quantile sketch of a stream in bounded
+    memory. Values are buffered and merged in sorted batches into centroids
+    sized by the arcsine scale, so clusters near the tails hold few values.
+    """
+
+    __slots__ = ("compression", "means", "weights", "buffer", "buffered", "minimum", "maximum", "exact", "undefined")
+
+    def __init__(self, compression: int = COMPRESSION) -> None:
+        _require_numpy()
+        self.compression = compression
+        self.means = np.empty(0)
+        self.weights = np.empty(0)
+        self.buffer: List[Any] = []
+        self.buffered = 0
+        self.minimum = math.inf
+        self.maximum = -math.inf
+        # Still every value, one centroid each: quantiles are exact
+        self.exact = True
+        # A NaN went in: no quantile is meaningful
+        self.undefined = False
+
+    def add(self, values: Any) -> None:
+        if not values.size:
+            return
+        if np.isnan(values).any():
+            self.undefined = True
+            values = values[~np.isnan(values)]
+            if not values.size:
+                return
+        self.minimum = min(self.minimum, float(values.min()))
+        self.maximum = max(self.maximum, float(values.max()))
+        self.buffer.append(values)
+        self.buffered += values.size
+        if self.buffered >= EXACT_LIMIT:
+            self._merge()
+
+    def _merge(self) -> None:
+        if not self.buffered:
+            return
+        # Two sorted runs (centroids, then the sorted buffer): a stable sort merges them in linear time
+        values = np.concatenate([self.means, np.sort(np.concatenate(self.buffer))])
+        weights = np.concatenate([self.weights, np.ones(self.buffered)])
+        self.buffer, self.buffered = [], 0
+        order = np.argsort(values, kind="stable")
+        values, weights = values[order], weights[order]
+        if self.exact and values.size <= EXACT_LIMIT:
+            self.means, self.weights = values, weights
+            return
+        self.exact = False
+        # Each item's quantile (at its middle) on the arcsine scale k; items
+        # whose k falls in the same unit step form one centroid
+        cumulative = np.cumsum(weights)
+        q = (cumulative - weights / 2) / cumulative[-1]
+        k = np.floor(self.compression / (2 * math.pi) * np.arcsin(2 * q - 1))
+        starts = np.flatnonzero(np.concatenate(([True], k[1:] != k[:-1])))
+        self.weights = np.add.reduceat(weights, starts)
+        self.means = np.add.reduceat(values * weights, starts) / self.weights
+
+    def quantile(self, q: float) -> float:
+        """Value at fraction q (0 to 1) of the way through the sorted data."""
+        self._merge()
+        if self.undefined:
+            return math.nan
+        if not self.weights.size:
+            raise ValueError("No data")
+        # Rank (from 0) of each centroid's middle; the extremes are known exactly
+        ranks = np.cumsum(self.weights) - (self.weights + 1) / 2
+        last = float(self.weights.sum()) - 1
+        positions, means = ranks, self.means
+        if ranks[0] > 0:
+            positions, means = np.concatenate(([0.0], positions)), np.concatenate(([self.minimum], means))
+        if ranks[-1] < last:
+            positions, means = np.concatenate((positions, [last])), np.concatenate((means, [self.maximum]))
+        return float(np.interp(q * last, positions, means))
+
+
+class Summary:
+    """
+    One pass over a stream of numbers: count, sum, mean, spread and, with a
+    digest, quantiles. add() takes NumPy chunks; add_number() one number of
+    any type, so Fractions and Decimals stay exact.
+    """
+
+    __slots__ = ("count", "mean", "m2", "total", "compensation", "digest")
+
+    def __init__(self, quantiles: bool = False) -> None:
+        self.count = 0
+        self.mean: Any = 0
+        # Sum of squared deviations from the mean
+        self.m2: Any = 0
+        self.total: Any = 0
+        self.compensation: Any = 0
+        self.digest = TDigest() if quantiles else None
+
+    def add(self, chunk: Any) -> None:
+        n = chunk.size
+        if not n:
+            return
+        chunk_mean = float(chunk.mean())
+        chunk_m2 = float(np.square(chunk - chunk_mean).sum())
+        count = self.count + n
+        delta = chunk_mean - self.mean
+        self.mean += delta * n / count
+        self.m2 += chunk_m2 + delta * delta * self.count * n / count
+        self.count = count
+        self._add_total(_block_sum(chunk))
+        if self.digest is not None:
+            self.digest.add(chunk)
+
+    def add_number(self, value: Any) -> None:
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+        self._add_total(value)
+
+    def _add_total(self, value: Any) -> None:
+        # Neumaier's compensated sum: keep the low-order part each addition drops
+        total = self.total + value
+        if isinstance(total, float) and not math.isfinite(total):
+            # inf or nan: nothing to compensate (inf - inf would make it nan)
+            self.compensation = 0.0
+        elif abs(self.total) >= abs(value):
+            self.compensation += (self.total - total) + value
+        else:
+            self.compensation += (value - total) + self.total
+        self.total = total
+
+    @property
+    def sum(self) -> Any:
+        return self.total + self.compensation
+
+    def average(self) -> Any:
+        if not self.count:
+            raise ValueError("mean of no data")
+        # The compensated sum is more accurate than the running mean
+        return self.sum / self.count
+
+    def variance(self) -> Any:
+        if self.count < 2:
+            raise ValueError("var and stdev need at least two values")
+        return self.m2 / (self.count - 1)
+
+    def quantile(self, q: float) -> float:
+        if self.digest is None:
+            raise ValueError("Summary has no quantiles")
+        return self.digest.quantile(q)
+
+
+def _block_sum(chunk: Any) -> float:
+    """Correctly rounded sum of a chunk (math.fsum), so no digits are lost inside it either."""
+    try:
+        return math.fsum(chunk.tolist())
+    except (ValueError, OverflowError):
+        # inf - inf, or partial sums past the float range: NumPy's answer (nan, inf)
+        with np.errstate(over="ignore", invalid="ignore"):
+            return float(chunk.sum())
+
+
+class Fit:
+    """Streaming least squares: means and co-moments of (x, y) pairs, merged per chunk."""
+
+    __slots__ = ("count", "mean_x", "mean_y", "cxx", "cxy")
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.mean_x = self.mean_y = 0.0
+        self.cxx = self.cxy = 0.0
+
+    def add(self, xs: Any, ys: Any) -> None:
+        n = xs.size
+        if not n:
+            return
+        mean_x, mean_y = float(xs.mean()), float(ys.mean())
+        dx, dy = xs - mean_x, ys - mean_y
+        count = self.count + n
+        delta_x, delta_y = mean_x - self.mean_x, mean_y - self.mean_y
+        weight = self.count * n / count
+        self.cxx += float(np.dot(dx, dx)) + delta_x * delta_x * weight
+        self.cxy += float(np.dot(dx, dy)) + delta_x * delta_y * weight
+        self.mean_x += delta_x * n / count
+        self.mean_y += delta_y * n / count
+        self.count = count
+
+    def line(self) -> Tuple[float, float]:
+        """(slope, intercept) of the least-squares line."""
+        if self.count < 2 or self.cxx == 0:
+            raise ValueError("linreg needs at least two different x values")
+        slope = self.cxy / self.cxx
+        return slope, self.mean_y - slope * self.mean_x
+
+
+# ---- Data files ----
+class _File(NamedTuple):
+    path: str
+    columns: Tuple[Any, ...]
+
+
+def _delimiter(line: str) -> Optional[str]:
+    for delimiter in (",", ";", "\t"):
+        if delimiter in line:
+            return delimiter
+    return None  # whitespace
+
+
+def _cells(line: str, delimiter: Optional[str]) -> List[str]:
+    return [cell.strip().strip('"') for cell in line.split(delimiter)]
+
+
+def _is_number(text: str) -> bool:
+    try:
+        float(text)
+    except ValueError:
+        return False
+    return True
+
+
+def _column_index(spec: Any, header: Optional[List[str]], width: int, name: str) -> int:
+    if isinstance(spec, str):
+        if header is None or spec not in header:
+            raise ValueError(f"{name} has no column {spec!r}")
+        return header.index(spec)
+    if isinstance(spec, (complex, bool)) or is_matrix(spec) or spec != int(spec):
+        raise ValueError("A column is a header name or a number from 1")
+    index = int(spec)
+    if not 1 <= index <= width:
+        raise ValueError(f"{name} has {width} column{'s' if width != 1 else ''}, not {index}")
+    return index - 1
+
+
+def _layout(
+    text: str, columns: Sequence[Any], name: str, usage: str
+) -> Tuple[Optional[str], List[int], int]:
+    """Delimiter, column indices and how many leading lines to skip (comments, header)."""
+    lines = text.split("\n")
+    for skip, line in enumerate(lines):
+        line = line.split("#", 1)[0].strip()
+        if line:
+            break
+    else:
+        raise ValueError(f"{name} has no data")
+    delimiter = _delimiter(line)
+    cells = _cells(line, delimiter)
+    header = None if all(_is_number(cell) for cell in cells) else cells
+    if not columns:
+        if len(cells) > 1:
+            example = repr(header[0]) if header else "1"
+            raise ValueError(f"{name} has {len(cells)} columns: pick one, e.g. {usage}('{name}', {example})")
+        columns = (1,)
+    indices = [_column_index(spec, header, len(cells), name) for spec in columns]
+    return delimiter, indices, skip + (header is not None)
+
+
+def _bad_line(text: str, delimiter: Optional[str], indices: List[int], skip: int) -> int:
+    """Line number (from 1, within text) of the first line loadtxt could not read."""
+    for number, line in enumerate(text.split("\n"), 1):
+        if number <= skip:
+            continue
+        line = line.split("#", 1)[0].strip()
+        if not line:
+            continue
+        cells = _cells(line, delimiter)
+        if any(index >= len(cells) or not _is_number(cells[index]) for index in indices):
+            return number
+    return 0
+
+
+def _blocks(path: str, columns: Sequence[Any], usage: str) -> Iterator[Any]:
+    """
+    The selected columns of a data file as float arrays (one row per line),
+    a block of about BLOCK_BYTES at a time.
+    """
+    _require_numpy()
+    name = os.path.basename(path)
+    layout: Optional[Tuple[Optional[str], List[int], int]] = None
+    line = 0  # lines before the current block
+    rest = ""
+    with open(path, encoding="utf-8-sig") as file:
+        while True:
+            limits.check_deadline()
+            chunk = file.read(BLOCK_BYTES)
+            text = rest + chunk
+            if chunk:
+                # Whole lines only; the tail waits for the next read
+                cut = text.rfind("\n") + 1
+                if not cut:
+                    if len(text) > BLOCK_BYTES:
+                        # Not a data file (or one line of it would not fit in a block)
+                        raise ValueError(f"{name} line {line + 1}: longer than {BLOCK_BYTES} characters")
+                    rest = text
+                    continue
+                text, rest = text[:cut], text[cut:]
+            elif not text:
+                break
+            else:
+                rest = ""
+            skip = 0
+            if layout is None:
+                if not text.strip():
+                    line += text.count("\n")
+                    continue
+                layout = _layout(text, columns, name, usage)
+                skip = layout[2]
+            delimiter, indices, _ = layout
+            try:
+                rows = np.loadtxt(
+                    io.StringIO(text),
+                    delimiter=delimiter,
+                    usecols=indices,
+                    skiprows=skip,
+                    comments="#",
+                    quotechar='"',
+                    ndmin=2,
+                )
+            except ValueError:
+                # Say where, without echoing the file's contents
+                number = _bad_line(text, delimiter, indices, skip)
+                raise ValueError(f"{name} line {line + number}: not a number") from None
+            line += text.count("\n")
+            yield rows
+            if not chunk:
+                break
+    if layout is None:
+        raise ValueError(f"{name} has no data")
+
+
+_CACHE: "OrderedDict[Tuple[Any, ...], Any]" = OrderedDict()
+_CACHE_LOCK = threading.Lock()
+
+
+def _cached(kind: str, source: _File, usage: str, build: Callable[[Iterator[Any]], Any]) -> Any:
+    """build(blocks) for a file, reused until the file's size or modification time changes."""
+    path = os.path.expanduser(source.path)
+    try:
+        info = os.stat(path)
+    except OSError as ex:
+        raise ValueError(f"Cannot read {source.path}: {ex.strerror}") from None
+    key = (kind, os.path.realpath(path), source.columns, info.st_size, info.st_mtime_ns)
+    with _CACHE_LOCK:
+        if key in _CACHE:
+            _CACHE.move_to_end(key)
+            return _CACHE[key]
+    try:
+        with limits.reading_file():
+            value = build(_blocks(path, source.columns, usage))
+    except OSError as ex:
+        raise ValueError(f"Cannot read {source.path}: {ex.strerror}") from None
+    with _CACHE_LOCK:
+        _CACHE[key] = value
+        while len(_CACHE) > CACHE_SIZE:
+            _CACHE.popitem(last=False)
+    return value
+
+
+def _file_summary(source: _File, usage: str) -> Summary:
+    def build(blocks: Iterator[Any]) -> Summary:
+        summary = Summary(quantiles=True)
+        for rows in blocks:
+            summary.add(rows[:, 0])
+        return summary
+
+    return _cached("summary", source, usage, build)
+
+
+def clear_cache() -> None:
+    """Forget cached file summaries (they are also dropped when a file changes)."""
+    with _CACHE_LOCK:
+        _CACHE.clear()
+
+
+# ---- Arguments ----
+def _real(value: Any) -> Any:
+    if isinstance(value, complex):
+        raise ValueError("Statistics need real numbers")
+    return value
+
+
+def _data(args: Sequence[Any], usage: str) -> Any:
+    """A call's data: a _File, a float array, or a list of numbers."""
+    if not args:
+        raise ValueError(f"{usage} needs data")
+    if isinstance(args[0], str):
+        if len(args) > 2:
+            raise ValueError(f"Usage: {usage}('file') or {usage}('file', column)")
+        return _File(args[0], tuple(args[1:]))
+    if any(isinstance(arg, str) for arg in args):
+        raise ValueError(f"{usage}: a file name goes first")
+    if not any(is_matrix(arg) for arg in args):
+        return [_real(arg) for arg in args]
+    parts = []
+    for arg in args:
+        array = np.asarray(arg if is_matrix(arg) else float(_real(arg)))
+        if array.dtype.kind == "c":
+            raise ValueError("Statistics need real numbers")
+        parts.append(array.astype(float, copy=False).ravel())
+    return np.concatenate(parts)
+
+
+def _summary(args: Sequence[Any], usage: str) -> Summary:
+    data = _data(args, usage)
+    if isinstance(data, _File):
+        return _file_summary(data, usage)
+    summary = Summary()
+    if is_matrix(data):
+        summary.add(data)
+    else:
+        for value in data:
+            summary.add_number(value)
+    return summary
+
+
+def _interpolate(values: List[Any], percent: Any) -> Any:
+    """Linear interpolation between the closest ranks of sorted values, in their own number type."""
+    if not values:
+        raise ValueError("No data")
+    below, part = divmod(percent * (len(values) - 1), 100)
+    below = int(below)
+    if not part:
+        return values[below]
+    return (values[below] * (100 - part) + values[below + 1] * part) / 100
+
+
+def _quantile(args: Sequence[Any], percent: Any, usage: str) -> Any:
+    data = _data(args, usage)
+    if isinstance(data, _File):
+        return _file_summary(data, usage).quantile(float(percent) / 100)
+    if is_matrix(data):
+        if not data.size:
+            raise ValueError("No data")
+        return float(np.percentile(data, float(percent)))
+    return _interpolate(sorted(data), percent)
+
+
+# ---- Functions ----
+def total(*data: Any) -> Any:
+    """Sum of the data (compensated, so small values are not lost against large ones)."""
+    return _summary(data, "sum").sum
+
+
+def mean(*data: Any) -> Any:
+    """Arithmetic mean."""
+    return _summary(data, "mean").average()
+
+
+def variance(*data: Any) -> Any:
+    """Sample variance (divided by n - 1)."""
+    return _summary(data, "var").variance()
+
+
+def stdev(*data: Any) -> Any:
+    """Sample standard deviation."""
+    value = variance(*data)
+    # Decimal has its own sqrt; Fractions (and floats) go through float
+    return value.sqrt() if hasattr(value, "sqrt") else math.sqrt(value)
+
+
+def median(*data: Any) -> Any:
+    """Middle value (the mean of the two middle values for an even count)."""
+    return _quantile(data, 50, "median")
+
+
+def percentile(*args: Any) -> Any:
+    """percentile(data, p): the value below which p percent of the data lies."""
+    if len(args) < 2:
+        raise ValueError("Usage: percentile(data, p) or percentile('file', column, p)")
+    p = _real(args[-1])
+    if isinstance(p, str) or is_matrix(p) or not 0 <= p <= 100:
+        raise ValueError("percentile takes p from 0 to 100")
+    return _quantile(args[:-1], p, "percentile")
+
+
+def linreg(*args: Any) -> Any:
+    """Least-squares line through the data, as [slope, intercept]."""
+    _require_numpy()
+    if args and isinstance(args[0], str):
+        columns = tuple(args[1:]) or (1, 2)
+        if len(columns) != 2:
+            raise ValueError("Usage: linreg('file') or linreg('file', x column, y column)")
+
+        def build(blocks: Iterator[Any]) -> Fit:
+            fit = Fit()
+            for rows in blocks:
+                fit.add(rows[:, 0], rows[:, 1])
+            return fit
+
+        fit = _cached("linreg", _File(args[0], columns), "linreg", build)
+        return make_array(list(fit.line()))
+    arrays = [np.asarray(arg if is_matrix(arg) else [_real(arg)]) for arg in args]
+    if any(array.dtype.kind == "c" for array in arrays):
+        raise ValueError("Statistics need real numbers")
+    if len(arrays) == 1 and arrays[0].ndim == 2 and 2 in arrays[0].shape:
+        table = arrays[0] if arrays[0].shape[1] == 2 else arrays[0].T
+        xs, ys = table[:, 0], table[:, 1]
+    elif len(arrays) == 1:
+        ys = arrays[0].ravel()
+        xs = np.arange(1.0, ys.size + 1)
+    elif len(arrays) == 2 and arrays[0].size == arrays[1].size:
+        xs, ys = arrays[0].ravel(), arrays[1].ravel()
+    else:
+        raise ValueError("Usage: linreg(xs, ys), linreg([x, y; ...]) or linreg(ys)")
+    fit = Fit()
+    fit.add(xs.astype(float), ys.astype(float))
+    return make_array(list(fit.line()))
+
+
+# Names added to the calculator's base namespace
+STATISTICS_FUNCTIONS: Dict[str, Any] = {
+    "sum": total,
+    "mean": mean,
+    "median": median,
+    "var": variance,
+    "stdev": stdev,
+    "percentile": percentile,
+    "linreg": linreg,
+}
+# Results depend on files on disk: never folded at compile time or memoized
+READS_FILES = frozenset(STATISTICS_FUNCTIONS)
+
+
+__all__ = [
+    "BLOCK_BYTES",
+    "CACHE_SIZE",
+    "COMPRESSION",
+    "EXACT_LIMIT",
+    "READS_FILES",
+    "STATISTICS_FUNCTIONS",
+    "Fit",
+    "Summary",
+    "TDigest",
+    "clear_cache",
+    "linreg",
+    "mean",
+    "median",
+    "percentile",
+    "stdev",
+    "total",
+    "variance",
+]
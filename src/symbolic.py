@@ -0,0 +1,930 @@
+"""
+Symbolic algebra on parsed expressions: simplify, derivative and expand.
+
+Works on the trees from expression.parse (plain tagged tuples), so results
+compile and run like any other input, and to_text prints them back in
+calculator syntax. Nodes are hash-consed: each distinct subtree exists once
+in a table, keyed by its tag and the identities of its (already shared)
+children. Equal subtrees are therefore the same object, like terms are found
+with a dict lookup instead of a tree comparison, and every operation here
+memoizes per node, so the derivative of a body that is asked for again (by
+each diff(...) call of a plot, each Newton step of a solve, or a subtree
+repeated within one expression) is worked out once.
+
+simplify builds canonical forms:
+- a sum is a left-nested "+" chain of terms, highest degree first, with the
+  numeric constant last;
+- a term is a monomial, or (coefficient * monomial);
+- a monomial is a left-nested "*" chain of factors in a fixed order, each a
+  base or base ** exponent. "-" and "/" become coefficients and negative
+  exponents (to_text prints them as "-" and "/" again).
+
+Numbers stay exact when they are: integers and fractions (Decimal literals
+become fractions), floats only where the input had them. Trig functions take
+degrees, so the derivative of sin(x) is pi*cos(x)/180. This is a small rule
+set rather than a computer algebra system (nothing heavy is imported):
+functions without a rule (round, factorial, ...) raise ValueError from
+derivative.
+"""
+import cmath
+import functools
+from decimal import Decimal
+from fractions import Fraction
+from typing import Any, Callable, Dict, Iterable, List, Mapping, Optional, Sequence, Tuple
+
+import limits
+from expression import BIN, BINARY_OPS, CALL, COMPARISON_OPS, CONDITIONAL, LIST, NAME, NEG, NUM, STR, Node, is_calculus
+
+# Distinct nodes kept before the table (and every memo) starts over
+TABLE_LIMIT = 200_000
+# expand refuses to build more terms than this
+MAX_TERMS = 10_000
+# Exact integer powers are folded up to results of about this many bits
+MAX_BITS = 4096
+# Nested user-function calls written out before giving up (recursion)
+MAX_INLINE = 32
+
+# Printing precedence, loosest first
+_COMPARE, _SUM, _PRODUCT, _UNARY, _POWER, _ATOM = range(6)
+_LEVELS = {"-": _SUM, "/": _PRODUCT, "//": _PRODUCT, "%": _PRODUCT, "@": _PRODUCT}
+_LEVELS.update(dict.fromkeys(COMPARISON_OPS, _COMPARE))
+
+_EXACT = (int, Fraction)
+_REAL = (int, float, Fraction)
+# Functions finite for every finite real argument
+_TOTAL = frozenset({"sin", "cos", "atan", "abs", "rad", "deg"})
+# ... and for positive numbers, like ln(2)
+_POSITIVE_DOMAIN = frozenset({"ln", "log", "sqrt"})
+
+# The lookup for inline(): a user function's parameters and body tree, or None
+Definitions = Callable[[str], Optional[Tuple[Sequence[str], Node]]]
+
+
+# ------------------------------ Hash-consing --------------------------------
+class NodeTable:
+    """
+    One shared node per distinct subtree, plus the per-node memos of the
+    operations in this module. Memo entries keep their node alive and are
+    only trusted when it is the same object, so a cleared table never hands
+    out a result for a different tree that reused an id.
+    """
+
+    def __init__(self, limit: int = TABLE_LIMIT) -> None:
+        self.limit = limit
+        self.nodes: Dict[Tuple[Any, ...], Node] = {}
+        self.memos: Dict[str, Dict[Any, Tuple[Node, Any]]] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def make(self, node: Node) -> Node:
+        """The shared node equal to `node`, whose children are shared already."""
+        key = _key(node)
+        found = self.nodes.get(key)
+        if found is None:
+            found = self.nodes.setdefault(key, node)
+        return found
+
+    def intern(self, node: Node) -> Node:
+        """The shared node equal to any tree (parsed, or built by hand)."""
+        tag = node[0]
+        if tag == NUM:
+            return self.make((NUM, _normal(node[1])))
+        if tag in (STR, NAME):
+            return self.make(node)
+        if self.nodes.get(_key(node)) is node:
+            return node
+        # Parsed trees are interned again on every call of a compiled expression
+        raw = self.memo("intern")
+        entry = raw.get(id(node))
+        if entry is not None and entry[0] is node:
+            return entry[1]
+        if tag == NEG:
+            shared = self.make((NEG, self.intern(node[1])))
+        elif tag == BIN:
+            shared = self.make((BIN, node[1], self.intern(node[2]), self.intern(node[3])))
+        elif tag == CALL:
+            shared = self.make((CALL, node[1], tuple(self.intern(arg) for arg in node[2])))
+        else:
+            shared = self.make((LIST, tuple(self.intern(item) for item in node[1])))
+        raw[id(node)] = (node, shared)
+        return shared
+
+    def memo(self, name: str) -> Dict[Any, Tuple[Node, Any]]:
+        return self.memos.setdefault(name, {})
+
+    def check_size(self) -> None:
+        if len(self.nodes) > self.limit:
+            self.clear()
+
+    def clear(self) -> None:
+        self.nodes.clear()
+        for memo in self.memos.values():
+            memo.clear()
+
+    def stats(self) -> Dict[str, int]:
+        """Shared nodes, and memo hits and misses of simplify, derivative and friends."""
+        return {"nodes": len(self.nodes), "hits": self.hits, "misses": self.misses}
+
+
+def _key(node: Node) -> Tuple[Any, ...]:
+    tag = node[0]
+    if tag == NUM:
+        # repr keeps 1, 1.0, -0.0 and nan apart
+        return (NUM, type(node[1]), repr(node[1]))
+    if tag in (STR, NAME):
+        return node
+    if tag == NEG:
+        return (NEG, id(node[1]))
+    if tag == BIN:
+        return (BIN, node[1], id(node[2]), id(node[3]))
+    if tag == CALL:
+        return (CALL, node[1]) + tuple(map(id, node[2]))
+    return (LIST,) + tuple(map(id, node[1]))
+
+
+TABLE = NodeTable()
+_make = TABLE.make
+
+
+def _per_node(name: str) -> Callable[[Callable[..., Any]], Callable[..., Any]]:
+    """Memoize a function of a shared node (and extra hashable arguments) in TABLE."""
+    memo = TABLE.memo(name)
+
+    def decorate(compute: Callable[..., Any]) -> Callable[..., Any]:
+        @functools.wraps(compute)
+        def run(node: Node, *extra: Any) -> Any:
+            key = (id(node),) + extra if extra else id(node)
+            entry = memo.get(key)
+            if entry is not None and entry[0] is node:
+                TABLE.hits += 1
+                return entry[1]
+            TABLE.misses += 1
+            value = compute(node, *extra)
+            memo[key] = (node, value)
+            return value
+
+        return run
+
+    return decorate
+
+
+# -------------------------------- Numbers -----------------------------------
+def _normal(value: Any) -> Any:
+    """Numbers as kept in shared nodes: Python types, integral fractions as int."""
+    if isinstance(value, bool):
+        return int(value)
+    if isinstance(value, Decimal):
+        if not value.is_finite():
+            return float(value)
+        value = Fraction(value)
+    if isinstance(value, Fraction):
+        return value.numerator if value.denominator == 1 else value
+    if isinstance(value, float) and type(value) is not float:
+        return float(value)
+    if isinstance(value, complex) and type(value) is not complex:
+        return complex(value)
+    return value
+
+
+def _num(value: Any) -> Node:
+    return _make((NUM, _normal(value)))
+
+
+def _is_num(node: Node, value: Any) -> bool:
+    return node[0] == NUM and not isinstance(node[1], complex) and node[1] == value
+
+
+def _negative(value: Any) -> bool:
+    return isinstance(value, _REAL) and value < 0
+
+
+def _positive(value: Any) -> bool:
+    return isinstance(value, _REAL) and value > 0
+
+
+def _bits(value: Any) -> int:
+    if isinstance(value, Fraction):
+        return max(value.numerator.bit_length(), value.denominator.bit_length())
+    return int(value).bit_length()
+
+
+def _int_root(value: int, n: int) -> Optional[int]:
+    """The exact n-th root of a non-negative integer, if it has one."""
+    if value.bit_length() > 1000:
+        return None
+    guess = round(value ** (1.0 / n))
+    for root in (guess - 1, guess, guess + 1):
+        if root >= 0 and root**n == value:
+            return root
+    return None
+
+
+def _num_pow(base: Any, exp: Any) -> Optional[Any]:
+    """base ** exp when it can be folded without losing exactness; else None."""
+    try:
+        if isinstance(exp, int):
+            if isinstance(base, _EXACT):
+                if base == 0 and exp < 0 or abs(exp) * _bits(base) > MAX_BITS:
+                    return None
+                return _normal(Fraction(base) ** exp)
+            return _normal(base**exp)
+        if isinstance(exp, Fraction):
+            if not isinstance(base, _EXACT):
+                return None if _negative(base) else _normal(base ** float(exp))
+            # Exact roots only: 4^(1/2) is 2, 8^(2/3) is 4, 2^(1/2) stays
+            if base < 0:
+                return None
+            base = Fraction(base)
+            top, bottom = _int_root(base.numerator, exp.denominator), _int_root(base.denominator, exp.denominator)
+            if top is None or bottom is None:
+                return None
+            return _num_pow(Fraction(top, bottom), exp.numerator)
+        if _negative(base) and isinstance(exp, float) and not exp.is_integer():
+            return None
+        return _normal(base**exp)
+    except (ArithmeticError, ValueError, TypeError):
+        return None
+
+
+def _fold(op: str, left: Any, right: Any) -> Optional[Any]:
+    try:
+        value = BINARY_OPS[op](left, right)
+    except Exception:
+        return None
+    if isinstance(value, (int, float, complex, Fraction)):
+        return _normal(value)
+    return None
+
+
+# ------------------------------- Structure ----------------------------------
+def _addends(node: Node) -> List[Node]:
+    """Terms of a sum in order (just the node if it is not a sum)."""
+    terms = []
+    while node[0] == BIN and node[1] == "+":
+        terms.append(node[3])
+        node = node[2]
+    terms.append(node)
+    terms.reverse()
+    return terms
+
+
+def _multiplicands(node: Node) -> List[Node]:
+    """Factors of a product chain in order (just the node if it is not one)."""
+    factors = []
+    while node[0] == BIN and node[1] == "*":
+        factors.append(node[3])
+        node = node[2]
+    factors.append(node)
+    factors.reverse()
+    return factors
+
+
+def _coefficient(term: Node) -> Tuple[Any, Optional[Node]]:
+    """(numeric coefficient, rest) of a term; rest is None for a number."""
+    if term[0] == NUM:
+        return term[1], None
+    if term[0] == BIN and term[1] == "*" and term[2][0] == NUM:
+        return term[2][1], term[3]
+    return 1, term
+
+
+def _base_exp(factor: Node) -> Tuple[Node, Node]:
+    if factor[0] == BIN and factor[1] == "**":
+        return factor[2], factor[3]
+    return factor, _num(1)
+
+
+def _times(coeff: Any, rest: Node) -> Node:
+    if coeff == 1 and not isinstance(coeff, complex):
+        return rest
+    return _make((BIN, "*", _num(coeff), rest))
+
+
+def _chain(op: str, parts: List[Node]) -> Node:
+    result = parts[0]
+    for part in parts[1:]:
+        result = _make((BIN, op, result, part))
+    return result
+
+
+@_per_node("names")
+def _names(node: Node) -> frozenset:
+    """Variables a shared node depends on (function names excluded)."""
+    tag = node[0]
+    if tag == NAME:
+        return frozenset((node[1],))
+    if tag == NEG:
+        return _names(node[1])
+    if tag == BIN:
+        return _names(node[2]) | _names(node[3])
+    if tag == CALL:
+        if is_calculus(node):
+            bound = node[2][0], node[2][1][1]
+            return frozenset().union(_names(bound[0]) - {bound[1]}, *map(_names, node[2][2:]))
+        return frozenset().union(*map(_names, node[2]))
+    if tag == LIST:
+        return frozenset().union(*map(_names, node[1]))
+    return frozenset()
+
+
+@_per_node("calls")
+def _calls(node: Node) -> frozenset:
+    """Names of the functions called anywhere in a shared node."""
+    tag = node[0]
+    if tag == NEG:
+        return _calls(node[1])
+    if tag == BIN:
+        return _calls(node[2]) | _calls(node[3])
+    if tag == CALL:
+        return frozenset((node[1],)).union(*map(_calls, node[2]))
+    if tag == LIST:
+        return frozenset().union(*map(_calls, node[1]))
+    return frozenset()
+
+
+@_per_node("finite")
+def _finite(node: Node) -> bool:
+    """Known to be a finite number for any finite values of its variables (so 0 * node is 0)."""
+    tag = node[0]
+    if tag == NUM:
+        value = node[1]
+        return cmath.isfinite(value) if isinstance(value, (float, complex)) else isinstance(value, _EXACT)
+    if tag == NAME:
+        return True
+    if tag == BIN:
+        if node[1] in ("+", "*"):
+            return _finite(node[2]) and _finite(node[3])
+        if node[1] == "**":
+            base, exp = node[2], node[3]
+            if exp[0] == NUM and isinstance(exp[1], int) and exp[1] >= 0:
+                return _finite(base)
+            # e^x and 2^x are defined (if large) everywhere
+            return (base == (NAME, "e") or base[0] == NUM and _positive(base[1])) and _finite(exp)
+        return False
+    if tag == CALL:
+        if node[1] in _POSITIVE_DOMAIN and len(node[2]) == 1 and node[2][0][0] == NUM:
+            return _positive(node[2][0][1])
+        if node[1] not in _TOTAL and node[1] != CONDITIONAL:
+            return False
+        return all(_finite(arg) for arg in node[2])
+    return False
+
+
+@_per_node("order")
+def _term_order(rest: Node) -> Tuple[float, List[Tuple[str, float]], str]:
+    """Sort key of a term: higher degree first, then x^2*y before x*y^2 (as in x^3 + 3*x^2*y + ...)."""
+    degree = 0.0
+    powers = []
+    for factor in _multiplicands(rest):
+        base, exp = _base_exp(factor)
+        power = float(exp[1]) if exp[0] == NUM and isinstance(exp[1], _REAL) else 0.0
+        if _names(base):
+            degree += power
+        powers.append((_text(base)[0], -power))
+    return -degree, powers, _text(rest)[0]
+
+
+def _factor_order(base: Node) -> Tuple[int, str]:
+    return (0 if base[0] == NAME else 1), _text(base)[0]
+
+
+# ------------------------------ Constructors --------------------------------
+def _add_all(nodes: Iterable[Node]) -> Node:
+    """Canonical sum of canonical nodes, with like terms collected."""
+    constant: Any = 0
+    terms: Dict[int, List[Any]] = {}
+    for node in nodes:
+        for term in _addends(node):
+            coeff, rest = _coefficient(term)
+            if rest is None:
+                constant = constant + coeff
+                continue
+            entry = terms.get(id(rest))
+            if entry is None:
+                terms[id(rest)] = [rest, coeff]
+            else:
+                entry[1] = entry[1] + coeff
+    # 0*ln(x) stays: it is undefined where ln(x) is
+    kept = [(rest, coeff) for rest, coeff in terms.values() if coeff != 0 or not _finite(rest)]
+    kept.sort(key=lambda item: _term_order(item[0]))
+    parts = [_times(_normal(coeff), rest) for rest, coeff in kept]
+    constant = _normal(constant)
+    if constant != 0 or not parts:
+        parts.append(_num(constant))
+    return _chain("+", parts)
+
+
+def _mul_all(nodes: Iterable[Node]) -> Node:
+    """Canonical product of canonical nodes, with powers of a base combined."""
+    coeff: Any = 1
+    factors: Dict[int, List[Any]] = {}
+    finite = True
+    for node in nodes:
+        c, rest = _coefficient(node)
+        coeff = coeff * c
+        if rest is None:
+            continue
+        finite = finite and _finite(rest)
+        for factor in _multiplicands(rest):
+            base, exp = _base_exp(factor)
+            entry = factors.get(id(base))
+            if entry is None:
+                factors[id(base)] = [base, [exp]]
+            else:
+                entry[1].append(exp)
+    coeff = _normal(coeff)
+    if coeff == 0 and finite:
+        # Not for 0/0 or 0*ln(0): those are undefined, not 0
+        return _num(coeff)
+    built: List[Node] = []
+    again = False
+    for base, exps in factors.values():
+        if len(exps) == 1:
+            factor = base if _is_num(exps[0], 1) else _make((BIN, "**", base, exps[0]))
+        else:
+            factor = _power(base, _add_all(exps))
+            # x^(1/2)*x^(1/2) is x, 2^(1/2)*2^(1/2) is 2: fold them in again
+            again = again or factor[0] == NUM or factor[0] == BIN and factor[1] == "*"
+        built.append(factor)
+    if again:
+        return _mul_all([_num(coeff)] + built)
+    if not built:
+        return _num(coeff)
+    built.sort(key=lambda factor: _factor_order(_base_exp(factor)[0]))
+    return _times(coeff, _chain("*", built))
+
+
+def _power(base: Node, exp: Node) -> Node:
+    """Canonical base ** exp."""
+    if exp[0] == NUM:
+        e = exp[1]
+        if e == 0:
+            return _num(1)
+        if e == 1:
+            return base
+        if base[0] == NUM:
+            value = _num_pow(base[1], e)
+            if value is not None:
+                return _num(value)
+        elif isinstance(e, int):
+            # (x^a)^n = x^(a*n) and (c*x*y)^n = c^n * x^n * y^n hold for integer n
+            if base[0] == BIN and base[1] == "**":
+                return _power(base[2], _mul_all([base[3], exp]))
+            coeff, rest = _coefficient(base)
+            if rest is not None and (rest is not base or base[0] == BIN and base[1] == "*"):
+                scale = _num_pow(coeff, e)
+                if scale is not None:
+                    return _mul_all([_num(scale)] + [_power(factor, exp) for factor in _multiplicands(rest)])
+    elif _is_num(base, 1):
+        return base
+    return _make((BIN, "**", base, exp))
+
+
+def _call(name: str, *args: Node) -> Node:
+    """A call with known values and identities applied (sin(0), ln(e), if(1, a, b), ...)."""
+    if name == CONDITIONAL and len(args) == 3:
+        if args[0][0] == NUM:
+            return args[1] if args[0][1] else args[2]
+        if args[1] is args[2]:
+            return args[1]
+    elif len(args) == 1:
+        special = _special_value(name, args[0])
+        if special is not None:
+            return special
+    return _make((CALL, name, args))
+
+
+def _special_value(name: str, arg: Node) -> Optional[Node]:
+    value = arg[1] if arg[0] == NUM else None
+    exact = isinstance(value, _EXACT)
+    if name == "ln":
+        if arg == (NAME, "e"):
+            return _num(1)
+        if exact and value == 1:
+            return _num(0)
+        if arg[0] == BIN and arg[1] == "**" and arg[2] == (NAME, "e"):
+            return arg[3]
+    elif name == "log":
+        if isinstance(value, int) and value > 0 and str(value).strip("0") == "1":
+            return _num(len(str(value)) - 1)
+    elif name == "sqrt":
+        if exact and value >= 0:
+            root = _num_pow(value, Fraction(1, 2))
+            if root is not None:
+                return _num(root)
+    elif name in ("sin", "cos", "tan"):
+        # Exact at multiples of 90 degrees
+        if isinstance(value, int) and value % 90 == 0:
+            quarter = value // 90 % 4
+            if name == "sin":
+                return _num((0, 1, 0, -1)[quarter])
+            if name == "cos":
+                return _num((1, 0, -1, 0)[quarter])
+            if quarter % 2 == 0:
+                return _num(0)
+    elif name == "abs":
+        if isinstance(value, _REAL):
+            return _num(abs(value))
+        if arg[0] == CALL and arg[1] == "abs":
+            return arg
+    return None
+
+
+# -------------------------------- Simplify ----------------------------------
+@_per_node("simplify")
+def _simplify(node: Node) -> Node:
+    tag = node[0]
+    if tag in (NUM, STR, NAME):
+        return node
+    if tag == NEG:
+        return _mul_all([_num(-1), _simplify(node[1])])
+    if tag == BIN:
+        op = node[1]
+        left, right = _simplify(node[2]), _simplify(node[3])
+        if op == "+":
+            return _add_all([left, right])
+        if op == "-":
+            return _add_all([left, _mul_all([_num(-1), right])])
+        if op == "*":
+            return _mul_all([left, right])
+        if op == "/":
+            return _mul_all([left, _power(right, _num(-1))])
+        if op == "**":
+            return _power(left, right)
+        if left[0] == NUM and right[0] == NUM and op != "@":
+            value = _fold(op, left[1], right[1])
+            if value is not None:
+                return _num(value)
+        return _make((BIN, op, left, right))
+    if tag == CALL:
+        return _call(node[1], *[_simplify(arg) for arg in node[2]])
+    return _make((LIST, tuple(_simplify(item) for item in node[1])))
+
+
+# ------------------------------- Derivative ---------------------------------
+def _degree_scale() -> Node:
+    # d/dx of a function of degrees picks up pi/180
+    return _mul_all([_make((NAME, "pi")), _num(Fraction(1, 180))])
+
+
+def _radian_scale() -> Node:
+    return _mul_all([_num(180), _power(_make((NAME, "pi")), _num(-1))])
+
+
+def _one_minus_square(u: Node) -> Node:
+    return _add_all([_num(1), _mul_all([_num(-1), _power(u, _num(2))])])
+
+
+# Derivative of f(u) with respect to u, for one-argument functions
+_RULES: Dict[str, Callable[[Node], Node]] = {
+    "sin": lambda u: _mul_all([_degree_scale(), _call("cos", u)]),
+    "cos": lambda u: _mul_all([_num(-1), _degree_scale(), _call("sin", u)]),
+    "tan": lambda u: _mul_all([_degree_scale(), _power(_call("cos", u), _num(-2))]),
+    "asin": lambda u: _mul_all([_radian_scale(), _power(_one_minus_square(u), _num(Fraction(-1, 2)))]),
+    "acos": lambda u: _mul_all([_num(-1), _radian_scale(), _power(_one_minus_square(u), _num(Fraction(-1, 2)))]),
+    "atan": lambda u: _mul_all([_radian_scale(), _power(_add_all([_num(1), _power(u, _num(2))]), _num(-1))]),
+    "ln": lambda u: _power(u, _num(-1)),
+    "log": lambda u: _power(_mul_all([u, _call("ln", _num(10))]), _num(-1)),
+    "sqrt": lambda u: _mul_all([_num(Fraction(1, 2)), _power(_call("sqrt", u), _num(-1))]),
+    "abs": lambda u: _mul_all([u, _power(_call("abs", u), _num(-1))]),
+    "rad": lambda u: _degree_scale(),
+    "deg": lambda u: _radian_scale(),
+}
+
+
+@_per_node("derivative")
+def _derivative(node: Node, variable: str) -> Node:
+    if variable not in _names(node):
+        # Other variables are taken to be where node is defined; 0/0 is defined nowhere
+        return _mul_all([_num(0), node]) if not _names(node) else _num(0)
+    tag = node[0]
+    if tag == NAME:
+        return _num(1)
+    if tag == NEG or tag == BIN and node[1] in ("-", "/"):
+        # Not in simplified trees; only reached for trees built by hand
+        return _derivative(_simplify(node), variable)
+    if tag == BIN:
+        op, left, right = node[1], node[2], node[3]
+        if op == "+":
+            return _add_all([_derivative(left, variable), _derivative(right, variable)])
+        if op == "*":
+            # A constant factor leaves no 0*right term, which would stay if right is not finite
+            if variable not in _names(left):
+                return _mul_all([left, _derivative(right, variable)])
+            if variable not in _names(right):
+                return _mul_all([_derivative(left, variable), right])
+            return _add_all(
+                [_mul_all([_derivative(left, variable), right]), _mul_all([left, _derivative(right, variable)])]
+            )
+        if op == "**":
+            return _power_derivative(node, variable)
+        if op in COMPARISON_OPS:
+            # Piecewise constant
+            return _num(0)
+        raise ValueError(f"No derivative rule for '{op}'")
+    if tag == CALL:
+        name, args = node[1], node[2]
+        if name == CONDITIONAL and len(args) == 3:
+            return _call(name, args[0], _derivative(args[1], variable), _derivative(args[2], variable))
+        if name in ("min", "max") and len(args) == 2:
+            test = _make((BIN, "<=" if name == "min" else ">=", args[0], args[1]))
+            return _call(CONDITIONAL, test, _derivative(args[0], variable), _derivative(args[1], variable))
+        rule = _RULES.get(name)
+        if rule is None or len(args) != 1:
+            raise ValueError(f"No derivative rule for {name}()")
+        return _mul_all([rule(args[0]), _derivative(args[0], variable)])
+    if tag == LIST:
+        return _make((LIST, tuple(_derivative(item, variable) for item in node[1])))
+    return _num(0)
+
+
+def _power_derivative(node: Node, variable: str) -> Node:
+    base, exp = node[2], node[3]
+    if variable not in _names(exp):
+        # n * u^(n-1) * u'
+        return _mul_all([exp, _power(base, _add_all([exp, _num(-1)])), _derivative(base, variable)])
+    if variable not in _names(base):
+        # a^v * ln(a) * v'
+        return _mul_all([node, _call("ln", base), _derivative(exp, variable)])
+    # u^v * (v' ln(u) + v u'/u)
+    return _mul_all(
+        [
+            node,
+            _add_all(
+                [
+                    _mul_all([_derivative(exp, variable), _call("ln", base)]),
+                    _mul_all([exp, _derivative(base, variable), _power(base, _num(-1))]),
+                ]
+            ),
+        ]
+    )
+
+
+# --------------------------------- Expand -----------------------------------
+@_per_node("expand")
+def _expand(node: Node) -> Node:
+    tag = node[0]
+    if tag == BIN:
+        op = node[1]
+        if op == "+":
+            return _add_all([_expand(term) for term in _addends(node)])
+        if op == "*":
+            coeff, rest = _coefficient(node)
+            return _distribute([_num(coeff)] + [_expand(factor) for factor in _multiplicands(rest)])
+        if op == "**":
+            base, exp = _expand(node[2]), _expand(node[3])
+            e = exp[1] if exp[0] == NUM else None
+            if isinstance(e, int) and e not in (-1, 0, 1) and len(_addends(base)) > 1:
+                expanded = _distribute([base] * abs(e))
+                return expanded if e > 0 else _power(expanded, _num(-1))
+            return _power(base, exp)
+        return _make((BIN, op, _expand(node[2]), _expand(node[3])))
+    if tag == CALL:
+        return _call(node[1], *[_expand(arg) for arg in node[2]])
+    if tag == LIST:
+        return _make((LIST, tuple(_expand(item) for item in node[1])))
+    return node
+
+
+def _distribute(factors: List[Node]) -> Node:
+    """Product of expanded factors, multiplied out term by term."""
+    terms = [_num(1)]
+    for factor in factors:
+        limits.check_deadline()
+        addends = _addends(factor)
+        if len(terms) * len(addends) > MAX_TERMS:
+            raise ValueError(f"The expansion has more than {MAX_TERMS} terms")
+        terms = _addends(_add_all([_mul_all([a, b]) for a in terms for b in addends]))
+    return _add_all(terms)
+
+
+# ------------------------------ Substitution --------------------------------
+def _fresh(name: str, taken: frozenset) -> str:
+    """name_1, name_2, ...: the first not in `taken`."""
+    count = 1
+    while f"{name}_{count}" in taken:
+        count += 1
+    return f"{name}_{count}"
+
+
+def _substitute(node: Node, values: Mapping[str, Node]) -> Node:
+    tag = node[0]
+    if tag == NAME:
+        return values.get(node[1], node)
+    if not _names(node).intersection(values):
+        return node
+    if tag == NEG:
+        return _make((NEG, _substitute(node[1], values)))
+    if tag == BIN:
+        return _make((BIN, node[1], _substitute(node[2], values), _substitute(node[3], values)))
+    if tag == CALL:
+        args = node[2]
+        if is_calculus(node):
+            # The bound variable shadows outer names in the body
+            variable, body = args[1], args[0]
+            inner = {name: value for name, value in values.items() if name != variable[1]}
+            used = [_names(value) for name, value in inner.items() if name in _names(body)]
+            if any(variable[1] in names for names in used):
+                # A value would be captured by the bound variable: rename it first
+                variable = _make((NAME, _fresh(variable[1], _names(body).union(*used))))
+                body = _substitute(body, {args[1][1]: variable})
+            body = _substitute(body, inner) if inner else body
+            return _make((CALL, node[1], (body, variable) + tuple(_substitute(arg, values) for arg in args[2:])))
+        return _make((CALL, node[1], tuple(_substitute(arg, values) for arg in args)))
+    return _make((LIST, tuple(_substitute(item, values) for item in node[1])))
+
+
+def _inline(node: Node, definitions: Definitions, depth: int) -> Node:
+    tag = node[0]
+    if tag == NEG:
+        return _make((NEG, _inline(node[1], definitions, depth)))
+    if tag == BIN:
+        return _make((BIN, node[1], _inline(node[2], definitions, depth), _inline(node[3], definitions, depth)))
+    if tag == LIST:
+        return _make((LIST, tuple(_inline(item, definitions, depth) for item in node[1])))
+    if tag != CALL:
+        return node
+    args = tuple(_inline(arg, definitions, depth) for arg in node[2])
+    found = None if is_calculus(node) else definitions(node[1])
+    if found is None or len(found[0]) != len(args):
+        return _make((CALL, node[1], args))
+    if depth >= MAX_INLINE:
+        raise ValueError(f"Cannot write out {node[1]}(): its definition is recursive")
+    body = _substitute(TABLE.intern(found[1]), dict(zip(found[0], args)))
+    return _inline(body, definitions, depth + 1)
+
+
+# ------------------------------- Evaluation ---------------------------------
+@_per_node("evaluable")
+def _evaluable(node: Node) -> Node:
+    tag = node[0]
+    if tag == NUM:
+        return _num(float(node[1])) if isinstance(node[1], Fraction) else node
+    if tag in (STR, NAME):
+        return node
+    if tag == NEG:
+        return _make((NEG, _evaluable(node[1])))
+    if tag == BIN:
+        return _make((BIN, node[1], _evaluable(node[2]), _evaluable(node[3])))
+    if tag == CALL:
+        return _make((CALL, node[1], tuple(_evaluable(arg) for arg in node[2])))
+    return _make((LIST, tuple(_evaluable(item) for item in node[1])))
+
+
+# -------------------------------- Printing ----------------------------------
+@_per_node("text")
+def _text(node: Node) -> Tuple[str, int]:
+    """(text, precedence level) of a shared node."""
+    tag = node[0]
+    if tag == NUM:
+        return _number_text(node[1])
+    if tag == STR:
+        return repr(node[1]), _ATOM
+    if tag == NAME:
+        return node[1], _ATOM
+    if tag == NEG:
+        return "-" + _wrap(node[1], _POWER), _UNARY
+    if tag == CALL:
+        return f"{node[1]}({', '.join(_text(arg)[0] for arg in node[2])})", _ATOM
+    if tag == LIST:
+        return f"[{', '.join(_text(item)[0] for item in node[1])}]", _ATOM
+    op, left, right = node[1], node[2], node[3]
+    if op == "+":
+        return _sum_text(node), _SUM
+    if op == "*" or op == "**" and _reciprocal(right):
+        return _product_text(node), _PRODUCT
+    if op == "**":
+        return f"{_wrap(left, _ATOM)}^{_wrap(right, _ATOM)}", _POWER
+    level = _LEVELS[op]
+    if level == _PRODUCT:
+        return f"{_wrap(left, level)}{op}{_wrap(right, level + 1)}", level
+    return f"{_wrap(left, level)} {op} {_wrap(right, level + 1)}", level
+
+
+def _wrap(node: Node, level: int) -> str:
+    text, own = _text(node)
+    return text if own >= level else f"({text})"
+
+
+def _number_text(value: Any) -> Tuple[str, int]:
+    if isinstance(value, Fraction):
+        return f"{value.numerator}/{value.denominator}", _PRODUCT
+    text = repr(value)
+    if isinstance(value, complex):
+        return text, _ATOM
+    return text, (_UNARY if text.startswith("-") else _ATOM)
+
+
+def _reciprocal(exp: Node) -> bool:
+    return exp[0] == NUM and _negative(exp[1])
+
+
+def _sum_text(node: Node) -> str:
+    terms = _addends(node)
+    parts = [_wrap(terms[0], _SUM)]
+    for term in terms[1:]:
+        coeff, rest = _coefficient(term)
+        if _negative(coeff):
+            positive = _num(-coeff) if rest is None else _times(_normal(-coeff), rest)
+            parts.append(" - " + _wrap(positive, _PRODUCT))
+        else:
+            parts.append(" + " + _wrap(term, _SUM))
+    return "".join(parts)
+
+
+def _product_text(node: Node) -> str:
+    coeff, rest = _coefficient(node)
+    numerator: List[str] = []
+    denominator: List[str] = []
+    sign = ""
+    if isinstance(coeff, Fraction):
+        if coeff < 0:
+            sign, coeff = "-", -coeff
+        if coeff.numerator != 1:
+            numerator.append(str(coeff.numerator))
+        denominator.append(str(coeff.denominator))
+    elif _negative(coeff) and coeff == -1:
+        sign = "-"
+    elif coeff != 1 or isinstance(coeff, complex):
+        numerator.append(_number_text(coeff)[0])
+    for factor in _multiplicands(rest) if rest is not None else ():
+        base, exp = _base_exp(factor)
+        if _reciprocal(exp):
+            denominator.append(_factor_text(base, _num(-exp[1])))
+        else:
+            numerator.append(_factor_text(base, exp))
+    text = sign + ("*".join(numerator) or "1")
+    if len(denominator) == 1:
+        return f"{text}/{denominator[0]}"
+    if denominator:
+        return f"{text}/({'*'.join(denominator)})"
+    return text
+
+
+def _factor_text(base: Node, exp: Node) -> str:
+    if _is_num(exp, 1):
+        return _wrap(base, _UNARY)
+    return f"{_wrap(base, _ATOM)}^{_wrap(exp, _ATOM)}"
+
+
+# --------------------------------- Public -----------------------------------
+def intern(node: Node) -> Node:
+    """The shared (hash-consed) node equal to a tree."""
+    TABLE.check_size()
+    return TABLE.intern(node)
+
+
+def simplify(node: Node) -> Node:
+    """Canonical simplified form: constants folded, like terms and powers collected."""
+    return _simplify(intern(node))
+
+
+def derivative(node: Node, variable: str) -> Node:
+    """Exact derivative with respect to `variable`, simplified; ValueError if a function has no rule."""
+    return _derivative(simplify(node), variable)
+
+
+def expand(node: Node) -> Node:
+    """Simplified form with products and integer powers of sums multiplied out."""
+    return _expand(simplify(node))
+
+
+def substitute(node: Node, values: Mapping[str, Node]) -> Node:
+    """The tree with every free occurrence of the given names replaced by a tree."""
+    return _substitute(intern(node), {name: intern(value) for name, value in values.items()})
+
+
+def inline(node: Node, definitions: Definitions) -> Node:
+    """
+    The tree with calls of user functions written out: `definitions` gives a
+    function's parameters and body (or None for built-ins).
+    """
+    node = intern(node)
+    if not any(definitions(name) is not None for name in _calls(node)):
+        return node
+    return _inline(node, definitions, 0)
+
+
+def evaluable(node: Node) -> Node:
+    """The tree with fractions as floats, for running on floats and NumPy arrays."""
+    return _evaluable(intern(node))
+
+
+def to_text(node: Node) -> str:
+    """A tree as calculator input, e.g. "3*x^2 - 2" or "pi*cos(x)/180"."""
+    return _text(intern(node))[0]
+
+
+__all__ = [
+    "MAX_TERMS",
+    "NodeTable",
+    "TABLE",
+    "derivative",
+    "evaluable",
+    "expand",
+    "inline",
+    "intern",
+    "simplify",
+    "substitute",
+    "to_text",
+]
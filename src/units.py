@@ -0,0 +1,469 @@
+"""
+Unit registry with SI prefixes, compound units and dimensional analysis.
+
+A unit expression such as "km/h", "kg*m/s^2" or "kWh" is parsed once into a
+scale relative to SI base units plus a dimension (the exponents of m, kg, s,
+A, K, mol and cd). Two units convert into each other when their dimensions
+match, and since every unit here is linear the conversion is a single
+multiplication by a factor that is computed once per (from, to) pair and
+cached. Scales are exact fractions, so the decimal and fraction number modes
+get factors without binary rounding.
+
+Offset scales (degrees Celsius/Fahrenheit) are deliberately not included:
+they would need an addition as well as a multiplication.
+"""
+import re
+from fractions import Fraction
+from typing import Any, Dict, Iterable, List, NamedTuple, Tuple, Union
+
+try:
+    import numpy as np  # type: ignore
+except Exception:
+    np = None  # type: ignore
+
+
+BASE_UNITS = ("m", "kg", "s", "A", "K", "mol", "cd")
+Dimension = Tuple[int, ...]
+DIMENSIONLESS: Dimension = (0,) * len(BASE_UNITS)
+
+# Parsed units and factors kept per registry; cleared when full
+_CACHE_LIMIT = 4096
+
+# Units convert() knew before the registry, matched in any case as they were then ("ML" is millilitres)
+_LEGACY_NAMES = frozenset(
+    """
+    m meter meters km kilometer kilometers cm mm mi mile miles yd yard ft foot feet in inch inches
+    kg kilogram kilograms g gram grams lb pound pounds oz ounce ounces
+    l liter liters ml milliliter gal gallon gallons
+    """.split()
+)
+
+
+class Unit(NamedTuple):
+    """A unit as a multiple of SI base units."""
+
+    scale: Fraction
+    dimension: Dimension
+
+
+def _base(index: int, scale: Fraction = Fraction(1)) -> Unit:
+    return Unit(scale, tuple(1 if i == index else 0 for i in range(len(BASE_UNITS))))
+
+
+def _multiply(left: Unit, right: Unit) -> Unit:
+    return Unit(left.scale * right.scale, tuple(a + b for a, b in zip(left.dimension, right.dimension)))
+
+
+def _divide(left: Unit, right: Unit) -> Unit:
+    return Unit(left.scale / right.scale, tuple(a - b for a, b in zip(left.dimension, right.dimension)))
+
+
+def _power(unit: Unit, exponent: int) -> Unit:
+    return Unit(unit.scale ** exponent, tuple(d * exponent for d in unit.dimension))
+
+
+def format_dimension(dimension: Dimension) -> str:
+    """Dimension in base units, e.g. "kg·m^2·s^-2"; "1" when dimensionless."""
+    parts = []
+    # Mass first reads more naturally for derived units (kg·m/s^2)
+    for index in (1, 0, 2, 3, 4, 5, 6):
+        exponent = dimension[index]
+        if exponent:
+            parts.append(BASE_UNITS[index] if exponent == 1 else f"{BASE_UNITS[index]}^{exponent}")
+    return "·".join(parts) or "1"
+
+
+# ------------------------------- Prefixes -----------------------------------
+# Symbol prefixes go with unit symbols (km), long prefixes with names (kilometer)
+PREFIXES: Dict[str, Fraction] = {
+    "Y": Fraction(10) ** 24,
+    "Z": Fraction(10) ** 21,
+    "E": Fraction(10) ** 18,
+    "P": Fraction(10) ** 15,
+    "T": Fraction(10) ** 12,
+    "G": Fraction(10) ** 9,
+    "M": Fraction(10) ** 6,
+    "k": Fraction(10) ** 3,
+    "h": Fraction(10) ** 2,
+    "da": Fraction(10),
+    "d": Fraction(1, 10),
+    "c": Fraction(1, 10) ** 2,
+    "m": Fraction(1, 10) ** 3,
+    "µ": Fraction(1, 10) ** 6,  # micro sign
+    "μ": Fraction(1, 10) ** 6,  # Greek mu
+    "u": Fraction(1, 10) ** 6,
+    "n": Fraction(1, 10) ** 9,
+    "p": Fraction(1, 10) ** 12,
+    "f": Fraction(1, 10) ** 15,
+    "a": Fraction(1, 10) ** 18,
+    "z": Fraction(1, 10) ** 21,
+    "y": Fraction(1, 10) ** 24,
+}
+LONG_PREFIXES: Dict[str, Fraction] = {
+    "yotta": PREFIXES["Y"],
+    "zetta": PREFIXES["Z"],
+    "exa": PREFIXES["E"],
+    "peta": PREFIXES["P"],
+    "tera": PREFIXES["T"],
+    "giga": PREFIXES["G"],
+    "mega": PREFIXES["M"],
+    "kilo": PREFIXES["k"],
+    "hecto": PREFIXES["h"],
+    "deca": PREFIXES["da"],
+    "deci": PREFIXES["d"],
+    "centi": PREFIXES["c"],
+    "milli": PREFIXES["m"],
+    "micro": PREFIXES["u"],
+    "nano": PREFIXES["n"],
+    "pico": PREFIXES["p"],
+    "femto": PREFIXES["f"],
+    "atto": PREFIXES["a"],
+    "zepto": PREFIXES["z"],
+    "yocto": PREFIXES["y"],
+}
+# Longest first, so "da" wins over "d"
+_PREFIX_ORDER = sorted(PREFIXES, key=len, reverse=True)
+_LONG_PREFIX_ORDER = sorted(LONG_PREFIXES, key=len, reverse=True)
+
+
+# -------------------------------- Parsing -----------------------------------
+_SUPERSCRIPTS = str.maketrans("⁰¹²³⁴⁵⁶⁷⁸⁹⁻⁺", "0123456789-+")
+_TOKEN = re.compile(
+    r"""\s*(?:
+        (?P<number>\d+(?:\.\d*)?(?:[eE][-+]?\d+)?)
+      | (?P<name>[^\W\d_⁰¹²³⁴⁵⁶⁷⁸⁹]+(?:_[^\W\d_⁰¹²³⁴⁵⁶⁷⁸⁹]+)*)(?P<attached>-?\d+)?   # m, km2, s-1
+      | (?P<super>[⁻⁺]?[⁰¹²³⁴⁵⁶⁷⁸⁹]+)
+      | (?P<op>\*\*|[*·⋅/^()-])
+    )""",
+    re.VERBOSE,
+)
+
+
+def _tokenize(text: str) -> List[Tuple[str, str, str]]:
+    tokens = []
+    pos = 0
+    text = text.rstrip()
+    while pos < len(text):
+        match = _TOKEN.match(text, pos)
+        if match is None or match.end() == pos:
+            raise ValueError(f"Invalid unit '{text}'")
+        kind = match.lastgroup if match.lastgroup != "attached" else "name"
+        if kind == "name":
+            tokens.append(("name", match.group("name"), match.group("attached") or ""))
+        else:
+            tokens.append((kind, match.group(kind), ""))
+        pos = match.end()
+    return tokens
+
+
+class _UnitParser:
+    """product := factor (('*' | '·' | '/' | juxtaposition) factor)*"""
+
+    def __init__(self, registry: "UnitRegistry", text: str) -> None:
+        self.registry = registry
+        self.text = text
+        self.tokens = _tokenize(text)
+        self.pos = 0
+
+    def parse(self) -> Unit:
+        if not self.tokens:
+            raise ValueError("Empty unit")
+        unit = self.product()
+        if self.pos != len(self.tokens):
+            raise ValueError(f"Invalid unit '{self.text}'")
+        return unit
+
+    def peek(self) -> Tuple[str, str, str]:
+        return self.tokens[self.pos] if self.pos < len(self.tokens) else ("end", "", "")
+
+    def product(self) -> Unit:
+        unit = self.factor()
+        while True:
+            kind, value, _ = self.peek()
+            if kind == "op" and value in ("*", "·", "⋅"):
+                self.pos += 1
+                unit = _multiply(unit, self.factor())
+            elif kind == "op" and value == "/":
+                self.pos += 1
+                unit = _divide(unit, self.factor())
+            elif kind in ("name", "number") or (kind == "op" and value == "("):
+                unit = _multiply(unit, self.factor())
+            else:
+                return unit
+
+    def factor(self) -> Unit:
+        unit = self.atom()
+        kind, value, _ = self.peek()
+        if kind == "op" and value in ("^", "**"):
+            self.pos += 1
+            sign = 1
+            if self.peek()[:2] == ("op", "-"):
+                self.pos += 1
+                sign = -1
+            kind, value, _ = self.peek()
+            if kind != "number" or not value.isdigit():
+                raise ValueError(f"Invalid exponent in unit '{self.text}'")
+            self.pos += 1
+            unit = _power(unit, sign * int(value))
+        elif kind == "super":
+            self.pos += 1
+            unit = _power(unit, int(value.translate(_SUPERSCRIPTS)))
+        return unit
+
+    def atom(self) -> Unit:
+        kind, value, attached = self.peek()
+        self.pos += 1
+        if kind == "number":
+            return Unit(Fraction(value), DIMENSIONLESS)
+        if kind == "name":
+            unit = self.registry.lookup(value)
+            return _power(unit, int(attached)) if attached else unit
+        if kind == "op" and value == "(":
+            unit = self.product()
+            if self.peek()[:2] != ("op", ")"):
+                raise ValueError(f"Missing ')' in unit '{self.text}'")
+            self.pos += 1
+            return unit
+        raise ValueError(f"Invalid unit '{self.text}'")
+
+
+# -------------------------------- Registry ----------------------------------
+class UnitRegistry:
+    """
+    Named units plus caches of parsed unit expressions and conversion
+    factors. Lookups and conversions only read (or add to) the caches, so a
+    registry can be shared between threads once it has been populated.
+    """
+
+    def __init__(self) -> None:
+        self._units: Dict[str, Unit] = {}
+        self._prefixable: set = set()  # symbols taking PREFIXES
+        self._prefixable_names: set = set()  # long names taking LONG_PREFIXES
+        self._long_names: set = set()
+        self._folded: Dict[str, set] = {}  # lowercased name -> units it names
+        self._parsed: Dict[str, Unit] = {}
+        self._factors: Dict[Tuple[str, str], float] = {}
+        self._exact_factors: Dict[Tuple[str, str], Fraction] = {}
+
+    def define(
+        self,
+        symbol: str,
+        definition: Union[str, Unit],
+        names: Iterable[str] = (),
+        prefixable: bool = False,
+    ) -> None:
+        """
+        Add a unit, e.g. define("N", "kg*m/s^2", ("newton",), prefixable=True).
+        Long names also match their plural with a trailing "s".
+        """
+        unit = definition if isinstance(definition, Unit) else self.parse(definition)
+        for name in (symbol, *names):
+            self._units[name] = unit
+            self._folded.setdefault(name.lower(), set()).add(unit)
+        self._long_names.update(names)
+        if prefixable:
+            self._prefixable.add(symbol)
+            self._prefixable_names.update(names)
+        self._clear_caches()
+
+    def lookup(self, name: str) -> Unit:
+        """A single unit name, with an optional SI prefix."""
+        folded = name.lower()
+        if folded in _LEGACY_NAMES:
+            name = folded
+        unit = self._units.get(name)
+        if unit is None and name.isupper():
+            # All capitals say nothing about prefixes: "PA" is the pascal, not a peta-ampere
+            unit = self._caseless(folded)
+        if unit is None:
+            unit = self._lookup(name)
+        if unit is None and name != folded:
+            # "Min", "HOURS", "Megameters"; mixed case otherwise means what it says ("kN", "mW")
+            unit = self._caseless(folded) or self._lookup_words(folded)
+        if unit is None:
+            raise ValueError(f"Unknown unit '{name}'")
+        return unit
+
+    def _caseless(self, folded: str) -> Any:
+        """The unit a whole name means in any case, unless case tells several apart."""
+        same = self._folded.get(folded, ())
+        return next(iter(same)) if len(same) == 1 else None
+
+    def _lookup(self, name: str) -> Any:
+        unit = self._units.get(name)
+        if unit is not None:
+            return unit
+        for prefix in _PREFIX_ORDER:
+            if name.startswith(prefix) and name[len(prefix):] in self._prefixable:
+                base = self._units[name[len(prefix):]]
+                return Unit(PREFIXES[prefix] * base.scale, base.dimension)
+        return self._lookup_words(name)
+
+    def _lookup_words(self, name: str) -> Any:
+        unit = self._lookup_long_name(name)
+        if unit is None and name.endswith("s"):
+            # Plurals of long names only: "kilometers", "hours"
+            unit = self._lookup_long_name(name[:-1])
+        return unit
+
+    def _lookup_long_name(self, name: str) -> Any:
+        if name in self._long_names:
+            return self._units[name]
+        for prefix in _LONG_PREFIX_ORDER:
+            if name.startswith(prefix) and name[len(prefix):] in self._prefixable_names:
+                base = self._units[name[len(prefix):]]
+                return Unit(LONG_PREFIXES[prefix] * base.scale, base.dimension)
+        return None
+
+    def parse(self, text: str) -> Unit:
+        """Scale and dimension of a unit expression such as "kg·m/s²"."""
+        unit = self._parsed.get(text)
+        if unit is None:
+            unit = _UnitParser(self, str(text)).parse()
+            if len(self._parsed) >= _CACHE_LIMIT:
+                self._parsed.clear()
+            self._parsed[text] = unit
+        return unit
+
+    def compatible(self, from_unit: str, to_unit: str) -> bool:
+        return self.parse(from_unit).dimension == self.parse(to_unit).dimension
+
+    def exact_factor(self, from_unit: str, to_unit: str) -> Fraction:
+        """Exact number of to_units in one from_unit."""
+        key = (from_unit, to_unit)
+        factor = self._exact_factors.get(key)
+        if factor is None:
+            source = self.parse(from_unit)
+            target = self.parse(to_unit)
+            if source.dimension != target.dimension:
+                raise ValueError(
+                    f"Incompatible units: '{from_unit}' is {format_dimension(source.dimension)}, "
+                    f"'{to_unit}' is {format_dimension(target.dimension)}"
+                )
+            factor = source.scale / target.scale
+            if len(self._exact_factors) >= _CACHE_LIMIT:
+                self._exact_factors.clear()
+            self._exact_factors[key] = factor
+        return factor
+
+    def factor(self, from_unit: str, to_unit: str) -> float:
+        """Multiplier converting from_unit to to_unit; one dict lookup once cached."""
+        try:
+            return self._factors[(from_unit, to_unit)]
+        except KeyError:
+            pass
+        factor = float(self.exact_factor(from_unit, to_unit))
+        if len(self._factors) >= _CACHE_LIMIT:
+            self._factors.clear()
+        self._factors[(from_unit, to_unit)] = factor
+        return factor
+
+    def convert(self, value: Any, from_unit: str, to_unit: str) -> Any:
+        """Convert a number, or a sequence/array of numbers (see convert_array)."""
+        if isinstance(value, (list, tuple)) or (np is not None and isinstance(value, np.ndarray)):
+            return self.convert_array(value, from_unit, to_unit)
+        try:
+            return value * self._factors[(from_unit, to_unit)]
+        except KeyError:
+            return value * self.factor(from_unit, to_unit)
+
+    def convert_array(self, values: Any, from_unit: str, to_unit: str, out: Any = None) -> Any:
+        """
+        Convert many values with one multiply each. With NumPy this returns a
+        float array (written into `out` if given, which may be `values`
+        itself); without it, a list.
+        """
+        factor = self.factor(from_unit, to_unit)
+        if np is None:
+            return [v * factor for v in values]
+        if out is None:
+            return np.asarray(values, dtype=float) * factor
+        return np.multiply(values, factor, out=out)
+
+    def _clear_caches(self) -> None:
+        self._parsed.clear()
+        self._factors.clear()
+        self._exact_factors.clear()
+
+
+def _build_default_registry() -> UnitRegistry:
+    units = UnitRegistry()
+    # SI base units; the kilogram is the gram with a prefix
+    units.define("m", _base(0), ("meter", "metre"), prefixable=True)
+    units.define("g", _base(1, Fraction(1, 1000)), ("gram", "gramme"), prefixable=True)
+    units.define("s", _base(2), ("second", "sec"), prefixable=True)
+    units.define("A", _base(3), ("ampere", "amp"), prefixable=True)
+    units.define("K", _base(4), ("kelvin",), prefixable=True)
+    units.define("mol", _base(5), ("mole",), prefixable=True)
+    units.define("cd", _base(6), ("candela",), prefixable=True)
+    # Length
+    units.define("in", "0.0254 m", ("inch", "inches"))
+    units.define("ft", "12 in", ("foot", "feet"))
+    units.define("yd", "3 ft", ("yard",))
+    units.define("mi", "1760 yd", ("mile",))
+    units.define("nmi", "1852 m", ("nautical_mile",))
+    units.define("au", "149597870700 m", ("astronomical_unit",))
+    units.define("ly", "9460730472580800 m", ("light_year",))
+    # Mass
+    units.define("t", "1000 kg", ("tonne",))
+    units.define("lb", "0.45359237 kg", ("pound",))
+    units.define("oz", "lb/16", ("ounce",))
+    units.define("st", "14 lb", ("stone",))
+    # Time
+    units.define("min", "60 s", ("minute",))
+    units.define("h", "60 min", ("hour", "hr"))
+    units.define("d", "24 h", ("day",))
+    units.define("wk", "7 d", ("week",))
+    units.define("yr", "365.25 d", ("year",))
+    # Area and volume
+    units.define("ha", "10000 m^2", ("hectare",))
+    units.define("acre", "4840 yd^2")
+    units.define("l", "dm^3", ("liter", "litre"), prefixable=True)
+    units.define("L", "l", prefixable=True)
+    units.define("gal", "231 in^3", ("gallon",))
+    units.define("qt", "gal/4", ("quart",))
+    units.define("pt", "qt/2", ("pint",))
+    units.define("cup", "pt/2")
+    units.define("floz", "cup/8", ("fluid_ounce",))
+    units.define("tbsp", "floz/2", ("tablespoon",))
+    units.define("tsp", "tbsp/3", ("teaspoon",))
+    # Speed
+    units.define("kph", "km/h")
+    units.define("mph", "mi/h")
+    units.define("kn", "nmi/h", ("knot",))
+    # Mechanics and electricity
+    units.define("N", "kg*m/s^2", ("newton",), prefixable=True)
+    units.define("lbf", "9.80665 lb*m/s^2", ("pound_force",))
+    units.define("J", "N*m", ("joule",), prefixable=True)
+    units.define("cal", "4.184 J", ("calorie",), prefixable=True)
+    units.define("eV", "1.602176634e-19 J", ("electronvolt",), prefixable=True)
+    units.define("W", "J/s", ("watt",), prefixable=True)
+    units.define("Wh", "W*h", (), prefixable=True)
+    units.define("hp", "550 ft*lbf/s", ("horsepower",))
+    units.define("Pa", "N/m^2", ("pascal",), prefixable=True)
+    units.define("bar", "100000 Pa", (), prefixable=True)
+    units.define("atm", "101325 Pa", ("atmosphere",))
+    units.define("psi", "lbf/in^2")
+    units.define("Hz", "1/s", ("hertz",), prefixable=True)
+    units.define("C", "A*s", ("coulomb",), prefixable=True)
+    units.define("Ah", "A*h", (), prefixable=True)
+    units.define("V", "W/A", ("volt",), prefixable=True)
+    units.define("ohm", "V/A", (), prefixable=True)
+    units.define("Ω", "ohm", prefixable=True)
+    return units
+
+
+# Built once at import; EngineCore and the GUI converter share it
+REGISTRY = _build_default_registry()
+
+
+__all__ = [
+    "BASE_UNITS",
+    "DIMENSIONLESS",
+    "LONG_PREFIXES",
+    "PREFIXES",
+    "REGISTRY",
+    "Unit",
+    "UnitRegistry",
+    "format_dimension",
+]
@@ -0,0 +1,222 @@
+"""
+Functions defined in expressions, e.g. "f(x, y) = x^2 + y".
+
+A definition's body is compiled once (through the engine's compile cache,
+so it is folded and optimized like any expression) and every call runs that
+program with the arguments bound as local names. Other names resolve in the
+session's namespace at call time, so redefining a function takes effect in
+everything that calls it.
+
+Called with arrays (evaluate_vectorized, plots, calculus over batches of
+points), a body runs once on the whole arrays: its names resolve in the
+NumPy namespace instead, through a float compilation of the body.
+
+Functions whose bodies use only their parameters, built-ins and other pure
+user functions are pure: they memoize their results, which makes recursion
+such as fib(n) = if(n < 2, n, fib(n - 1) + fib(n - 2)) linear instead of
+exponential. When a function changes, the memos of every function that
+calls it (directly or not) are cleared and purity is worked out again.
+
+Each nested call takes a few Python frames, so memoized calls nest at most
+STEP_DEPTH deep: a call deeper than that is put off, worked out on its own
+(and remembered), and the calls above it run again, now finding it in the
+memo. fact(1000) therefore takes about 16 steps instead of 1000 nested
+frames. Functions that are not memoized recurse directly and stop at about
+150 levels with "Recursion too deep".
+"""
+from contextvars import ContextVar
+from typing import Any, Callable, Collection, Dict, Hashable, List, Mapping, Optional, Set, Tuple
+
+import limits
+from expression import Definition, Program
+from matrix import is_matrix
+
+# Results kept per function; cleared when full
+_MEMO_LIMIT = 65536
+# Memoized calls nested before deeper ones are put off and worked out in steps
+STEP_DEPTH = 64
+
+_MISSING = object()
+# Memoized calls in progress in this context
+_depth: ContextVar[int] = ContextVar("calculator_userfunc_depth", default=0)
+
+
+class _PutOff(BaseException):
+    """
+    A memoized call too deep to make now. A BaseException, so it passes
+    `except Exception` in functions a body calls (integrate, ...) on its way
+    to the outermost memoized call, which works it out first.
+    """
+
+    def __init__(self, func: "UserFunction", args: Tuple[Any, ...]) -> None:
+        super().__init__(func.name)
+        self.func = func
+        self.args = args
+
+
+class Scope:
+    """Two namespaces read as one, the first taking precedence (a minimal ChainMap)."""
+
+    __slots__ = ("first", "second")
+
+    def __init__(self, first: Mapping[str, Any], second: Mapping[str, Any]) -> None:
+        self.first = first
+        self.second = second
+
+    def get(self, name: str, default: Any = None) -> Any:
+        value = self.first.get(name, _MISSING)
+        if value is _MISSING:
+            return self.second.get(name, default)
+        return value
+
+
+class UserFunction:
+    """A compiled user definition; call it like any other calculator function."""
+
+    __slots__ = ("definition", "program", "scope", "pure", "vector", "_vector", "_memo")
+
+    def __init__(
+        self,
+        definition: Definition,
+        program: Program,
+        scope: Scope,
+        vector: Optional[Callable[[], Tuple[Program, Scope]]] = None,
+    ) -> None:
+        self.definition = definition
+        self.program = program
+        # Where names other than the parameters are looked up
+        self.scope = scope
+        self.pure = False
+        # Builds the (program, scope) used for array arguments, on first use
+        self.vector = vector
+        self._vector: Optional[Tuple[Program, Scope]] = None
+        self._memo: Dict[Hashable, Any] = {}
+
+    @property
+    def name(self) -> str:
+        return self.definition.name
+
+    @property
+    def params(self) -> Tuple[str, ...]:
+        return self.definition.params
+
+    @property
+    def signature(self) -> str:
+        return f"{self.name}({', '.join(self.params)})"
+
+    @property
+    def source(self) -> str:
+        """The definition as text, e.g. for saving it with the session."""
+        return f"{self.signature} = {self.definition.body}"
+
+    @property
+    def calls(self) -> Set[str]:
+        """Names the body looks up in the session (everything but parameters)."""
+        return set(self.program.names).difference(self.params)
+
+    def clear_memo(self) -> None:
+        self._memo.clear()
+
+    def __call__(self, *args: Any) -> Any:
+        params = self.definition.params
+        if len(args) != len(params):
+            raise ValueError(f"{self.name} takes {len(params)} argument{'' if len(params) == 1 else 's'} ({len(args)} given)")
+        # Recursion never returns to the caller's loop, so check the time budget here
+        limits.check_deadline()
+        program, scope = self.program, self.scope
+        if self.vector is not None and any(map(is_matrix, args)):
+            if self._vector is None:
+                self._vector = self.vector()
+            program, scope = self._vector
+        elif self.pure:
+            # Types are part of the key: f(1) and f(1.0) may format differently
+            key = (args, tuple(map(type, args)))
+            try:
+                value = self._memo.get(key, _MISSING)
+            except TypeError:
+                pass  # Unhashable arguments are not memoized
+            else:
+                if value is not _MISSING:
+                    return value
+                depth = _depth.get()
+                if depth >= STEP_DEPTH:
+                    raise _PutOff(self, args)
+                if depth == 0:
+                    return self._in_steps(args)
+                return self._remember(key, args, depth)
+        try:
+            return program.evaluate(dict(zip(params, args)), scope)
+        except RecursionError:
+            raise ValueError(f"Recursion too deep in {self.name}") from None
+
+    def _remember(self, key: Hashable, args: Tuple[Any, ...], depth: int) -> Any:
+        token = _depth.set(depth + 1)
+        try:
+            value = self.program.evaluate(dict(zip(self.definition.params, args)), self.scope)
+        except RecursionError:
+            raise ValueError(f"Recursion too deep in {self.name}") from None
+        finally:
+            _depth.reset(token)
+        if len(self._memo) >= _MEMO_LIMIT:
+            self._memo.clear()
+        self._memo[key] = value
+        return value
+
+    def _in_steps(self, args: Tuple[Any, ...]) -> Any:
+        """The outermost memoized call: each put-off call is worked out before the one that needed it."""
+        pending: List[Tuple[UserFunction, Tuple[Any, ...]]] = [(self, args)]
+        while True:
+            func, call_args = pending[-1]
+            try:
+                value = func._remember((call_args, tuple(map(type, call_args))), call_args, 0)
+            except _PutOff as deeper:
+                pending.append((deeper.func, deeper.args))
+                continue
+            pending.pop()
+            if not pending:
+                return value
+
+    def __repr__(self) -> str:
+        return f"UserFunction({self.source!r})"
+
+
+def dependents(functions: Mapping[str, Any], name: str) -> Set[str]:
+    """User functions that call `name`, directly or through other user functions."""
+    callers: Dict[str, Set[str]] = {}
+    for caller, func in functions.items():
+        if isinstance(func, UserFunction):
+            for callee in func.calls:
+                callers.setdefault(callee, set()).add(caller)
+    found: Set[str] = set()
+    stack = [name]
+    while stack:
+        for caller in callers.get(stack.pop(), ()):
+            if caller not in found:
+                found.add(caller)
+                stack.append(caller)
+    return found
+
+
+def update_purity(functions: Mapping[str, Any], stable: Collection[str]) -> None:
+    """
+    Mark each user function pure or not. `stable` names (built-ins) never
+    change; anything else a body uses (ANS, MR, Python callables, undefined
+    names) makes it impure, and so does calling an impure function.
+    Recursive and mutually recursive functions can still be pure.
+    """
+    defined = {name: func for name, func in functions.items() if isinstance(func, UserFunction)}
+    pure = set(defined)
+    changed = True
+    while changed:
+        changed = False
+        for name in list(pure):
+            if any(callee not in stable and callee not in pure for callee in defined[name].calls):
+                pure.discard(name)
+                changed = True
+    for name, func in defined.items():
+        if func.pure and name not in pure:
+            func.clear_memo()
+        func.pure = name in pure
+
+
+__all__ = ["STEP_DEPTH", "Scope", "UserFunction", "dependents", "update_purity"]